@@ -1,19 +1,23 @@
 import numpy as np
+import base64
+import time
+import threading
+from datetime import datetime
+from django.db.models import Q
+from django.core.cache import cache
+from django.db import transaction
+from se_groupwork.global_tools import is_test_mode
 from article_selector.models import Preference
 from webspider.models import Article, PublicAccount
 from user.models import User, Subscription
 
 # 获取推荐文章
 def sort_articles_by_preference(user, articles):
-    unsorted_articles = []
-    for article in articles:
-        unsorted_articles.append({
-            "title": article.title,
-            "article": article,
-            "score": Preference.objects.caculate_preference(user, article)
-        })
-    sorted_articles = sorted(unsorted_articles, key=lambda x: x["score"], reverse=True)
-    sorted_articles = [article["article"] for article in sorted_articles]
+    articles = list(articles)
+    scores = Preference.objects.caculate_preferences(user, articles)
+    # 稳定排序：得分相同的文章保持原有（时间倒序）顺序
+    order = np.argsort(-scores, kind='stable')
+    sorted_articles = [articles[i] for i in order]
     return sorted_articles
 
 # 获取校内公众号
@@ -39,3 +43,144 @@ def get_accounts_by_user(user):
     return accounts
 
 
+# 公众号id缓存
+# - 校内公众号id：进程内缓存，以Redis中的版本号校验（is_default变化时更新版本号）
+# - 用户订阅公众号id：缓存在Redis中（订阅关系变化时删除）
+# Redis不可用时直接查询数据库，并在一段时间内不再尝试连接
+CAMPUS_ACCOUNTS_VERSION_KEY = 'article_selector:campus_accounts_version'
+CUSTOMIZED_ACCOUNTS_KEY = 'article_selector:customized_accounts:{user_id}'
+CUSTOMIZED_ACCOUNTS_TIMEOUT = 60 * 60 * 24
+CACHE_RETRY_INTERVAL = 30
+
+_campus_account_ids = {'version': None, 'ids': None}
+_campus_lock = threading.Lock()
+_cache_retry_at = 0
+
+
+def _cache_key(key):
+    # 测试与线上可能共用同一个Redis，测试时加前缀隔离
+    return f"test:{key}" if is_test_mode() else key
+
+
+def _cache_call(func, *args, **kwargs):
+    """
+    调用缓存接口，失败时返回 (False, None)
+    """
+    global _cache_retry_at
+    if time.time() < _cache_retry_at:
+        return False, None
+    try:
+        return True, func(*args, **kwargs)
+    except Exception as e:
+        _cache_retry_at = time.time() + CACHE_RETRY_INTERVAL
+        print("[Error at article_selector.py::_cache_call] 缓存不可用，直接查询数据库", e)
+        return False, None
+
+
+def get_campus_account_ids():
+    """
+    获取校内公众号id列表
+    """
+    ok, version = _cache_call(cache.get, _cache_key(CAMPUS_ACCOUNTS_VERSION_KEY))
+    if not ok:
+        return list(PublicAccount.objects.filter(is_default=True).values_list('id', flat=True))
+    if version is None:
+        version = time.time_ns()
+        _cache_call(cache.add, _cache_key(CAMPUS_ACCOUNTS_VERSION_KEY), version, None)
+        _, version = _cache_call(cache.get, _cache_key(CAMPUS_ACCOUNTS_VERSION_KEY))
+    with _campus_lock:
+        if version is not None and _campus_account_ids['version'] == version:
+            return list(_campus_account_ids['ids'])
+    ids = list(PublicAccount.objects.filter(is_default=True).values_list('id', flat=True))
+    with _campus_lock:
+        _campus_account_ids['version'] = version
+        _campus_account_ids['ids'] = ids
+    return list(ids)
+
+
+def get_customized_account_ids(user):
+    """
+    获取用户订阅的公众号id列表
+    """
+    key = _cache_key(CUSTOMIZED_ACCOUNTS_KEY.format(user_id=user.id))
+    ok, ids = _cache_call(cache.get, key)
+    if ok and ids is not None:
+        return ids
+    ids = list(PublicAccount.objects.filter(subscription__user=user).values_list('id', flat=True).distinct())
+    if ok:
+        _cache_call(cache.set, key, ids, CUSTOMIZED_ACCOUNTS_TIMEOUT)
+    return ids
+
+
+def get_account_ids_by_user(user):
+    """
+    获取用户订阅的公众号 + 校内公众号的id列表
+    """
+    return list(set(get_customized_account_ids(user)) | set(get_campus_account_ids()))
+
+
+def _invalidate_now_and_on_commit(func):
+    # 立即失效一次；事务提交后再失效一次，避免提交前被其他请求用旧数据回填
+    func()
+    transaction.on_commit(func)
+
+
+def invalidate_campus_accounts():
+    """
+    校内公众号变化时调用：更新版本号，所有进程的本地缓存随之失效
+    """
+    def invalidate():
+        with _campus_lock:
+            _campus_account_ids['version'] = None
+            _campus_account_ids['ids'] = None
+        _cache_call(cache.set, _cache_key(CAMPUS_ACCOUNTS_VERSION_KEY), time.time_ns(), None)
+    _invalidate_now_and_on_commit(invalidate)
+
+
+def invalidate_customized_accounts(user_id):
+    """
+    用户订阅关系变化时调用
+    """
+    key = _cache_key(CUSTOMIZED_ACCOUNTS_KEY.format(user_id=user_id))
+    _invalidate_now_and_on_commit(lambda: _cache_call(cache.delete, key))
+
+
+# 游标分页：游标为 (publish_time, id) 的不透明编码，与 order_by('-publish_time', '-id') 配合使用
+def encode_cursor(article):
+    raw = f"{article.publish_time.isoformat()}|{article.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析游标，格式错误时抛出 ValueError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        publish_time, article_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(publish_time), int(article_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def paginate_articles(queryset, limit, start_rank=0, cursor=None):
+    """
+    按 (-publish_time, -id) 分页
+    - 传入 cursor 时使用键集分页，只扫描游标之后的行，翻页深度不影响耗时
+    - 否则沿用 start_rank 偏移分页（兼容旧客户端）
+    :return: (当前页文章列表, 是否到达末尾, 下一页游标)
+    """
+    queryset = queryset.order_by('-publish_time', '-id')
+    if cursor:
+        publish_time, article_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(publish_time__lt=publish_time) | Q(publish_time=publish_time, id__lt=article_id)
+        )
+        page_items = list(queryset[:limit + 1])
+    else:
+        page_items = list(queryset[start_rank:start_rank + limit + 1])
+    # 多取一条判断是否到末尾
+    reached_end = len(page_items) <= limit
+    page_items = page_items[:limit]
+    next_cursor = encode_cursor(page_items[-1]) if page_items and not reached_end else None
+    return page_items, reached_end, next_cursor
@@ -0,0 +1,399 @@
+from webspider.models import Article
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from contextlib import closing
+import sqlite3
+import json
+import re
+import os
+
+'''
+mysql.webspider_articles -> sqlite FTS5（本地全文索引，Meilisearch不可用时使用）
+{
+	articles_fts(rowid=id, title, summary, key_info, content) -> 中文按二元组（bigram）切分后交给unicode61分词
+	article_meta(id, public_account_id, publish_time, has_summary, tags) -> 过滤与排序字段
+}
+'''
+
+CJK_RANGES = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+CJK_PATTERN = re.compile(f'[{CJK_RANGES}]+')
+TOKEN_PATTERN = re.compile(f'[{CJK_RANGES}]+|[^\\W{CJK_RANGES}]+')
+FTS_COLUMNS = ['title', 'summary', 'key_info', 'content']
+
+
+def bigram_text(text):
+	'''
+	建索引用：连续的中文切为重叠的二元组，末尾补一个单字（支持单字前缀查询），其余字符原样保留
+	"清华大学 AI" -> "清华 华大 大学 学 AI"
+	'''
+	if not text:
+		return ""
+	def split(match):
+		run = match.group(0)
+		if len(run) == 1:
+			return f" {run} "
+		return " " + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + f" {run[-1]} "
+	return CJK_PATTERN.sub(split, text)
+
+
+def bigram_query(text):
+	'''
+	查询用：每段中文转为二元组短语（等价于子串匹配），单字用前缀匹配，各段之间为AND
+	'''
+	terms = []
+	for token in TOKEN_PATTERN.findall(text or ""):
+		if CJK_PATTERN.fullmatch(token):
+			if len(token) == 1:
+				terms.append(f'"{token}"*')
+			else:
+				terms.append('"' + " ".join(token[i:i + 2] for i in range(len(token) - 1)) + '"')
+		else:
+			terms.append('"' + token.replace('"', '') + '"')
+	return " ".join(terms)
+
+
+def publish_timestamp(publish_time):
+	'''
+	发布时间 -> Unix时间戳（保存信号中的实例可能仍是字符串）
+	'''
+	if isinstance(publish_time, str):
+		publish_time = parse_datetime(publish_time)
+	if timezone.is_naive(publish_time):
+		publish_time = timezone.make_aware(publish_time)
+	return int(publish_time.timestamp())
+
+
+class SqliteFtsTool:
+	_instance = None
+	initialized = False
+
+	def __new__(cls, *args, **kwargs):
+		if cls._instance is None:
+			cls._instance = super().__new__(cls)
+		return cls._instance
+
+	def __init__(self, test_mode=False):
+		if SqliteFtsTool.initialized:
+			return
+		SqliteFtsTool.initialized = True
+		self.valid = False
+		self.test_mode = test_mode
+		print("[Info at fts_tool.py::__init__] SqliteFtsTool 初始化", "testmode" if test_mode else "")
+		self.db_path = settings.SQLITEFTS_DB_PATH if not test_mode else settings.TMP_SQLITEFTS_DB_PATH_FOR_TEST
+		self.valid = self._init_db()
+		if test_mode:
+			self.clear_index()
+
+	def _connect(self):
+		conn = sqlite3.connect(self.db_path, timeout=10)
+		conn.execute("PRAGMA journal_mode=WAL")
+		return conn
+
+	def _init_db(self):
+		'''
+		创建FTS5表与元数据表；当前sqlite不支持FTS5时返回False
+		'''
+		try:
+			os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+			with closing(self._connect()) as conn:
+				conn.execute(f"""
+					CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts
+					USING fts5({', '.join(FTS_COLUMNS)}, tokenize='unicode61')
+				""")
+				conn.execute("""
+					CREATE TABLE IF NOT EXISTS article_meta (
+						id INTEGER PRIMARY KEY,
+						public_account_id INTEGER,
+						publish_time INTEGER,
+						has_summary INTEGER,
+						tags TEXT
+					)
+				""")
+				conn.execute("CREATE INDEX IF NOT EXISTS article_meta_time ON article_meta(publish_time DESC, id DESC)")
+				conn.commit()
+			return True
+		except Exception as e:
+			print("[Error at fts_tool.py::_init_db] 全文索引初始化失败", e)
+			return False
+
+	def _write_articles(self, conn, articles):
+		rows = [(article.id,) for article in articles]
+		conn.executemany("DELETE FROM articles_fts WHERE rowid = ?", rows)
+		conn.executemany(
+			f"INSERT INTO articles_fts(rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+			[
+				(article.id, bigram_text(article.title), bigram_text(article.summary), bigram_text(article.key_info), bigram_text(article.content))
+				for article in articles
+			]
+		)
+		conn.executemany(
+			"INSERT OR REPLACE INTO article_meta(id, public_account_id, publish_time, has_summary, tags) VALUES (?, ?, ?, ?, ?)",
+			[
+				(article.id, article.public_account_id, publish_timestamp(article.publish_time), int(article.summary != ""), json.dumps(list(article.tags or []), ensure_ascii=False))
+				for article in articles
+			]
+		)
+
+	def _write_queryset(self, queryset, batch_size=500):
+		'''
+		分批写入，避免一次性加载全部正文
+		'''
+		queryset = queryset.only('id', 'title', 'summary', 'key_info', 'content', 'public_account_id', 'publish_time', 'tags')
+		count = 0
+		batch = []
+		with closing(self._connect()) as conn:
+			for article in queryset.iterator(chunk_size=batch_size):
+				batch.append(article)
+				if len(batch) >= batch_size:
+					self._write_articles(conn, batch)
+					conn.commit()
+					count += len(batch)
+					batch = []
+			if batch:
+				self._write_articles(conn, batch)
+				conn.commit()
+				count += len(batch)
+		return count
+
+	def search_articles(self, search_query, max_results=1000, account_ids=None, time_from=None):
+		'''
+		根据搜索查询返回文章id列表（按bm25相关度），过滤参数同 search_article_ids
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::search_articles] 索引无效")
+			return None
+		query = bigram_query(search_query)
+		if not query:
+			return []
+		if account_ids is None and time_from is None:
+			sql = "SELECT rowid FROM articles_fts WHERE articles_fts MATCH ? ORDER BY bm25(articles_fts) LIMIT ?"
+			params = [query, max_results]
+		else:
+			conditions = ["articles_fts MATCH ?"]
+			params = [query]
+			if account_ids is not None:
+				account_ids = [int(account_id) for account_id in account_ids]
+				if not account_ids:
+					return []
+				conditions.append(f"m.public_account_id IN ({', '.join('?' * len(account_ids))})")
+				params += account_ids
+			if time_from is not None:
+				conditions.append("m.publish_time >= ?")
+				params.append(int(time_from))
+			sql = (f"SELECT articles_fts.rowid FROM articles_fts JOIN article_meta m ON m.id = articles_fts.rowid "
+				   f"WHERE {' AND '.join(conditions)} ORDER BY bm25(articles_fts) LIMIT ?")
+			params.append(max_results)
+		try:
+			with closing(self._connect()) as conn:
+				rows = conn.execute(sql, params).fetchall()
+			return [row[0] for row in rows]
+		except Exception as e:
+			print("[Error at fts_tool.py::search_articles] 搜索失败", e)
+			return None
+
+	def search_article_ids(self, search_query, account_ids=None, time_from=None, time_to=None, tags=None, before=None, offset=0, limit=20):
+		'''
+		过滤并按发布时间倒序分页，返回当前页的文章id列表（参数同 MeilisearchTool.search_article_ids）
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::search_article_ids] 索引无效")
+			return None
+		query = bigram_query(search_query)
+		if not query:
+			return []
+		conditions = ["articles_fts MATCH ?", "m.has_summary = 1"]
+		params = [query]
+		if account_ids is not None:
+			account_ids = [int(account_id) for account_id in account_ids]
+			if not account_ids:
+				return []
+			conditions.append(f"m.public_account_id IN ({', '.join('?' * len(account_ids))})")
+			params += account_ids
+		if time_from is not None:
+			conditions.append("m.publish_time >= ?")
+			params.append(int(time_from))
+		if time_to is not None:
+			conditions.append("m.publish_time < ?")
+			params.append(int(time_to))
+		if tags:
+			conditions.append(f"EXISTS (SELECT 1 FROM json_each(m.tags) WHERE json_each.value IN ({', '.join('?' * len(tags))}))")
+			params += list(tags)
+		if before is not None:
+			publish_time, article_id = before
+			conditions.append("(m.publish_time < ? OR (m.publish_time = ? AND m.id < ?))")
+			params += [int(publish_time), int(publish_time), int(article_id)]
+		try:
+			with closing(self._connect()) as conn:
+				rows = conn.execute(
+					f"""
+					SELECT m.id FROM articles_fts JOIN article_meta m ON m.id = articles_fts.rowid
+					WHERE {' AND '.join(conditions)}
+					ORDER BY m.publish_time DESC, m.id DESC
+					LIMIT ? OFFSET ?
+					""",
+					params + [limit, offset]
+				).fetchall()
+			return [row[0] for row in rows]
+		except Exception as e:
+			print("[Error at fts_tool.py::search_article_ids] 搜索失败", e)
+			return None
+
+	def get_article_index_by_id(self, article_id):
+		'''
+		根据文章id获取文章索引
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::get_article_index_by_id] 索引无效")
+			return None
+		try:
+			with closing(self._connect()) as conn:
+				row = conn.execute(
+					"SELECT id, public_account_id, publish_time, has_summary, tags FROM article_meta WHERE id = ?", [article_id]
+				).fetchone()
+			if row is None:
+				return None
+			return {"id": row[0], "public_account_id": row[1], "publish_time": row[2], "has_summary": bool(row[3]), "tags": json.loads(row[4])}
+		except Exception as e:
+			print("[Error at fts_tool.py::get_article_index_by_id] 获取文章索引失败", e)
+			return None
+
+	def get_article_index_count(self):
+		'''
+		获取文章索引数量
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::get_article_index_count] 索引无效")
+			return None
+		try:
+			with closing(self._connect()) as conn:
+				return conn.execute("SELECT COUNT(*) FROM article_meta").fetchone()[0]
+		except Exception as e:
+			print("[Error at fts_tool.py::get_article_index_count] 获取文章索引数量失败", e)
+			return None
+
+	def get_all_articles_index(self):
+		'''
+		获取所有文章索引（id -> 标题）
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::get_all_articles_index] 索引无效")
+			return None
+		try:
+			with closing(self._connect()) as conn:
+				ids = [row[0] for row in conn.execute("SELECT id FROM article_meta ORDER BY id")]
+			return dict(Article.objects.filter(id__in=ids).values_list('id', 'title'))
+		except Exception as e:
+			print("[Error at fts_tool.py::get_all_articles_index] 获取文章索引失败", e)
+			return None
+
+	def update_article(self, article_id):
+		'''
+		根据文章id更新文章
+		'''
+		return self.update_batch_articles([article_id])
+
+	def index_articles(self, articles):
+		'''
+		直接写入已加载的文章对象（Article保存信号使用，无需再查询数据库）
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::index_articles] 索引无效")
+			return None
+		try:
+			with closing(self._connect()) as conn:
+				self._write_articles(conn, articles)
+				conn.commit()
+			return True
+		except Exception as e:
+			print("[Error at fts_tool.py::index_articles] 文章更新失败", e)
+			return None
+
+	def update_batch_articles(self, articles_id):
+		'''
+		根据文章id列表批量更新文章
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::update_batch_articles] 索引无效")
+			return None
+		try:
+			self._write_queryset(Article.objects.filter(id__in=articles_id))
+			return True
+		except Exception as e:
+			print("[Error at fts_tool.py::update_batch_articles] 文章更新失败", e)
+			return None
+
+	def delete_article(self, article_id):
+		'''
+		根据文章id删除文章
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::delete_article] 索引无效")
+			return None
+		try:
+			with closing(self._connect()) as conn:
+				conn.execute("DELETE FROM articles_fts WHERE rowid = ?", [article_id])
+				conn.execute("DELETE FROM article_meta WHERE id = ?", [article_id])
+				conn.commit()
+			return True
+		except Exception as e:
+			print("[Error at fts_tool.py::delete_article] 文章删除失败", e)
+			return None
+
+	def sync_articles_index_with_mysql(self):
+		'''
+		将mysql中的新增文章同步到全文索引
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::sync_articles_index_with_mysql] 索引无效")
+			return None
+		try:
+			with closing(self._connect()) as conn:
+				indexed_ids = {row[0] for row in conn.execute("SELECT id FROM article_meta")}
+			mysql_ids = set(Article.objects.exclude(summary="").values_list('id', flat=True))
+			missing_ids = mysql_ids - indexed_ids
+			if not missing_ids:
+				print("暂无需要同步到全文索引的文章")
+				return True
+			count = self._write_queryset(Article.objects.filter(id__in=missing_ids).order_by('-id'))
+			print(f"成功同步{count}篇文章到全文索引")
+			return True
+		except Exception as e:
+			print("[Error at fts_tool.py::sync_articles_index_with_mysql] 索引同步失败", e)
+			return None
+
+	def clear_index(self):
+		'''
+		清空索引
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::clear_index] 索引无效")
+			return None
+		try:
+			with closing(self._connect()) as conn:
+				conn.execute("DELETE FROM articles_fts")
+				conn.execute("DELETE FROM article_meta")
+				conn.commit()
+			return True
+		except Exception as e:
+			print("[Error at fts_tool.py::clear_index] 索引清空失败", e)
+			return None
+
+	def rebuild_index(self):
+		'''
+		重建索引
+		'''
+		if not self.valid:
+			print("[Error at fts_tool.py::rebuild_index] 索引无效")
+			return None
+		try:
+			self.clear_index()
+			count = self._write_queryset(Article.objects.exclude(summary="").order_by('-id'))
+			with closing(self._connect()) as conn:
+				conn.execute("INSERT INTO articles_fts(articles_fts) VALUES ('optimize')")
+				conn.commit()
+			print(f"成功重建{count}篇文章到全文索引")
+			return True
+		except Exception as e:
+			print("[Error at fts_tool.py::rebuild_index] 索引重建失败", e)
+			return None
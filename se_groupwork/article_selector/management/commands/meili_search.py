@@ -13,7 +13,7 @@ class Command(BaseCommand):
         meili_tools = global_meili_tool_load()
         ids = meili_tools.search_articles(text)
         print("搜索结果:", ids)
-        for id in ids:
+        for id in ids or []:
             article = Article.objects.get(id=id)
             print(f"- {article.title} ({id})")
         
\ No newline at end of file
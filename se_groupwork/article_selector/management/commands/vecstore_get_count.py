@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from se_groupwork.global_tools import global_vecstore_tool_load
+
+class Command(BaseCommand):
+    help = 'get count of shared article vector matrix'
+
+    def handle(self, *args, **options):
+        vecstore_tool = global_vecstore_tool_load()
+        print(vecstore_tool.get_count())
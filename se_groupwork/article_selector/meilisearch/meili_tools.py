@@ -12,9 +12,37 @@ mysql.webspider_articles -> meilisearch
 	content -> content
 	summary -> summary
 	key_info -> key_info
+	public_account_id -> public_account_id（可过滤）
+	publish_time -> publish_time（Unix时间戳，可过滤、可排序）
+	tags -> tags（可过滤）
+	summary != "" -> has_summary（可过滤）
 }
 '''
 
+FILTERABLE_ATTRIBUTES = ["id", "public_account_id", "publish_time", "tags", "has_summary"]
+SORTABLE_ATTRIBUTES = ["publish_time", "id"]
+
+
+def article_document(article):
+	'''
+	文章 -> meilisearch文档
+	'''
+	return {
+		"id": article.id,
+		"title": article.title,
+		"content": article.content,
+		"summary": article.summary,
+		"key_info": article.key_info,
+		"public_account_id": article.public_account_id,
+		"publish_time": int(article.publish_time.timestamp()),
+		"tags": list(article.tags or []),
+		"has_summary": article.summary != ""
+	}
+
+
+def _filter_value(value):
+	return json.dumps(value, ensure_ascii=False)
+
 class MeilisearchTool:
 	_instance = None
 	initialized = False
@@ -49,31 +77,92 @@ class MeilisearchTool:
 				self.client.create_index(uid = self.index_name, options={"primaryKey": "id"})
 				time.sleep(0.1)
 				print("[Info at meili_tools.py::check_and_create_index] 索引创建成功")
-			return self.client.get_index(self.index_name)
+			index = self.client.get_index(self.index_name)
+			self.update_index_settings(index)
+			return index
 		except Exception as e:
 			print("[Error at meili_tools.py::check_and_create_index] 索引不存在且创建失败", e)
 			return None
 
-	def search_articles(self, search_query, max_results=1000):
+	def update_index_settings(self, index):
+		'''
+		设置可过滤、可排序字段（已是目标设置时不提交任务）
+		'''
+		try:
+			if sorted(map(str, index.get_filterable_attributes() or [])) != sorted(FILTERABLE_ATTRIBUTES):
+				index.update_filterable_attributes(FILTERABLE_ATTRIBUTES)
+			if sorted(map(str, index.get_sortable_attributes() or [])) != sorted(SORTABLE_ATTRIBUTES):
+				index.update_sortable_attributes(SORTABLE_ATTRIBUTES)
+		except Exception as e:
+			print("[Error at meili_tools.py::update_index_settings] 索引设置失败", e)
+
+	def search_article_ids(self, search_query, account_ids=None, time_from=None, time_to=None, tags=None, before=None, offset=0, limit=20):
 		'''
-		根据搜索查询返回文章id列表
+		在meilisearch内完成过滤、按发布时间倒序排序和分页，返回当前页的文章id列表
+		:param account_ids: 公众号id列表
+		:param time_from: 发布时间下限（Unix时间戳，包含）
+		:param time_to: 发布时间上限（Unix时间戳，不包含）
+		:param tags: 标签列表，匹配包含任一标签的文章
+		:param before: 游标 (publish_time时间戳, id)，只返回排在其后的文章
 		'''
 		if not self.valid:
-			print("[Error at meili_tools.py::search_articles] 索引无效")
+			print("[Error at meili_tools.py::search_article_ids] 索引无效")
 			return None
+		filters = ["has_summary = true"]
+		if account_ids is not None:
+			filters.append(f"public_account_id IN [{', '.join(str(int(account_id)) for account_id in account_ids)}]")
+		if time_from is not None:
+			filters.append(f"publish_time >= {int(time_from)}")
+		if time_to is not None:
+			filters.append(f"publish_time < {int(time_to)}")
+		if tags:
+			filters.append(f"tags IN [{', '.join(_filter_value(tag) for tag in tags)}]")
+		if before is not None:
+			publish_time, article_id = before
+			filters.append(f"(publish_time < {int(publish_time)} OR (publish_time = {int(publish_time)} AND id < {int(article_id)}))")
 		try:
 			result = self.index.search(
 				search_query,
 				{
-					"limit": max_results,
+					"filter": " AND ".join(filters),
+					"sort": ["publish_time:desc", "id:desc"],
+					"offset": offset,
+					"limit": limit,
 					"attributesToRetrieve": ["id"]
 				}
 			)
+			return [hit['id'] for hit in result['hits']]
+		except Exception as e:
+			print("[Error at meili_tools.py::search_article_ids] 搜索失败", e)
+			return None
+
+	def search_articles(self, search_query, max_results=1000, account_ids=None, time_from=None):
+		'''
+		根据搜索查询返回文章id列表（按相关度）
+		:param account_ids: 公众号id列表，None 表示不限
+		:param time_from: 发布时间下限（Unix时间戳，包含）
+		'''
+		if not self.valid:
+			print("[Error at meili_tools.py::search_articles] 索引无效")
+			return None
+		filters = []
+		if account_ids is not None:
+			filters.append(f"public_account_id IN [{', '.join(str(int(account_id)) for account_id in account_ids)}]")
+		if time_from is not None:
+			filters.append(f"publish_time >= {int(time_from)}")
+		params = {
+			"limit": max_results,
+			"attributesToRetrieve": ["id"]
+		}
+		if filters:
+			params["filter"] = " AND ".join(filters)
+		try:
+			result = self.index.search(search_query, params)
 			id_list = [hit['id'] for hit in result['hits']]
 			return id_list
 		except Exception as e:
 			print("[Error at meili_tools.py::search_articles] 搜索失败", e)
-			return []
+			return None
 		
 	def get_article_index_by_id(self, article_id):
 		'''
@@ -130,14 +219,8 @@ class MeilisearchTool:
 			return None
 		try:
 			article = Article.objects.get(id=article_id)
-			article_index_info = {
-				"id": article_id,
-				"title": article.title,
-				"content": article.content,
-				"summary": article.summary,
-				"key_info": article.key_info
-			}
-			task = self.index.add_documents([article_index_info])
+			task = self.index.add_documents([article_document(article)])
+			return True
 		except Article.DoesNotExist:
 			print("[Error at meili_tools.py::update_article] 数据库中不存在该文章")
 		except Exception as e:
@@ -152,17 +235,7 @@ class MeilisearchTool:
 			print("[Error at meili_tools.py::update_batch_articles] 索引无效")
 			return None
 		try:
-			articles_info = []
-			queryset = Article.objects.filter(id__in=articles_id).order_by('-id')
-			for article in queryset:
-				article_info = {
-					"id": article.id,
-					"title": article.title,
-					"content": article.content,
-					"summary": article.summary,
-					"key_info": article.key_info
-				}
-				articles_info.append(article_info)
+			articles_info = [article_document(article) for article in Article.objects.filter(id__in=articles_id).order_by('-id')]
 			batch_size = 500
 			for i in range(0, len(articles_info), batch_size):
 				batch = articles_info[i:i+batch_size]
@@ -223,14 +296,7 @@ class MeilisearchTool:
 			articles_info = []
 			queryset = queryset.filter(id__in=mysql_ids)
 			for article in queryset:
-				article_info = {
-					"id": article.id,
-					"title": article.title,
-					"content": article.content,
-					"summary": article.summary,
-					"key_info": article.key_info
-				}
-				articles_info.append(article_info)
+				articles_info.append(article_document(article))
 			batch_size = 500
 			for i in range(0, len(articles_info), batch_size):
 				batch = articles_info[i:i+batch_size]
@@ -269,14 +335,7 @@ class MeilisearchTool:
 			queryset = Article.objects.exclude(summary="").order_by('-id')
 			articles_info = []
 			for article in queryset:
-				article_info = {
-					"id": article.id,
-					"title": article.title,
-					"content": article.content,
-					"summary": article.summary,
-					"key_info": article.key_info
-				}
-				articles_info.append(article_info)
+				articles_info.append(article_document(article))
 			batch_size = 500
 			for i in range(0, len(articles_info), batch_size):
 				batch = articles_info[i:i+batch_size]
@@ -7,6 +7,73 @@ from django.db.models.signals import post_save
 from user.models import User, Subscription
 from webspider.models import PublicAccount, Article
 from remoteAI.remoteAI.tags import TAGS
+from remoteAI.remoteAI.vectorize import KEYWORD_VECTOR_DIM
+from article_selector.vecstore.vecstore_tool import fit_vector
+from se_groupwork.global_tools import global_vecstore_tool_load
+
+
+def _get_account_weight(account_preference, account_id):
+    """
+    读取公众号偏好权重
+    - account_preference 经过JSON存储后键为字符串，新建但未落库时键为整数，两种都需兼容
+    """
+    if str(account_id) in account_preference:
+        return account_preference[str(account_id)]
+    return account_preference.get(account_id, 0)
+
+
+def _account_weight_table(account_preference):
+    """
+    将公众号偏好转为(有序id数组, 权重数组)，便于向量化查表
+    """
+    table = {}
+    for account_id, weight in account_preference.items():
+        try:
+            table[int(account_id)] = weight
+        except (TypeError, ValueError):
+            continue
+    account_ids = np.array(sorted(table.keys()), dtype=np.int64)
+    weights = np.array([table[account_id] for account_id in account_ids], dtype=np.float64)
+    return account_ids, weights
+
+
+def _update_account_preference(account_preference, account_id, alpha):
+    """
+    单次行为对公众号偏好的更新（含低权重剪枝与归一化）
+    """
+    account_id = str(account_id)
+    if len(account_preference) == 0:
+        return {account_id: 1}
+    if account_id in account_preference:
+        account_preference[account_id] *= (1 - alpha)
+    else:
+        account_preference[account_id] = 1/10
+    tar = 1 - account_preference[account_id]
+    cur = 0
+    account_preference_origin_key = list(account_preference.keys())
+    for id in account_preference_origin_key:
+        if account_preference[id] < 1/20:
+            del account_preference[id]
+        else:
+            cur += account_preference[id]
+    for id in list(account_preference.keys()):
+        account_preference[id] = account_preference[id]/cur * tar
+    return account_preference
+
+
+def _exponential_decay(base, events):
+    """
+    依次执行 v = (1-a)·v + a·x 的闭式结果
+    :param base: 初始向量 v_0
+    :param events: [(x_i, a_i), ...]
+    """
+    vectors = np.stack([vector for vector, _ in events]).astype(np.float64)
+    alphas = np.array([alpha for _, alpha in events], dtype=np.float64)
+    # keep[i] = Π_{j>=i}(1-a_j)，即第 i 次更新之后（含）保留的比例
+    keep = np.cumprod((1 - alphas)[::-1])[::-1]
+    weights = alphas * np.append(keep[1:], 1.0)
+    return keep[0] * base + weights @ vectors
+
 
 # Create your models here.
 class PreferenceManager(models.Manager):
@@ -59,39 +126,52 @@ class PreferenceManager(models.Manager):
         :param operation: 操作("browse", "favorite")
         :return: 用户偏好
         """
+        return self.update_preference_by_articles(user, [(article, alpha)])
+
+    def update_preference_by_articles(self, user, events):
+        """
+        根据用户的一组行为更新用户偏好，只读写一次偏好记录
+        :param user: 用户
+        :param events: 按发生顺序排列的[(文章, alpha), ...]
+        :return: 用户偏好
+        """
         item = self.get_user_preferences(user)
+        self.apply_article_events(item, events)
+        item.save()
+        return item
+
+    def apply_article_events(self, item, events):
+        """
+        将一组行为依次作用到偏好对象上（不保存）
+        - 公众号偏好含剪枝和归一化，逐条计算
+        - 标签/关键词偏好是指数衰减平均，k 次更新合并为一次闭式计算：
+          v_k = Π(1-a_i)·v_0 + Σ a_i·Π_{j>i}(1-a_j)·x_i
+        :param item: 用户偏好
+        :param events: 按发生顺序排列的[(文章, alpha), ...]
+        """
+        if not events:
+            return item
         # 更新公众号偏好
-        account_id = str(article.public_account.id)
-        if len(item.account_preference) == 0:
-            item.account_preference = {account_id: 1}
-        else:
-            if account_id in item.account_preference:
-                item.account_preference[account_id] *= (1 - alpha)
-            else:
-                item.account_preference[account_id] = 1/10
-            tar = 1 - item.account_preference[account_id]
-            cur = 0
-            account_preference_origin_key = list(item.account_preference.keys())
-            for id in account_preference_origin_key:
-                if item.account_preference[id] < 1/20:
-                    del item.account_preference[id]
-                else:
-                    cur += item.account_preference[id]
-            for id in list(item.account_preference.keys()):
-                item.account_preference[id] = item.account_preference[id]/cur * tar
+        for article, alpha in events:
+            item.account_preference = _update_account_preference(item.account_preference, article.public_account_id, alpha)
         # 更新标签偏好
-        tags_vector = np.array(article.tags_vector)
         tag_preference_vector = np.array(item.tag_preference)
-        if tags_vector.shape[0] == len(TAGS) and tag_preference_vector.shape[0] == len(TAGS):
-            tag_preference_vector = (1 - alpha) * tag_preference_vector + alpha * tags_vector
-            item.tag_preference = tag_preference_vector.tolist()
+        if tag_preference_vector.shape[0] == len(TAGS):
+            tag_events = [
+                (np.asarray(article.tags_vector), alpha) for article, alpha in events
+                if np.asarray(article.tags_vector).shape[0] == len(TAGS)
+            ]
+            if tag_events:
+                item.tag_preference = _exponential_decay(tag_preference_vector, tag_events).tolist()
         # 更新关键词偏好
-        semantic_vector = np.array(article.semantic_vector)
         keyword_preference_vector = np.array(item.keyword_preference)
-        if semantic_vector.shape[0] == 100 and keyword_preference_vector.shape[0] == 100:
-            keyword_preference_vector = (1 - alpha) * keyword_preference_vector + alpha* semantic_vector
-            item.keyword_preference = keyword_preference_vector.tolist()
-        item.save()
+        if keyword_preference_vector.shape[0] == KEYWORD_VECTOR_DIM:
+            keyword_events = [
+                (np.asarray(article.semantic_vector), alpha) for article, alpha in events
+                if np.asarray(article.semantic_vector).shape[0] == KEYWORD_VECTOR_DIM
+            ]
+            if keyword_events:
+                item.keyword_preference = _exponential_decay(keyword_preference_vector, keyword_events).tolist()
         return item
 
     def caculate_preference(self, user, article):
@@ -99,22 +179,81 @@ class PreferenceManager(models.Manager):
         preference = self.get_user_preferences(user)
         # 计算公众号偏好
         account_id = article.public_account.id
-        if account_id in preference.account_preference:
-            score += preference.account_preference[account_id]
+        score += _get_account_weight(preference.account_preference, account_id)
         # 计算标签偏好
         tags = article.tags
         if "重大" in tags:  score += 0.5
-        tags_vector = np.array(article.tags_vector)
+        tags_vector = np.asarray(article.tags_vector)
         tag_preference_vector = np.array(preference.tag_preference)
         if tags_vector.shape[0] == len(TAGS) and tag_preference_vector.shape[0] == len(TAGS):
             score += np.dot(tags_vector, tag_preference_vector)
         # 计算关键词偏好
-        semantic_vector = np.array(article.semantic_vector)
+        semantic_vector = np.asarray(article.semantic_vector)
         keyword_preference_vector = np.array(preference.keyword_preference)
-        if semantic_vector.shape[0] == 100 and keyword_preference_vector.shape[0] == 100:
+        if semantic_vector.shape[0] == KEYWORD_VECTOR_DIM and keyword_preference_vector.shape[0] == KEYWORD_VECTOR_DIM:
             score += np.dot(semantic_vector, keyword_preference_vector)
         return score
 
+    def caculate_preferences(self, user, articles):
+        """
+        批量计算用户对一组文章的偏好得分（与 caculate_preference 逐篇计算的结果一致）
+        - 用户偏好只读取一次
+        - 向量优先从所有worker共享的内存映射矩阵中读取，公众号和标签直接使用候选文章已加载的字段
+        - 矩阵中缺失的文章、或未加载公众号/标签字段的文章，通过一次查询补齐
+        - 组装为矩阵后做一次矩阵-向量乘法
+        :param user: 用户
+        :param articles: 候选文章（列表或QuerySet）
+        :return: 与 articles 顺序一致的得分数组
+        """
+        articles = list(articles)
+        if not articles:
+            return np.zeros(0)
+        preference = self.get_user_preferences(user)
+        article_ids = [article.id for article in articles]
+        tags_matrix, semantic_matrix, found = global_vecstore_tool_load().get_vectors(article_ids)
+        candidate_account_ids = np.zeros(len(articles), dtype=np.int64)
+        candidate_tags = [[] for _ in articles]
+        missing = []
+        for row, article in enumerate(articles):
+            deferred = article.get_deferred_fields()
+            if not found[row] or 'tags' in deferred or 'public_account_id' in deferred:
+                missing.append(row)
+            else:
+                candidate_account_ids[row] = article.public_account_id
+                candidate_tags[row] = article.tags
+        if missing:
+            rows = {
+                row[0]: row[1:]
+                for row in Article.objects.filter(id__in=[article_ids[row] for row in missing]).values_list(
+                    'id', 'public_account_id', 'tags', 'tags_vector', 'semantic_vector'
+                )
+            }
+            for row in missing:
+                account_id, tags, tags_vector, semantic_vector = rows.get(article_ids[row], (0, [], [], []))
+                candidate_account_ids[row] = account_id
+                candidate_tags[row] = tags
+                if not found[row]:
+                    tags_matrix[row] = fit_vector(tags_vector, len(TAGS))
+                    semantic_matrix[row] = fit_vector(semantic_vector, KEYWORD_VECTOR_DIM)
+        scores = np.zeros(len(articles), dtype=np.float64)
+        # 计算公众号偏好：在有序id表中二分查找，向量化取权重
+        account_ids, weights = _account_weight_table(preference.account_preference)
+        if account_ids.shape[0] > 0:
+            positions = np.searchsorted(account_ids, candidate_account_ids)
+            positions = np.minimum(positions, account_ids.shape[0] - 1)
+            matched = account_ids[positions] == candidate_account_ids
+            scores += np.where(matched, weights[positions], 0)
+        # 计算标签偏好
+        scores += np.array([0.5 if "重大" in (tags or []) else 0 for tags in candidate_tags])
+        tag_preference_vector = np.array(preference.tag_preference)
+        if tag_preference_vector.shape[0] == len(TAGS):
+            scores += tags_matrix.astype(np.float64) @ tag_preference_vector
+        # 计算关键词偏好
+        keyword_preference_vector = np.array(preference.keyword_preference)
+        if keyword_preference_vector.shape[0] == KEYWORD_VECTOR_DIM:
+            scores += semantic_matrix.astype(np.float64) @ keyword_preference_vector
+        return scores
+
 class Preference(models.Model):
     """
     用户偏好表：存储用户对公众号、标签、关键词的偏好权重
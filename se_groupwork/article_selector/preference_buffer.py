@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from user.models import User
+from webspider.models import Article
+from article_selector.models import Preference
+import threading
+import atexit
+
+'''
+用户偏好的延迟合并写入
+History/Favorite 的 post_save 只把 (user_id, article_id, alpha) 放入缓冲区，
+由后台线程定期（或缓冲事件数达到阈值时）按用户合并：
+每个用户一批事件只读写一次 Preference，标签/关键词偏好用闭式指数衰减一次算完
+'''
+
+
+class PreferenceUpdateBuffer:
+    _instance = None
+    initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, flush_interval=None, flush_threshold=None):
+        if PreferenceUpdateBuffer.initialized:
+            return
+        PreferenceUpdateBuffer.initialized = True
+        self.flush_interval = flush_interval if flush_interval is not None else settings.PREFERENCE_BUFFER_FLUSH_INTERVAL
+        self.flush_threshold = flush_threshold if flush_threshold is not None else settings.PREFERENCE_BUFFER_FLUSH_THRESHOLD
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._events = {}  # user_id -> [(article_id, alpha), ...]，按发生顺序
+        self._pending = 0
+        self._timer = None
+        self._flush_scheduled = False  # 已启动达到阈值的后台刷新，取出事件前不再启动
+        atexit.register(self.flush)
+        print("[Info at preference_buffer.py::__init__] PreferenceUpdateBuffer 初始化",
+              f"interval={self.flush_interval}s threshold={self.flush_threshold}")
+
+    def add_event(self, user_id, article_id, alpha):
+        '''
+        记录一次用户行为，达到阈值时立即在后台刷新
+        '''
+        with self._lock:
+            self._events.setdefault(user_id, []).append((article_id, alpha))
+            self._pending += 1
+            start_flush = self._pending >= self.flush_threshold and not self._flush_scheduled
+            if start_flush:
+                self._flush_scheduled = True
+            elif self._pending < self.flush_threshold:
+                self._schedule_timer()
+        if start_flush:
+            threading.Thread(target=self._flush_in_background, daemon=True).start()
+
+    def _schedule_timer(self):
+        '''需持有 _lock'''
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def get_pending_count(self):
+        with self._lock:
+            return self._pending
+
+    def _take_events(self):
+        with self._lock:
+            events = self._events
+            self._events = {}
+            self._pending = 0
+            self._flush_scheduled = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return events
+
+    def _restore_events(self, events):
+        '''写入失败时放回缓冲区（排在期间新增的事件之前），等下一次定时刷新重试'''
+        with self._lock:
+            for user_id, user_events in events.items():
+                self._events[user_id] = user_events + self._events.get(user_id, [])
+                self._pending += len(user_events)
+            self._schedule_timer()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # 后台线程持有的数据库连接不会被请求周期回收，需手动关闭
+            close_old_connections()
+
+    def flush(self):
+        '''
+        将缓冲区中的事件写入数据库
+        :return: 本次更新的用户数
+        '''
+        with self._flush_lock:
+            events = self._take_events()
+            if not events:
+                return 0
+            try:
+                return self._apply(events)
+            except Exception as e:
+                print("[Error at preference_buffer.py::flush] 偏好更新写入失败，事件已放回缓冲区", e)
+                self._restore_events(events)
+                return 0
+
+    def _apply(self, events):
+        article_ids = {article_id for user_events in events.values() for article_id, _ in user_events}
+        articles = Article.objects.only('id', 'public_account_id', 'tags_vector', 'semantic_vector').in_bulk(article_ids)
+        users = User.objects.in_bulk(events.keys())
+        now = timezone.now()
+        with transaction.atomic():
+            items = {
+                item.user_id: item
+                for item in Preference.objects.select_for_update().filter(user_id__in=users.keys())
+            }
+            updated = []
+            for user_id, user_events in events.items():
+                if user_id not in users:
+                    continue
+                item = items.get(user_id) or Preference.objects.get_user_preferences(users[user_id])
+                article_events = [
+                    (articles[article_id], alpha) for article_id, alpha in user_events if article_id in articles
+                ]
+                Preference.objects.apply_article_events(item, article_events)
+                item.updated_at = now
+                updated.append(item)
+            Preference.objects.bulk_update(updated, ['account_preference', 'tag_preference', 'keyword_preference', 'updated_at'])
+        print(f"[Info at preference_buffer.py::flush] 合并{sum(len(e) for e in events.values())}次行为，更新{len(updated)}个用户的偏好")
+        return len(updated)
@@ -0,0 +1,74 @@
+'''
+全文搜索后端
+- 各搜索引擎（MeilisearchTool、SqliteFtsTool）实现相同的方法，不可用或出错时返回None
+- SearchBackendChain：按 settings.SEARCH_BACKENDS 的顺序组合多个后端
+  搜索时依次尝试，前一个不可用（返回None）时使用下一个；写入时同步到所有可用后端
+  空结果不回退：分页的后续请求必须与首页由同一个后端处理，否则游标之后的结果会被截断
+'''
+
+
+class SearchBackendChain:
+    def __init__(self, backends, test_mode=False):
+        self.backends = backends
+        self.test_mode = test_mode
+        self.valid = any(backend.valid for backend in backends)
+        print("[Info at search_backend.py::__init__] 搜索后端:", [type(backend).__name__ for backend in backends],
+              "可用:", [type(backend).__name__ for backend in backends if backend.valid])
+
+    def _valid_backends(self):
+        return [backend for backend in self.backends if backend.valid]
+
+    def _first(self, method, *args, **kwargs):
+        '''读操作：返回第一个可用后端的结果，后端返回None（不可用/出错）时使用下一个'''
+        if not self.valid:
+            print(f"[Error at search_backend.py::{method}] 索引无效")
+            return None
+        for backend in self._valid_backends():
+            result = getattr(backend, method)(*args, **kwargs)
+            if result is not None:
+                return result
+        return None
+
+    def _all(self, method, *args, **kwargs):
+        '''写操作：同步到所有可用后端，任一成功即返回True'''
+        if not self.valid:
+            print(f"[Error at search_backend.py::{method}] 索引无效")
+            return None
+        results = [getattr(backend, method)(*args, **kwargs) for backend in self._valid_backends()]
+        return True if any(result is not None for result in results) else None
+
+    def search_articles(self, search_query, max_results=1000, account_ids=None, time_from=None):
+        return self._first('search_articles', search_query, max_results=max_results, account_ids=account_ids, time_from=time_from)
+
+    def search_article_ids(self, search_query, account_ids=None, time_from=None, time_to=None, tags=None, before=None, offset=0, limit=20):
+        return self._first(
+            'search_article_ids', search_query,
+            account_ids=account_ids, time_from=time_from, time_to=time_to, tags=tags, before=before, offset=offset, limit=limit
+        )
+
+    def get_article_index_by_id(self, article_id):
+        return self._first('get_article_index_by_id', article_id)
+
+    def get_article_index_count(self):
+        return self._first('get_article_index_count')
+
+    def get_all_articles_index(self):
+        return self._first('get_all_articles_index')
+
+    def update_article(self, article_id):
+        return self._all('update_article', article_id)
+
+    def update_batch_articles(self, articles_id):
+        return self._all('update_batch_articles', articles_id)
+
+    def delete_article(self, article_id):
+        return self._all('delete_article', article_id)
+
+    def sync_articles_index_with_mysql(self):
+        return self._all('sync_articles_index_with_mysql')
+
+    def clear_index(self):
+        return self._all('clear_index')
+
+    def rebuild_index(self):
+        return self._all('rebuild_index')
@@ -44,4 +44,5 @@ class ArticlesFilterSerializer(serializers.Serializer):
     tags = serializers.ListField(child=serializers.CharField(), required=False)
     date_from = serializers.DateField(required=False, format="%Y-%m-%dT%H:%M:%S.%f%z")
     date_to = serializers.DateField(required=False, format="%Y-%m-%dT%H:%M:%S.%f%z")
-    search_content = serializers.CharField(required=False)
\ No newline at end of file
+    search_content = serializers.CharField(required=False)
+    cursor = serializers.CharField(required=False, allow_blank=True, help_text='分页游标，传入后忽略start_rank')
\ No newline at end of file
@@ -1,9 +1,11 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from article_selector.models import Preference
 from user.models import User, Favorite, History, Subscription
-from webspider.models import PublicAccount
-from article_selector.article_selector import get_campus_accounts
+from webspider.models import PublicAccount, Article
+from article_selector.article_selector import get_campus_accounts, invalidate_campus_accounts
+from django.conf import settings
+from se_groupwork.global_tools import global_vecstore_tool_load, global_preference_buffer_load, global_fts_tool_load, is_test_mode
 
 @receiver(post_save, sender=User)
 def init_user_preferences(sender, instance, created, **kwargs):
@@ -25,15 +27,79 @@ def delete_user_preferences(sender, instance, **kwargs):
     Preference.objects.filter(user=instance).delete()
 
 
+def _update_preference(instance, alpha):
+    # 测试模式下同步更新，便于断言；否则只记录id，交给缓冲区合并写入
+    if is_test_mode() or not settings.PREFERENCE_BUFFER_ENABLED:
+        Preference.objects.update_preference_by_article(instance.user, instance.article, alpha=alpha)
+        return
+    global_preference_buffer_load().add_event(instance.user_id, instance.article_id, alpha)
+
+
 @receiver(post_save, sender=History)
 def update_preference_by_new_browse(sender, instance, created, **kwargs):
-    user = instance.user
-    article = instance.article
-    Preference.objects.update_preference_by_article(user, article, alpha=0.1)
+    _update_preference(instance, alpha=0.1)
 
 
 @receiver(post_save, sender=Favorite)
 def update_preference_by_new_favorite(sender, instance, created, **kwargs):
-    user = instance.user
-    article = instance.article
-    Preference.objects.update_preference_by_article(user, article, alpha=0.2)
+    _update_preference(instance, alpha=0.2)
+
+
+@receiver(post_save, sender=Article)
+def update_vecstore_by_article(sender, instance, created, **kwargs):
+    # 未加载向量字段的保存不会修改向量，无需同步
+    deferred = instance.get_deferred_fields()
+    if 'tags_vector' in deferred or 'semantic_vector' in deferred:
+        return
+    vecstore = global_vecstore_tool_load()
+    vecstore.upsert_vectors([(instance.id, instance.tags_vector, instance.semantic_vector)])
+
+
+@receiver(post_delete, sender=Article)
+def delete_vecstore_by_article(sender, instance, **kwargs):
+    vecstore = global_vecstore_tool_load()
+    vecstore.delete_articles([instance.id])
+
+
+@receiver(post_save, sender=Article)
+def update_fts_by_article(sender, instance, created, **kwargs):
+    # 本地全文索引写入代价低，随文章保存实时同步（Meilisearch仍由任务批量同步）
+    if 'sqlite_fts' not in settings.SEARCH_BACKENDS:
+        return
+    if instance.get_deferred_fields() & {'title', 'summary', 'key_info', 'content', 'tags', 'publish_time'}:
+        return
+    global_fts_tool_load().index_articles([instance])
+
+
+@receiver(post_delete, sender=Article)
+def delete_fts_by_article(sender, instance, **kwargs):
+    if 'sqlite_fts' not in settings.SEARCH_BACKENDS:
+        return
+    global_fts_tool_load().delete_article(instance.id)
+
+
+@receiver(pre_save, sender=PublicAccount)
+def record_default_status(sender, instance, update_fields=None, **kwargs):
+    # 记录保存前的 is_default，供 post_save 判断是否变化
+    if update_fields is not None and 'is_default' not in update_fields:
+        instance._old_is_default = instance.is_default
+        return
+    if instance.pk is None:
+        instance._old_is_default = None
+        return
+    instance._old_is_default = PublicAccount.objects.filter(pk=instance.pk).values_list('is_default', flat=True).first()
+
+
+@receiver(post_save, sender=PublicAccount)
+def invalidate_campus_accounts_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'is_default' not in update_fields:
+        return
+    old_is_default = getattr(instance, '_old_is_default', None)
+    if (old_is_default is None and instance.is_default) or (old_is_default is not None and old_is_default != instance.is_default):
+        invalidate_campus_accounts()
+
+
+@receiver(post_delete, sender=PublicAccount)
+def invalidate_campus_accounts_on_delete(sender, instance, **kwargs):
+    if instance.is_default:
+        invalidate_campus_accounts()
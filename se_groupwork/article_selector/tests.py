@@ -1,10 +1,18 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.cache import cache
 from article_selector.models import Preference
 from article_selector.article_selector import sort_articles_by_preference, get_campus_accounts, get_accounts_by_user, get_customized_accounts
+from article_selector.article_selector import get_campus_account_ids, get_customized_account_ids, get_account_ids_by_user
 from user.models import User, Subscription, History, Favorite
 from webspider.models import PublicAccount, Article
 from article_selector.meilisearch.meili_tools import MeilisearchTool
-from se_groupwork.global_tools import global_meili_tool_load
+from article_selector.fts.fts_tool import bigram_text, bigram_query
+from article_selector.search_backend import SearchBackendChain
+from se_groupwork.global_tools import global_meili_tool_load, global_vecstore_tool_load, global_preference_buffer_load, global_fts_tool_load
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+import numpy as np
 import json
 import time
 
@@ -121,6 +129,223 @@ class ArticleSelectorTestCase(TestCase):
         print("test 05: recommend article")
         t05_recommend_article(self)
 
+    def test_batch_preference_score(self):
+        for user in self.users_info:
+            User.objects.create_user(**user)
+        for account in self.accounts_info:
+            PublicAccount.objects.create(**account, is_default=True)
+        for article in self.articles_info:
+            account = PublicAccount.objects.get(fakeid=article['public_account'])
+            Article.objects.create(
+                public_account=account,
+                title=article['title'],
+                content=article['content'],
+                article_url=article['article_url'],
+                publish_time=article['publish_time'],
+                summary=article['summary'],
+                tags=article['tags'],
+                key_info=article['key_info'],
+                tags_vector=article['tags_vector'],
+                semantic_vector=article['semantic_vector']
+            )
+        user = User.objects.first()
+        for article in Article.objects.all()[:3]:
+            History.objects.create_history(user, article)
+        articles = list(Article.objects.all())
+        batch_scores = Preference.objects.caculate_preferences(user, articles)
+        for article, batch_score in zip(articles, batch_scores):
+            self.assertAlmostEqual(batch_score, Preference.objects.caculate_preference(user, article))
+        self.assertEqual(len(Preference.objects.caculate_preferences(user, [])), 0)
+
+    def test_preference_buffer(self):
+        for user in self.users_info:
+            User.objects.create_user(**user)
+        for account in self.accounts_info:
+            PublicAccount.objects.create(**account, is_default=True)
+        for article in self.articles_info:
+            account = PublicAccount.objects.get(fakeid=article['public_account'])
+            Article.objects.create(
+                public_account=account,
+                title=article['title'],
+                content=article['content'],
+                article_url=article['article_url'],
+                publish_time=article['publish_time'],
+                summary=article['summary'],
+                tags=article['tags'],
+                key_info=article['key_info'],
+                tags_vector=article['tags_vector'],
+                semantic_vector=article['semantic_vector']
+            )
+        sequential_user, buffered_user = User.objects.all()[:2]
+        for user in (sequential_user, buffered_user):
+            Preference.objects.filter(user=user).update(tag_preference=[0.05] * 20)
+        articles = list(Article.objects.all()[:6])
+        events = [(article, 0.1 if i % 2 == 0 else 0.2) for i, article in enumerate(articles + articles[:2])]
+        # 逐条同步更新
+        for article, alpha in events:
+            Preference.objects.update_preference_by_article(sequential_user, article, alpha=alpha)
+        # 缓冲后合并更新
+        buffer = global_preference_buffer_load()
+        for article, alpha in events:
+            buffer.add_event(buffered_user.id, article.id, alpha)
+        self.assertEqual(buffer.get_pending_count(), len(events))
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.get_pending_count(), 0)
+        self.assertEqual(buffer.flush(), 0)
+        sequential = Preference.objects.get(user=sequential_user)
+        buffered = Preference.objects.get(user=buffered_user)
+        self.assertEqual(set(sequential.account_preference.keys()), set(buffered.account_preference.keys()))
+        for account_id, weight in sequential.account_preference.items():
+            self.assertAlmostEqual(weight, buffered.account_preference[account_id])
+        np.testing.assert_allclose(sequential.tag_preference, buffered.tag_preference)
+        np.testing.assert_allclose(sequential.keyword_preference, buffered.keyword_preference)
+        # 写入失败时事件放回缓冲区，下次刷新重试
+        buffer.add_event(buffered_user.id, articles[0].id, 0.1)
+        with mock.patch.object(buffer, '_apply', side_effect=RuntimeError("数据库不可用")):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.get_pending_count(), 1)
+        self.assertEqual(buffer.flush(), 1)
+        # 超过阈值后只启动一个后台刷新线程
+        with mock.patch.object(buffer, 'flush_threshold', 2), \
+                mock.patch.object(buffer, '_flush_in_background') as flush_in_background:
+            for article in articles:
+                buffer.add_event(buffered_user.id, article.id, 0.1)
+            time.sleep(0.1)
+        self.assertEqual(flush_in_background.call_count, 1)
+        self.assertEqual(buffer.flush(), 1)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_account_ids_cache(self):
+        # 使用进程内缓存，测试不依赖 Redis 服务
+        cache.clear()
+        for user in self.users_info:
+            User.objects.create_user(**user)
+        for account in self.accounts_info:
+            PublicAccount.objects.create(**account)
+        user = User.objects.first()
+        campus_ids = sorted(account.id for account in get_campus_accounts())
+        self.assertEqual(sorted(get_campus_account_ids()), campus_ids)
+        self.assertEqual(sorted(get_customized_account_ids(user)), [])
+        # 命中缓存后不再查询数据库
+        with CaptureQueriesContext(connection) as ctx:
+            get_account_ids_by_user(user)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        # 订阅/取消订阅使用户缓存失效
+        account = PublicAccount.objects.exclude(id__in=campus_ids).first() or PublicAccount.objects.first()
+        Subscription.objects.create_subscription(user, account)
+        self.assertEqual(get_customized_account_ids(user), [account.id])
+        self.assertEqual(sorted(get_account_ids_by_user(user)), sorted(set(campus_ids) | {account.id}))
+        Subscription.objects.filter(user=user).delete()
+        self.assertEqual(get_customized_account_ids(user), [])
+        # is_default 变化使校内公众号缓存失效
+        default_account = PublicAccount.objects.get(id=campus_ids[0])
+        PublicAccount.objects.filter(id=default_account.id).update(name="非默认公众号")
+        default_account.refresh_from_db()
+        default_account.save()
+        self.assertEqual(sorted(get_campus_account_ids()), campus_ids[1:])
+        # 与 is_default 无关的保存不影响缓存
+        default_account.save(update_fields=['last_crawl_time'])
+        with CaptureQueriesContext(connection) as ctx:
+            get_campus_account_ids()
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_search_backend_chain(self):
+        class FakeBackend:
+            valid = True
+
+            def __init__(self, result):
+                self.result = result
+                self.calls = 0
+
+            def search_article_ids(self, search_query, **kwargs):
+                self.calls += 1
+                return self.result
+
+        # 首个后端不可用（返回None）时使用下一个
+        unavailable, fallback = FakeBackend(None), FakeBackend([3, 2])
+        chain = SearchBackendChain([unavailable, fallback])
+        self.assertEqual(chain.search_article_ids("讲座"), [3, 2])
+        self.assertEqual(chain.search_article_ids("讲座", before=(1, 2)), [3, 2])
+        # 空结果不回退：首页与后续分页始终由同一个后端处理
+        empty, other = FakeBackend([]), FakeBackend([1])
+        chain = SearchBackendChain([empty, other])
+        self.assertEqual(chain.search_article_ids("讲座"), [])
+        self.assertEqual(chain.search_article_ids("讲座", before=(1, 2)), [])
+        self.assertEqual(other.calls, 0)
+
+    def test_fts_search(self):
+        self.assertEqual(bigram_text("清华大学 AI"), " 清华 华大 大学 学  AI")
+        self.assertEqual(bigram_query("华大"), '"华大"')
+        self.assertEqual(bigram_query("AI清华"), '"AI" "清华"')
+        self.assertEqual(bigram_query("学"), '"学"*')
+        fts_tool = global_fts_tool_load()
+        self.assertTrue(fts_tool.valid)
+        for account in self.accounts_info:
+            PublicAccount.objects.create(**account)
+        for article in self.articles_info:
+            account = PublicAccount.objects.get(fakeid=article['public_account'])
+            Article.objects.create(
+                public_account=account,
+                title=article['title'],
+                content=article['content'],
+                article_url=article['article_url'],
+                publish_time=article['publish_time'],
+                summary=article['summary'],
+                tags=article['tags'],
+                key_info=article['key_info'],
+                tags_vector=article['tags_vector'],
+                semantic_vector=article['semantic_vector']
+            )
+        # 保存信号已实时写入
+        fts_tool.rebuild_index()
+        self.assertEqual(fts_tool.get_article_index_count(), Article.objects.exclude(summary='').count())
+        articles = Article.objects.exclude(summary='').order_by('-publish_time', '-id')
+        expected = [article.id for article in articles if '学期' in article.title + article.content + article.summary + article.key_info]
+        self.assertEqual(set(fts_tool.search_articles("学期")), set(expected))
+        self.assertEqual(fts_tool.search_article_ids("学期", limit=100), expected)
+        self.assertEqual(fts_tool.search_article_ids("学期", account_ids=[]), [])
+        # 删除文章同步删除索引
+        Article.objects.get(id=expected[0]).delete()
+        self.assertNotIn(expected[0], fts_tool.search_articles("学期"))
+
+    def test_vecstore(self):
+        vecstore = global_vecstore_tool_load()
+        vecstore.clear()
+        self.assertTrue(vecstore.test_mode)
+        tags, semantic, found = vecstore.get_vectors([1, 2])
+        self.assertFalse(found.any())
+        # 写入、覆盖与超出初始容量的追加
+        vecstore.upsert_vectors([(1, [1.0] * 20, [0.5] * 100), (5000, [0.0] * 20, [1.0] * 100)])
+        vecstore.upsert_vectors([(1, [0.0] * 20, [0.25] * 100), (2, [1.0], [1.0])])
+        vecstore.upsert_vectors([(i, [1.0] * 20, [float(i)] * 100) for i in range(10, 2100)])
+        tags, semantic, found = vecstore.get_vectors([1, 2, 3, 5000, 2099])
+        self.assertEqual(found.tolist(), [True, True, False, True, True])
+        self.assertAlmostEqual(float(semantic[0][0]), 0.25)
+        self.assertEqual(float(tags[1].sum()), 0)  # 维度不符的向量记为零向量
+        self.assertAlmostEqual(float(semantic[4][0]), 2099)
+        vecstore.delete_articles([1])
+        tags, semantic, found = vecstore.get_vectors([1])
+        self.assertFalse(found[0])
+        self.assertEqual(vecstore.get_count(), 2092)
+        # 从数据库重建
+        for account in self.accounts_info:
+            PublicAccount.objects.create(**account, is_default=True)
+        for article in self.articles_info:
+            Article.objects.create(
+                public_account=PublicAccount.objects.get(fakeid=article['public_account']),
+                title=article['title'],
+                article_url=article['article_url'],
+                publish_time=article['publish_time'],
+                tags_vector=article['tags_vector'],
+                semantic_vector=article['semantic_vector']
+            )
+        vecstore.rebuild()
+        self.assertEqual(vecstore.get_count(), len(self.articles_info))
+        article = Article.objects.first()
+        tags, semantic, found = vecstore.get_vectors([article.id])
+        self.assertTrue(found[0])
+        self.assertTrue(np.allclose(semantic[0], article.semantic_vector))
+
     def test_meili_search(self):
         def t00_setup(self):
             for account in self.accounts_info:
@@ -201,9 +426,29 @@ class ArticleSelectorTestCase(TestCase):
                 self.assertTrue(Article.objects.filter(id=id).exists())
             return
 
+        def t05_meili_filtered_search(self, meili_tool: MeilisearchTool):
+            articles = Article.objects.exclude(summary='').order_by('-publish_time', '-id')
+            account_id = articles[0].public_account_id
+            # 按公众号过滤、按发布时间倒序分页
+            expected = [article.id for article in articles.filter(public_account_id=account_id) if '学期' in article.title + article.content + article.summary + article.key_info]
+            page = meili_tool.search_article_ids("学期", account_ids=[account_id], limit=100)
+            self.assertEqual(set(page), set(expected))
+            times = [Article.objects.get(id=id).publish_time for id in page]
+            self.assertEqual(times, sorted(times, reverse=True))
+            # offset 分页与游标分页一致
+            all_ids = meili_tool.search_article_ids("学期", limit=100)
+            self.assertEqual(meili_tool.search_article_ids("学期", offset=1, limit=2), all_ids[1:3])
+            first = Article.objects.get(id=all_ids[0])
+            self.assertEqual(meili_tool.search_article_ids("学期", before=(first.publish_time.timestamp(), first.id), limit=2), all_ids[1:3])
+            # 不存在的公众号和标签
+            self.assertEqual(meili_tool.search_article_ids("学期", account_ids=[-1]), [])
+            self.assertEqual(meili_tool.search_article_ids("学期", tags=["不存在的标签"]), [])
+            return
+
         def t06_meili_invalid(self, meili_tool: MeilisearchTool):
             meili_tool.valid = False
             self.assertIsNone(meili_tool.search_articles("学期"))
+            self.assertIsNone(meili_tool.search_article_ids("学期"))
             self.assertIsNone(meili_tool.get_article_index_by_id(1))
             self.assertIsNone(meili_tool.get_article_index_count())
             self.assertIsNone(meili_tool.get_all_articles_index())
@@ -227,6 +472,7 @@ class ArticleSelectorTestCase(TestCase):
         t04_meili_rebuild(self, meili_tool)
         print("test 05: meili search")
         t05_meili_search(self, meili_tool)
+        t05_meili_filtered_search(self, meili_tool)
         print("test 06: meili invalid")
         t06_meili_invalid(self, meili_tool)
 
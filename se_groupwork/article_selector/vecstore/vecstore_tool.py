@@ -0,0 +1,290 @@
+from webspider.models import Article
+from django.conf import settings
+from remoteAI.remoteAI.tags import TAGS
+from remoteAI.remoteAI.vectorize import KEYWORD_VECTOR_DIM
+from contextlib import contextmanager
+import numpy as np
+import threading
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，只能依赖进程内锁
+    fcntl = None
+
+'''
+mysql.webspider_articles -> 内存映射矩阵（所有gunicorn worker共享同一份page cache）
+{
+	semantic.npy -> (capacity, 100) float32，按行存放 semantic_vector
+	tags.npy     -> (capacity, len(TAGS)) float32，按行存放 tags_vector
+	offsets.npy  -> (max_id + 1,) int32，文章id -> 行号，-1 表示不存在
+	meta.json    -> {"count": 已用行数, "capacity": 容量, "version": 版本号}
+}
+写入方：ArticleDAO.batch_update_articles_info、Article 的 post_save/post_delete 信号、vecstore_rebuild
+读取方：PreferenceManager.caculate_preferences（推荐流）
+'''
+
+MIN_CAPACITY = 1024
+TAGS_DIM = len(TAGS)
+
+
+def fit_vector(vector, dim):
+    """
+    将向量转为长度为 dim 的 float32 数组；维度不符时返回零向量（等价于不计入得分）
+    """
+    if isinstance(vector, str):  # 未经数据库读取的实例上可能仍是JSON文本或空字符串
+        vector = json.loads(vector) if vector.strip() else []
+    vector = np.asarray(vector if vector is not None else [], dtype=np.float32).ravel()
+    if vector.shape[0] != dim:
+        return np.zeros(dim, dtype=np.float32)
+    return vector
+
+
+class ArticleVectorStore:
+    _instance = None
+    initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, test_mode=False):
+        if ArticleVectorStore.initialized:
+            return
+        ArticleVectorStore.initialized = True
+        self.test_mode = test_mode
+        self.dir = settings.VECSTORE_DIR if not test_mode else settings.TMP_VECSTORE_DIR_FOR_TEST
+        os.makedirs(self.dir, exist_ok=True)
+        print("[Info at vecstore_tool.py::__init__] ArticleVectorStore 初始化", "testmode" if test_mode else "")
+        self._lock = threading.Lock()
+        self._meta_stamp = None
+        self.meta = None
+        self.semantic = None
+        self.tags = None
+        self.offsets = None
+        if test_mode:
+            self.clear()
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程写锁（web worker、scheduler、管理命令可能同时写入）"""
+        with open(self._path('.lock'), 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, meta):
+        """原子替换meta.json，读取方据此感知变化"""
+        tmp_path = self._path('meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path('meta.json'))
+
+    def _create_array(self, name, shape, dtype, fill, old=None):
+        """新建（或扩容）一个 .npy 文件，写好后原子替换，已映射旧文件的读取方不受影响"""
+        path = self._path(name)
+        tmp_path = path + '.tmp'
+        array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+        array[:] = fill
+        if old is not None:
+            array[:old.shape[0]] = old
+        array.flush()
+        del array
+        os.replace(tmp_path, path)
+
+    def _reload_if_changed(self):
+        """meta.json 变化时重新映射文件；返回矩阵是否可用"""
+        try:
+            stat = os.stat(self._path('meta.json'))
+        except FileNotFoundError:
+            self.meta = None
+            return False
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._meta_stamp:
+            return self.meta is not None
+        meta = self._read_meta()
+        if meta is None:
+            return False
+        self.semantic = np.load(self._path('semantic.npy'), mmap_mode='r')
+        self.tags = np.load(self._path('tags.npy'), mmap_mode='r')
+        self.offsets = np.load(self._path('offsets.npy'), mmap_mode='r')
+        self.meta = meta
+        self._meta_stamp = stamp
+        return True
+
+    def get_vectors(self, article_ids):
+        '''
+        根据文章id批量读取向量，不访问数据库
+        :return: (tags矩阵, semantic矩阵, 是否命中的布尔数组)，行顺序与 article_ids 一致
+        '''
+        n = len(article_ids)
+        tags = np.zeros((n, TAGS_DIM), dtype=np.float32)
+        semantic = np.zeros((n, KEYWORD_VECTOR_DIM), dtype=np.float32)
+        found = np.zeros(n, dtype=bool)
+        if n == 0:
+            return tags, semantic, found
+        try:
+            with self._lock:
+                if not self._reload_if_changed():
+                    return tags, semantic, found
+                ids = np.asarray(article_ids, dtype=np.int64)
+                rows = np.full(n, -1, dtype=np.int64)
+                in_range = (ids >= 0) & (ids < self.offsets.shape[0])
+                rows[in_range] = self.offsets[ids[in_range]]
+                found = rows >= 0
+                tags[found] = self.tags[rows[found]]
+                semantic[found] = self.semantic[rows[found]]
+        except Exception as e:
+            print("[Error at vecstore_tool.py::get_vectors] 读取向量矩阵失败", e)
+            found = np.zeros(n, dtype=bool)
+        return tags, semantic, found
+
+    def upsert_vectors(self, articles_vectors):
+        '''
+        增量写入文章向量：已存在的行原地覆盖，新文章追加到末尾，容量不足时翻倍扩容
+        :param articles_vectors: [(article_id, tags_vector, semantic_vector), ...]
+        '''
+        latest = {int(article_id): (tags_vector, semantic_vector) for article_id, tags_vector, semantic_vector in articles_vectors}
+        if not latest:
+            return True
+        try:
+            with self._lock, self._file_lock():
+                meta = self._read_meta()
+                if meta is None:
+                    meta = self._init_files()
+                # 保证id->行号表能容纳最大的id
+                offsets = np.load(self._path('offsets.npy'), mmap_mode='r')
+                max_id = max(latest.keys())
+                if max_id >= offsets.shape[0]:
+                    self._create_array('offsets.npy', (max(max_id + 1, offsets.shape[0] * 2),), np.int32, -1, offsets)
+                offsets = np.load(self._path('offsets.npy'), mmap_mode='r+')
+                # 保证矩阵容量足够
+                new_count = sum(1 for article_id in latest if offsets[article_id] < 0)
+                if meta['count'] + new_count > meta['capacity']:
+                    capacity = max(meta['capacity'] * 2, meta['count'] + new_count)
+                    self._create_array('semantic.npy', (capacity, KEYWORD_VECTOR_DIM), np.float32, 0, np.load(self._path('semantic.npy'), mmap_mode='r'))
+                    self._create_array('tags.npy', (capacity, TAGS_DIM), np.float32, 0, np.load(self._path('tags.npy'), mmap_mode='r'))
+                    meta['capacity'] = capacity
+                semantic = np.load(self._path('semantic.npy'), mmap_mode='r+')
+                tags = np.load(self._path('tags.npy'), mmap_mode='r+')
+                # 先写向量行，再写id->行号，最后更新meta，读取方不会读到未写完的新行
+                rows = {}
+                for article_id, (tags_vector, semantic_vector) in latest.items():
+                    row = int(offsets[article_id])
+                    if row < 0:
+                        row = meta['count']
+                        meta['count'] += 1
+                    tags[row] = fit_vector(tags_vector, TAGS_DIM)
+                    semantic[row] = fit_vector(semantic_vector, KEYWORD_VECTOR_DIM)
+                    rows[article_id] = row
+                tags.flush()
+                semantic.flush()
+                for article_id, row in rows.items():
+                    offsets[article_id] = row
+                offsets.flush()
+                meta['version'] += 1
+                self._write_meta(meta)
+            return True
+        except Exception as e:
+            print("[Error at vecstore_tool.py::upsert_vectors] 写入向量矩阵失败", e)
+            return None
+
+    def delete_articles(self, article_ids):
+        '''
+        删除文章向量（仅清除id->行号映射，空出的行在重建时回收）
+        '''
+        try:
+            with self._lock, self._file_lock():
+                meta = self._read_meta()
+                if meta is None:
+                    return True
+                offsets = np.load(self._path('offsets.npy'), mmap_mode='r+')
+                for article_id in article_ids:
+                    if 0 <= article_id < offsets.shape[0]:
+                        offsets[article_id] = -1
+                offsets.flush()
+                meta['version'] += 1
+                self._write_meta(meta)
+            return True
+        except Exception as e:
+            print("[Error at vecstore_tool.py::delete_articles] 删除文章向量失败", e)
+            return None
+
+    def _init_files(self, capacity=MIN_CAPACITY, max_id=0):
+        self._create_array('semantic.npy', (capacity, KEYWORD_VECTOR_DIM), np.float32, 0)
+        self._create_array('tags.npy', (capacity, TAGS_DIM), np.float32, 0)
+        self._create_array('offsets.npy', (max(max_id + 1, MIN_CAPACITY),), np.int32, -1)
+        meta = {"count": 0, "capacity": capacity, "version": 0}
+        self._write_meta(meta)
+        return meta
+
+    def clear(self):
+        '''
+        清空向量矩阵
+        '''
+        try:
+            with self._lock, self._file_lock():
+                self._init_files()
+            return True
+        except Exception as e:
+            print("[Error at vecstore_tool.py::clear] 清空向量矩阵失败", e)
+            return None
+
+    def rebuild(self, batch_size=2000):
+        '''
+        从数据库全量重建向量矩阵（同时回收已删除文章留下的空行）
+        '''
+        try:
+            total = Article.objects.count()
+            max_id = Article.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            with self._lock, self._file_lock():
+                meta = self._init_files(capacity=max(total, MIN_CAPACITY), max_id=max_id)
+                semantic = np.load(self._path('semantic.npy'), mmap_mode='r+')
+                tags = np.load(self._path('tags.npy'), mmap_mode='r+')
+                offsets = np.load(self._path('offsets.npy'), mmap_mode='r+')
+                queryset = Article.objects.order_by('id').values_list('id', 'tags_vector', 'semantic_vector')
+                row = 0
+                for article_id, tags_vector, semantic_vector in queryset.iterator(chunk_size=batch_size):
+                    if row >= semantic.shape[0]:  # 重建期间有新文章写入
+                        break
+                    tags[row] = fit_vector(tags_vector, TAGS_DIM)
+                    semantic[row] = fit_vector(semantic_vector, KEYWORD_VECTOR_DIM)
+                    if article_id < offsets.shape[0]:
+                        offsets[article_id] = row
+                    row += 1
+                tags.flush()
+                semantic.flush()
+                offsets.flush()
+                meta['count'] = row
+                meta['version'] += 1
+                self._write_meta(meta)
+            print(f"[Info at vecstore_tool.py::rebuild] 成功重建{row}篇文章的向量")
+            return True
+        except Exception as e:
+            print("[Error at vecstore_tool.py::rebuild] 重建向量矩阵失败", e)
+            return None
+
+    def get_count(self):
+        '''
+        获取向量矩阵中的文章数量
+        '''
+        with self._lock:
+            if not self._reload_if_changed():
+                return 0
+            return int(np.count_nonzero(np.asarray(self.offsets) >= 0))
@@ -8,7 +8,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q, Subquery, OuterRef
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, OpenApiResponse
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 from django.utils import timezone
 
 from webspider.models import Article, PublicAccount
@@ -33,7 +33,8 @@ response_format = {
                             "public_account": {"id": 1, "name": "测试公众号"}
                         }
                     ],
-                    "reach_end": False
+                    "reach_end": False,
+                    "next_cursor": "MjAyNS0xMS0xMlQxMDowMDowMCswODowMHwx"
                 }
             )
         ]
@@ -43,6 +44,14 @@ response_format = {
     404: OpenApiResponse(description="所查询对象不存在"),
 }
 
+cursor_parameter = OpenApiParameter(
+    name="cursor",
+    type=str,
+    location=OpenApiParameter.QUERY,
+    description="分页游标（取上一页返回的next_cursor，传入后忽略start_rank）",
+    required=False,
+)
+
 @extend_schema(
     description="按时间、推荐或其他条件获取推文列表",
     tags=["文章推送"],
@@ -57,7 +66,7 @@ class ArticleViewSet(viewsets.ViewSet):
         favorite_subq = Favorite.objects.filter(user=user, article=OuterRef('pk')).values('id')[:1]
         return qs.annotate(is_favorited_id=Subquery(favorite_subq))
 
-    def _base_queryset(self, accounts, user):
+    def _base_queryset(self, account_ids, user):
         # 只取列表用得到的字段，避免拉取大文本/向量，减少 I/O
         qs = (
             Article.objects.select_related('public_account')
@@ -66,11 +75,65 @@ class ArticleViewSet(viewsets.ViewSet):
                 'summary', 'tags', 'key_info', 'relevant_time',
                 'public_account__name', 'public_account_id'
             )
-            .filter(public_account__in=accounts)
+            .filter(public_account_id__in=account_ids)
             .exclude(summary='')
         )
         return self._annotate_favorite(qs, user)
 
+    def _paginated_response(self, request, queryset, start_rank=0, limit=20, cursor=None, extra=None):
+        """
+        按 (-publish_time, -id) 分页并序列化，cursor 优先于 start_rank
+        """
+        try:
+            page_items, reached_end, next_cursor = paginate_articles(queryset, limit, start_rank=start_rank, cursor=cursor)
+        except ValueError:
+            return Response(
+                {'error': '分页游标无效'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = ArticleSerializer(page_items, many=True, context={'request': request})
+        return Response({
+            **(extra or {}),
+            'articles': serializer.data,
+            'reach_end': reached_end,
+            'next_cursor': next_cursor
+        })
+
+    def _search_paginated_response(self, request, queryset, search_content, account_ids, start_rank=0, limit=20, cursor=None,
+                                  time_from=None, time_to=None, tags=None):
+        """
+        在搜索引擎（Meilisearch/本地全文索引）内完成过滤、排序与分页，MySQL只读取当前页的文章
+        所有搜索后端均不可用时返回None，由调用方降级为数据库搜索
+        """
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response(
+                {'error': '分页游标无效'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if before is not None:
+            before = (before[0].timestamp(), before[1])
+            start_rank = 0
+        meilitools = global_meili_tool_load()
+        page_ids = meilitools.search_article_ids(
+            search_content, account_ids=account_ids, time_from=time_from, time_to=time_to, tags=tags,
+            before=before, offset=start_rank, limit=limit + 1
+        )
+        if page_ids is None:
+            return None
+        reached_end = len(page_ids) <= limit
+        page_ids = page_ids[:limit]
+        articles = queryset.filter(id__in=page_ids).in_bulk()
+        page_items = [articles[article_id] for article_id in page_ids if article_id in articles]
+        next_cursor = encode_cursor(page_items[-1]) if page_items and not reached_end else None
+        serializer = ArticleSerializer(page_items, many=True, context={'request': request})
+        return Response({
+            'articles': serializer.data,
+            'reach_end': reached_end,
+            'next_cursor': next_cursor
+        })
+
     @extend_schema(
         summary="获取最新文章列表",
         description="按发布时间倒序获取用户关联公众号的最新文章，支持分页加载（每次20条）",
@@ -82,7 +145,8 @@ class ArticleViewSet(viewsets.ViewSet):
                 description="起始偏移量（用于分页，默认0）",
                 required=False,
                 examples=[OpenApiExample(name="start_rank", value=0), OpenApiExample(name="start_rank", value=20)]
-            )
+            ),
+            cursor_parameter
         ],
         responses=response_format
     )
@@ -91,17 +155,13 @@ class ArticleViewSet(viewsets.ViewSet):
         """
         获取最新文章列表
         GET /api/articles/latest/?start_rank=0
+        GET /api/articles/latest/?cursor=xxx
         """
         start_rank = int(request.query_params.get('start_rank', 0))
-        related_accounts = get_accounts_by_user(request.user)
-        all_articles = self._base_queryset(related_accounts, request.user).order_by('-publish_time', '-id')[start_rank:start_rank+21]
-        reached_end = len(all_articles) < 21
-        all_articles = all_articles[:20]
-        serializer = ArticleSerializer(all_articles, many=True, context={'request': request})
-        return Response({
-            'articles': serializer.data,
-            'reach_end': reached_end
-        })
+        cursor = request.query_params.get('cursor')
+        related_account_ids = get_account_ids_by_user(request.user)
+        all_articles = self._base_queryset(related_account_ids, request.user)
+        return self._paginated_response(request, all_articles, start_rank=start_rank, cursor=cursor)
     
     @extend_schema(
         summary="获取推荐文章列表",
@@ -116,9 +176,9 @@ class ArticleViewSet(viewsets.ViewSet):
         """
         # 这里可以根据用户的阅读历史、偏好等进行推荐
         # 暂时返回固定的推荐文章
-        related_accounts = get_accounts_by_user(request.user)
+        related_account_ids = get_account_ids_by_user(request.user)
         recent_articles = (
-            self._base_queryset(related_accounts, request.user)
+            self._base_queryset(related_account_ids, request.user)
             .filter(publish_time__gte=timezone.now() - timedelta(days=3))
             .order_by('-publish_time')[:200]  # 限制候选集大小，降低排序成本
         )
@@ -140,7 +200,8 @@ class ArticleViewSet(viewsets.ViewSet):
                 description="起始偏移量（用于分页，默认0）",
                 required=False,
                 examples=[OpenApiExample(name="start_rank", value=0), OpenApiExample(name="start_rank", value=20)]
-            )
+            ),
+            cursor_parameter
         ],
         responses=response_format
     )
@@ -149,18 +210,13 @@ class ArticleViewSet(viewsets.ViewSet):
         """
         获取最新校内咨询文章列表
         GET /api/articles/campus-latest/?start_rank=0
+        GET /api/articles/campus-latest/?cursor=xxx
         """
         start_rank = int(request.query_params.get('start_rank', 0))
-        campus_accounts = get_campus_accounts()
-        campus_articles = self._base_queryset(campus_accounts, request.user).order_by('-publish_time', '-id')[start_rank:start_rank+21]
-        reached_end = len(campus_articles) < 21
-        campus_articles = campus_articles[:20]
-        serializer = ArticleSerializer(campus_articles, many=True, context={'request': request})
-        return Response({
-            'start_rank': start_rank,
-            'articles': serializer.data,
-            'reach_end': reached_end
-        })
+        cursor = request.query_params.get('cursor')
+        campus_account_ids = get_campus_account_ids()
+        campus_articles = self._base_queryset(campus_account_ids, request.user)
+        return self._paginated_response(request, campus_articles, start_rank=start_rank, cursor=cursor, extra={'start_rank': start_rank})
     
     @extend_schema(
         summary="获取最新自选咨询文章",
@@ -173,7 +229,8 @@ class ArticleViewSet(viewsets.ViewSet):
                 description="起始偏移量（用于分页，默认0）",
                 required=False,
                 examples=[OpenApiExample(name="start_rank", value=0), OpenApiExample(name="start_rank", value=20)]
-            )
+            ),
+            cursor_parameter
         ],
         responses=response_format
     )
@@ -182,18 +239,14 @@ class ArticleViewSet(viewsets.ViewSet):
         """
         获取最新自选咨询文章列表
         GET /api/articles/customized-latest/?start_rank=0
+        GET /api/articles/customized-latest/?cursor=xxx
         """
         start_rank = int(request.query_params.get('start_rank', 0))
+        cursor = request.query_params.get('cursor')
         # 根据用户的自选偏好获取文章
-        customized_accounts = get_customized_accounts(request.user)
-        customized_articles = self._base_queryset(customized_accounts, request.user).order_by('-publish_time', '-id')[start_rank:start_rank+21]
-        reached_end = len(customized_articles) < 21
-        customized_articles = customized_articles[:20]
-        serializer = ArticleSerializer(customized_articles, many=True, context={'request': request})
-        return Response({
-            'articles': serializer.data,
-            'reach_end': reached_end
-        })
+        customized_account_ids = get_customized_account_ids(request.user)
+        customized_articles = self._base_queryset(customized_account_ids, request.user)
+        return self._paginated_response(request, customized_articles, start_rank=start_rank, cursor=cursor)
     
     @extend_schema(
         summary="搜索最新自选咨询文章",
@@ -222,7 +275,8 @@ class ArticleViewSet(viewsets.ViewSet):
                 description="搜索内容",
                 required=False,
                 examples=[OpenApiExample(name="search_content", value="清华")]
-            )
+            ),
+            cursor_parameter
         ],
         responses=response_format
     )
@@ -234,43 +288,31 @@ class ArticleViewSet(viewsets.ViewSet):
         """
         start_rank = int(request.query_params.get('start_rank', 0))
         limit = int(request.query_params.get('limit', 20))
+        cursor = request.query_params.get('cursor')
         search_content = request.query_params.get('search_content', '').strip()
 
         # 根据用户的自选偏好获取文章
-        customized_accounts = get_customized_accounts(request.user)
+        customized_account_ids = get_customized_account_ids(request.user)
 
         # 基础查询：自选公众号且排除空summary
-        base_query = self._base_queryset(customized_accounts, request.user)
+        base_query = self._base_queryset(customized_account_ids, request.user)
 
-        # 如果有搜索内容，添加搜索条件（多字段模糊搜索）
+        # 如果有搜索内容，在搜索引擎中完成过滤与分页
         if search_content:
-            try:
-                meilitools = global_meili_tool_load()
-                search_result_ids = meilitools.search_articles(search_content)
-                if len(search_result_ids) == 0:
-                    raise Article.DoesNotExist
-                base_query = base_query.filter(id__in=search_result_ids)
-            except Article.DoesNotExist:
-                print("[Info at views.py::search_customized_latest] Meilisearch搜索失败，降级为数据库搜索")
-                base_query = base_query.filter(
-                    Q(summary__icontains=search_content) |
-                    Q(title__icontains=search_content) |
-                    Q(content__icontains=search_content)
-                )
-
-        base_query = base_query.order_by('-publish_time', '-id')
-
-        # 仿照 filter：先取 limit+1 条判断是否到末尾，再截断为 limit
-        page_items = list(base_query[start_rank:start_rank + limit + 1])
-        # 如果返回数量不超过当前页大小，则说明已到末尾
-        reached_end = len(page_items) <= limit
-        page_items = page_items[:limit]
+            response = self._search_paginated_response(
+                request, base_query, search_content, customized_account_ids,
+                start_rank=start_rank, limit=limit, cursor=cursor
+            )
+            if response is not None:
+                return response
+            print("[Info at views.py::search_customized_latest] 搜索引擎均不可用，降级为数据库搜索")
+            base_query = base_query.filter(
+                Q(summary__icontains=search_content) |
+                Q(title__icontains=search_content) |
+                Q(content__icontains=search_content)
+            )
 
-        serializer = ArticleSerializer(page_items, many=True, context={'request': request})
-        return Response({
-            'articles': serializer.data,
-            'reach_end': reached_end
-        })
+        return self._paginated_response(request, base_query, start_rank=start_rank, limit=limit, cursor=cursor)
     
     @extend_schema(
         summary="获取指定公众号的最新文章",
@@ -291,7 +333,8 @@ class ArticleViewSet(viewsets.ViewSet):
                 description="起始偏移量（用于分页，默认0）",
                 required=False,
                 examples=[OpenApiExample(name="start_rank", value=0)]
-            )
+            ),
+            cursor_parameter
         ],
         responses=response_format
     )
@@ -300,18 +343,14 @@ class ArticleViewSet(viewsets.ViewSet):
         """
         获取指定公众号最新文章列表
         GET /api/articles/by-account/?account_id=xxx&start_rank=0
+        GET /api/articles/by-account/?account_id=xxx&cursor=xxx
         """
         start_rank = int(request.query_params.get('start_rank', 0))
+        cursor = request.query_params.get('cursor')
         account_id = request.query_params.get('account_id')
         try:
-            account_articles = self._base_queryset([account_id], request.user).filter(public_account_id=account_id).order_by('-publish_time', '-id')[start_rank:start_rank+21]
-            reached_end = len(account_articles) < 21
-            account_articles = account_articles[:20]
-            serializer = ArticleSerializer(account_articles, many=True, context={'request': request})
-            return Response({
-                'articles': serializer.data,
-                'reach_end': reached_end
-            })
+            account_articles = self._base_queryset([account_id], request.user).filter(public_account_id=account_id)
+            return self._paginated_response(request, account_articles, start_rank=start_rank, cursor=cursor)
         except PublicAccount.DoesNotExist:
             return Response(
                 {'error': '公众号不存在'}, 
@@ -359,6 +398,10 @@ class ArticleViewSet(viewsets.ViewSet):
                     "limit": {
                         "type": "integer",
                         "description": "每页条数（默认20）"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "分页游标（取上一页返回的next_cursor，传入后忽略start_rank）"
                     }
                 },
                 "examples": [
@@ -389,32 +432,36 @@ class ArticleViewSet(viewsets.ViewSet):
 
         range = data.get('range')
         if range == 'a':
-            all_accounts = get_accounts_by_user(request.user)
+            all_account_ids = get_account_ids_by_user(request.user)
         elif range == 'd':
-            all_accounts = get_campus_accounts()
+            all_account_ids = get_campus_account_ids()
         else:
-            all_accounts = get_customized_accounts(request.user)
+            all_account_ids = get_customized_account_ids(request.user)
 
         account_names = data.get('account_names')
         if account_names:
-            account_list = PublicAccount.objects.filter(name__in=account_names)
-            if len(account_list) == 0:
+            account_id_list = list(PublicAccount.objects.filter(name__in=account_names).values_list('id', flat=True))
+            if len(account_id_list) == 0:
                 return Response(
                     {'error': '公众号不存在'},
                     status=status.HTTP_404_NOT_FOUND
                 )
         else:
-            account_list = all_accounts
-        queryset = self._base_queryset(account_list, request.user)
+            account_id_list = all_account_ids
+        queryset = self._base_queryset(account_id_list, request.user)
         
+        time_from = None
         date_from = data.get('date_from')
         if date_from:
             queryset = queryset.filter(publish_time__gte=date_from)
+            time_from = timezone.make_aware(datetime.combine(date_from, datetime.min.time())).timestamp()
             
+        time_to = None
         date_to = data.get('date_to')
         if date_to:
             date_to_next = date_to + timedelta(days=1)
             queryset = queryset.filter(publish_time__lt=date_to_next.strftime('%Y-%m-%d'))
+            time_to = timezone.make_aware(datetime.combine(date_to_next, datetime.min.time())).timestamp()
 
         
         tags = data.get('tags')
@@ -424,37 +471,36 @@ class ArticleViewSet(viewsets.ViewSet):
                 tag_query |= Q(tags__contains=tag)
             queryset = queryset.filter(tag_query)
 
+        start_rank = data.get('start_rank', 0)
+        limit = data.get('limit', 21)
+        cursor = data.get('cursor')
+
         search_content = data.get('search_content')
         if search_content:  # 筛选逻辑：如果关键词在标题/摘要/内容中出现，则将其返回
-            try:
-                meilitools = global_meili_tool_load()
-                search_result_ids = meilitools.search_articles(search_content)
-                if len(search_result_ids) == 0:
-                    raise Article.DoesNotExist
-                queryset = queryset.filter(id__in=search_result_ids)
-            except Exception:
-                print("[Info at views.py::filter] Meilisearch搜索失败，降级为数据库搜索")
-                search_query = Q()
-                for field in ['title', 'summary', 'content']:
-                    search_query |= Q(**{f'{field}__icontains': search_content})
-                queryset = queryset.filter(search_query)
+            # 公众号、日期、标签条件和分页一并交给搜索引擎
+            response = self._search_paginated_response(
+                request, queryset, search_content, account_id_list,
+                start_rank=start_rank, limit=limit, cursor=cursor,
+                time_from=time_from, time_to=time_to, tags=tags
+            )
+            if response is not None:
+                if response.status_code == status.HTTP_200_OK and not response.data['articles'] and start_rank == 0 and not cursor:
+                    return Response(
+                        {'error': '没有找到符合条件的文章'},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+                return response
+            print("[Info at views.py::filter] 搜索引擎均不可用，降级为数据库搜索")
+            search_query = Q()
+            for field in ['title', 'summary', 'content']:
+                search_query |= Q(**{f'{field}__icontains': search_content})
+            queryset = queryset.filter(search_query)
 
 
-        if len(queryset) == 0 or queryset is None:
+        if queryset is None or not queryset.exists():
             return Response(
                 {'error': '没有找到符合条件的文章'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        start_rank = data.get('start_rank', 0)
-        limit = data.get('limit', 21)
-        queryset = queryset.order_by('-publish_time', '-id')[start_rank:start_rank+limit+1]
-
-        # limit+1 取数，用 <= 确定是否到末尾，避免恰好满页时误判
-        reached_end = len(queryset) <= limit
-        queryset = queryset[:limit]
-        serializer = ArticleSerializer(queryset, many=True, context={'request': request})
-        return Response({
-            'articles': serializer.data,
-            'reach_end': reached_end
-        })
\ No newline at end of file
+        return self._paginated_response(request, queryset, start_rank=start_rank, limit=limit, cursor=cursor)
\ No newline at end of file
@@ -1,10 +1,15 @@
 from se_groupwork.global_tools import global_sqlvec_tool_load
-from askAI.askAI.ai_request import get_stream_response
+from askAI.askAI.ai_request import get_stream_response, async_get_stream_response
+from askAI.askAI import hybrid_retriever
+from article_selector.article_selector import get_account_ids_by_user
 from webspider.models import Article
+from django.conf import settings
+from django.utils import timezone
 from copy import copy
+import hashlib
 
 base_prompt = """
-你是一个面向校园生活领域的信息整合和总结专家，你需要根据用户的提问，从参考知识库中进行回答，我会提供你参考知识库中最可能相关的最多5篇文章。
+你是一个面向校园生活领域的信息整合和总结专家，你需要根据用户的提问，从参考知识库中进行回答，我会提供你参考知识库中最可能相关的最多5篇文章的相关片段。
 回答规则：
 	1. 优先使用参考知识库中的内容，用自然语言回答；
 	2. 若知识库无相关信息，直接说「未查询到相关内容」，不要编造；
@@ -13,22 +18,170 @@ base_prompt = """
 
 """
 
-def get_reference_articles(question):
-    articles = []
+def select_chunks(chunk_hits, max_articles=5):
+    """
+    按最佳chunk的相关度选出文章
+    :param chunk_hits: [(article_id, chunk_index, distance), ...]，按距离升序
+    :return: [(article_id, [命中的chunk_index, 按相关度排序]), ...]
+    """
+    selected = {}
+    for article_id, chunk_index, _ in chunk_hits:
+        if article_id not in selected:
+            if len(selected) >= max_articles:
+                continue
+            selected[article_id] = []
+        selected[article_id].append(chunk_index)
+    return list(selected.items())
+
+
+def _join_chunks(article_chunks, indexes):
+    """按正文顺序拼接chunk，去掉相邻chunk的重叠部分，不相邻处用省略号隔开"""
+    parts = []
+    prev_index, prev_end = None, None
+    for index in sorted(indexes):
+        text, start, end = article_chunks[index]
+        if prev_index is not None and index == prev_index + 1 and start is not None and prev_end is not None and start < prev_end:
+            text = text[prev_end - start:]
+        elif prev_index is not None:
+            parts.append("……")
+        parts.append(text)
+        prev_index, prev_end = index, end
+    return "\n".join(part for part in parts if part)
+
+
+def pack_context(ranked_articles, chunks, budget, neighbours=1):
+    """
+    在字数预算内装入片段：各文章轮流放入下一个命中chunk及其相邻chunk，保证每篇文章先拿到最相关的片段
+    :param ranked_articles: select_chunks 的结果；没有命中chunk的文章从开头取
+    :param chunks: {article_id: {chunk_index: (chunk_text, start_offset, end_offset)}}
+    :return: {article_id: 片段文本}
+    """
+    selected = {article_id: set() for article_id, _ in ranked_articles}
+    queues = {article_id: (matched or [0]) for article_id, matched in ranked_articles}
+    used = 0
+    for rank in range(max((len(q) for q in queues.values()), default=0)):
+        for article_id, _ in ranked_articles:
+            if rank >= len(queues[article_id]):
+                continue
+            article_chunks = chunks.get(article_id, {})
+            center = queues[article_id][rank]
+            candidates = [center] + [center + offset * sign for offset in range(1, neighbours + 1) for sign in (-1, 1)]
+            for index in candidates:
+                if index in selected[article_id] or index not in article_chunks:
+                    continue
+                length = len(article_chunks[index][0])
+                if used + length > budget:
+                    continue
+                selected[article_id].add(index)
+                used += length
+    return {
+        article_id: _join_chunks(chunks[article_id], indexes)
+        for article_id, indexes in selected.items() if indexes
+    }
+
+
+def get_search_scope(user=None):
+    """
+    用户的检索范围：关注的公众号 + 校园公众号，最近 ASK_RECENCY_MONTHS 个月发布的文章
+    :return: (account_ids, since_month)，None 表示不限
+    """
+    account_ids = None
+    if user is not None and user.is_authenticated and settings.ASK_SCOPE_TO_USER_ACCOUNTS:
+        account_ids = sorted(get_account_ids_by_user(user))
+    since_month = None
+    if settings.ASK_RECENCY_MONTHS:
+        now = timezone.localtime()
+        months = now.year * 12 + now.month - settings.ASK_RECENCY_MONTHS
+        since_month = months // 12 * 100 + months % 12 + 1
+    return account_ids, since_month
+
+
+def scope_key(scope):
+    """检索范围标识，用于语义缓存按范围隔离"""
+    if scope is None:
+        return ""
+    account_ids, since_month = scope
+    if account_ids is None and since_month is None:
+        return ""
+    raw = f"{','.join(map(str, sorted(account_ids))) if account_ids is not None else '*'}|{since_month or ''}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _rank_articles(question, account_ids=None, since_month=None):
+    if settings.HYBRID_RETRIEVAL_ENABLED:
+        return hybrid_retriever.retrieve(
+            question, max_articles=settings.ASK_MAX_REFERENCE_ARTICLES, account_ids=account_ids, since_month=since_month
+        )
+    chunk_hits = global_sqlvec_tool_load().search_chunks(
+        question, top_k=settings.ASK_CHUNK_TOP_K, account_ids=account_ids, since_month=since_month
+    )
+    return select_chunks(chunk_hits, max_articles=settings.ASK_MAX_REFERENCE_ARTICLES)
+
+
+def get_reference_context(question, scope=None):
+    """
+    检索问题相关的文章片段
+    :param scope: get_search_scope 的结果，过滤条件在向量检索内部生效；范围内没有结果时检索全库
+    :return: [(article, 片段文本), ...]，article 只加载 id/title/article_url
+    """
     sqlvecTool = global_sqlvec_tool_load()
-    for id, score in sqlvecTool.search(question, top_k=5):
-        article = Article.objects.get(id=id)
-        articles.append(article)
-    return articles
+    ranked_articles = []
+    if scope is not None:
+        ranked_articles = _rank_articles(question, *scope)
+        if not ranked_articles:
+            print("[Info at ai_ask.py::get_reference_context] 检索范围内无结果，检索全库")
+    if not ranked_articles:
+        ranked_articles = _rank_articles(question)
+    article_ids = [article_id for article_id, _ in ranked_articles]
+    articles = Article.objects.only('id', 'title', 'article_url').in_bulk(article_ids)
+    contexts = pack_context(
+        ranked_articles, sqlvecTool.get_chunks(article_ids),
+        budget=settings.ASK_CONTEXT_BUDGET, neighbours=settings.ASK_CONTEXT_NEIGHBOURS
+    )
+    return [
+        (articles[article_id], f"标题：{articles[article_id].title}\n{contexts[article_id]}")
+        for article_id in article_ids if article_id in articles and article_id in contexts
+    ]
 
 
-def ask_ai(question, reference_articles_content):
+def get_reference_articles(question, scope=None):
+    return [article for article, _ in get_reference_context(question, scope)]
+
+
+def get_cached_answer(question, scope=None):
+    """
+    语义问答缓存：同一检索范围内的相近问题直接返回已有回答
+    :return: {"question", "answer", "references", "similarity"}；未命中时返回None
+    """
+    sqlvecTool = global_sqlvec_tool_load()
+    return sqlvecTool.answer_cache.lookup(question, scope_key(scope))
+
+
+def cache_answer(question, answer, references, scope=None):
+    """缓存完整回答；请求出错的回答不缓存"""
+    if not answer or "[错误]" in answer:
+        return None
+    sqlvecTool = global_sqlvec_tool_load()
+    return sqlvecTool.answer_cache.store(question, answer, references, scope_key(scope))
+
+
+def build_messages(question, reference_articles_content):
     prmopt = copy(base_prompt)
     for i, article in enumerate(reference_articles_content):
         prmopt += f'============[第{i}篇]==============\n' + article + '\n\n\n'
-    message = [
+    return [
 		{"role": "system", "content": prmopt},
 		{"role": "user", "content": question}
 	]
+
+
+def ask_ai(question, reference_articles_content):
+    message = build_messages(question, reference_articles_content)
     for chunk in get_stream_response(message):
         yield chunk
+
+
+async def async_ask_ai(question, reference_articles_content):
+    message = build_messages(question, reference_articles_content)
+    async for chunk in async_get_stream_response(message):
+        yield chunk
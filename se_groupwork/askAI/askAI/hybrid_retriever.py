@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.utils import timezone
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from se_groupwork.global_tools import global_sqlvec_tool_load, global_meili_tool_load
+import time
+
+'''
+混合检索：向量检索（sqlite-vec chunk 级）与关键词检索（Meilisearch / SQLite FTS5）并行执行
+- 两个引擎同时提交到小线程池，各自有截止时间，总耗时不超过较慢引擎的超时
+- 结果用倒数排名融合（RRF）合并：score = Σ 1 / (k + rank)
+- 任一引擎超时或出错时只使用另一个引擎的结果
+- 两个引擎使用相同的检索范围（公众号、发布月份）
+'''
+
+_executor = ThreadPoolExecutor(max_workers=settings.HYBRID_RETRIEVAL_WORKERS, thread_name_prefix="hybridRetriever")
+
+
+def month_start_timestamp(month):
+    '''年月整数（如202510）-> 当月1日0点（本地时区）的Unix时间戳'''
+    start = timezone.make_aware(datetime(month // 100, month % 100, 1))
+    return int(start.timestamp())
+
+
+def _vector_search(question, account_ids=None, since_month=None):
+    return global_sqlvec_tool_load().search_chunks(
+        question, top_k=settings.ASK_CHUNK_TOP_K, account_ids=account_ids, since_month=since_month
+    )
+
+
+def _keyword_search(question, account_ids=None, since_month=None):
+    return global_meili_tool_load().search_articles(
+        question, max_results=settings.HYBRID_KEYWORD_TOP_K, account_ids=account_ids,
+        time_from=month_start_timestamp(since_month) if since_month else None
+    )
+
+
+def _wait(future, deadline, engine):
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        future.cancel()
+        print(f"[Error at hybrid_retriever.py::retrieve] {engine}检索超时")
+    except Exception as e:
+        print(f"[Error at hybrid_retriever.py::retrieve] {engine}检索失败", e)
+    return None
+
+
+def rrf_fuse(rankings, k=60):
+    """
+    倒数排名融合
+    :param rankings: [[article_id, ...], ...]，每个引擎按相关度排序的结果
+    :return: 按融合得分降序的 article_id 列表
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, article_id in enumerate(ranking, start=1):
+            scores[article_id] = scores.get(article_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda article_id: scores[article_id], reverse=True)
+
+
+def retrieve(question, max_articles=5, account_ids=None, since_month=None):
+    """
+    混合检索
+    :param account_ids: 只检索这些公众号的文章，None 表示不限
+    :param since_month: 只检索该月份（如202501）及之后发布的文章
+    :return: [(article_id, [向量检索命中的chunk_index, 按相关度排序]), ...]；只被关键词命中的文章chunk列表为空
+    """
+    start = time.monotonic()
+    vector_future = _executor.submit(_vector_search, question, account_ids, since_month)
+    keyword_future = _executor.submit(_keyword_search, question, account_ids, since_month)
+    chunk_hits = _wait(vector_future, start + settings.HYBRID_VECTOR_TIMEOUT, "向量") or []
+    keyword_ids = _wait(keyword_future, start + settings.HYBRID_KEYWORD_TIMEOUT, "关键词") or []
+
+    matched_chunks = {}
+    for article_id, chunk_index, _ in chunk_hits:
+        matched_chunks.setdefault(article_id, []).append(chunk_index)
+    fused = rrf_fuse([list(matched_chunks.keys()), keyword_ids], k=settings.HYBRID_RRF_K)[:max_articles]
+    print(f"[Info at hybrid_retriever.py::retrieve] 向量命中{len(matched_chunks)}篇，关键词命中{len(keyword_ids)}篇，"
+          f"用时{time.monotonic() - start:.3f}s")
+    return [(article_id, matched_chunks.get(article_id, [])) for article_id in fused]
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from askAI.askAI.ai_ask import ask_ai, get_reference_articles
+from askAI.askAI.ai_ask import ask_ai, get_reference_context
 from webspider.models import Article
 
 class Command(BaseCommand):
@@ -10,8 +10,9 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         question = options['question']
-        articles = get_reference_articles(question)
-        content = [article.content for article in articles]
+        reference_context = get_reference_context(question)
+        articles = [article for article, _ in reference_context]
+        content = [context for _, context in reference_context]
         for chunk in ask_ai(question, content):
             print(chunk, end='')
         print("\n[参考文献]")
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from se_groupwork.global_tools import load_local_embedding
+from askAI.sqlvec.sqlvec_tool import text_splitter
+import numpy as np
+import json
+import time
+import csv
+
+class Command(BaseCommand):
+    help = '对比各向量化后端在 testdata.json 文章上的吞吐、单条延迟与余弦一致性（以 huggingface 为基准）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=['huggingface', 'onnx'], help='参与对比的后端')
+        parser.add_argument('--data', nargs='+', default=['askAI/testdata.json', 'tests_api/testdata_askAI.json'], help='测试文章')
+        parser.add_argument('--repeat', type=int, default=3, help='吞吐测试重复次数')
+        parser.add_argument('--output', type=str, default=None, help='结果写入CSV')
+
+    def _load_texts(self, paths):
+        texts = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for article in json.load(f)['articles']:
+                    texts += [chunk.strip() for chunk in text_splitter.split_text(article['content']) if chunk.strip()]
+        return texts
+
+    def handle(self, *args, **options):
+        texts = self._load_texts(options['data'])
+        queries = [text[:30] for text in texts]
+        self.stdout.write(f'{len(texts)} 个chunk，平均 {np.mean([len(t) for t in texts]):.0f} 字')
+        baseline = None
+        rows = [["backend", "chunks_per_second", "query_p50_ms", "query_p95_ms", "cosine_mean", "cosine_min"]]
+        for backend in options['backends']:
+            embedding = load_local_embedding(backend)
+            embedding.embed_documents(texts[:4])  # 预热
+            start = time.time()
+            for _ in range(options['repeat']):
+                vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+            throughput = len(texts) * options['repeat'] / (time.time() - start)
+            latencies = []
+            for query in queries:
+                start = time.time()
+                embedding.embed_query(query)
+                latencies.append((time.time() - start) * 1000)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            if baseline is None:
+                baseline = vectors
+            cosine = np.sum(vectors * baseline, axis=1)
+            rows.append([
+                backend, f"{throughput:.1f}",
+                f"{np.percentile(latencies, 50):.1f}", f"{np.percentile(latencies, 95):.1f}",
+                f"{cosine.mean():.4f}", f"{cosine.min():.4f}"
+            ])
+        for row in rows:
+            self.stdout.write("\t".join(str(item) for item in row))
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(rows)
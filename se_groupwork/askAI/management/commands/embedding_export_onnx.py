@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from se_groupwork.onnx_embedding import export_onnx
+
+class Command(BaseCommand):
+    help = '把本地 text2vec 模型导出为 ONNX（默认同时生成动态 int8 量化模型）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=str, default=settings.EMBEDDING_ONNX_DIR, help='输出目录')
+        parser.add_argument('--no-quantize', action='store_true', help='只导出 fp32 模型')
+
+    def handle(self, *args, **options):
+        path = export_onnx(settings.EMBEDDING_MODEL_PATH, options['output'], quantize=not options['no_quantize'])
+        self.stdout.write(self.style.SUCCESS(f'导出完成：{path}'))
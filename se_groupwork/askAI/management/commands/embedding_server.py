@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from se_groupwork.global_tools import load_local_embedding
+from se_groupwork.embedding_service import create_server
+
+class Command(BaseCommand):
+    help = '启动向量化服务：模型只在本进程加载一次，web worker 与定时任务通过 EMBEDDING_BACKEND=remote 共享'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', type=str, default=settings.EMBEDDING_SERVER_URL,
+                            help='监听地址：http://host:port 或 unix:///path/to.sock')
+
+    def handle(self, *args, **options):
+        embedding = load_local_embedding(settings.EMBEDDING_SERVER_BACKEND)
+        server = create_server(
+            embedding, options['url'],
+            batch_wait_ms=settings.EMBEDDING_SERVER_BATCH_WAIT_MS,
+            max_batch_size=settings.EMBEDDING_SERVER_MAX_BATCH
+        )
+        self.stdout.write(self.style.SUCCESS(f"向量化服务已启动：{options['url']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
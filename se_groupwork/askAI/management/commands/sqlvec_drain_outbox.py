@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from askAI.sqlvec import outbox
+import time
+
+class Command(BaseCommand):
+    help = 'Index articles queued in the sqlvec outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Outbox rows per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep draining, polling every --interval seconds')
+        parser.add_argument('--interval', type=float, default=30, help='Polling interval in seconds for --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = outbox.drain(batch_size=options['batch_size'])
+            if not options['loop']:
+                break
+            if processed == 0:
+                time.sleep(options['interval'])
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from se_groupwork.global_tools import global_sqlvec_tool_load
+
+class Command(BaseCommand):
+    help = 'Refresh public account and publish month of all sqlvec chunks'
+    
+    def handle(self, *args, **options):
+        sqlvecTool = global_sqlvec_tool_load()
+        sqlvecTool.sync_metadata()
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SqlvecOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_id', models.BigIntegerField(unique=True, verbose_name='文章id')),
+                ('action', models.CharField(choices=[('update', '更新'), ('delete', '删除')], default='update', max_length=10, verbose_name='操作')),
+                ('attempts', models.IntegerField(default=0, verbose_name='失败次数')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='最近错误')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '向量索引待办',
+                'verbose_name_plural': '向量索引待办',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -1,3 +1,52 @@
 from django.db import models
 
-# Create your models here.
+
+class SqlvecOutbox(models.Model):
+    """
+    向量索引待办队列
+    - 文章保存/删除时只写入一行，由 sqlvec_drain_outbox 批量完成向量化与索引更新
+    - 同一文章只保留一行，多次保存合并为一次索引更新
+    - 索引成功后才删除，进程崩溃时待办不会丢失
+    """
+    ACTION_UPDATE = 'update'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = [
+        (ACTION_UPDATE, '更新'),
+        (ACTION_DELETE, '删除'),
+    ]
+
+    article_id = models.BigIntegerField(
+        unique=True,
+        verbose_name='文章id'
+    )
+    action = models.CharField(
+        max_length=10,
+        choices=ACTION_CHOICES,
+        default=ACTION_UPDATE,
+        verbose_name='操作'
+    )
+    attempts = models.IntegerField(
+        default=0,
+        verbose_name='失败次数'
+    )
+    last_error = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='最近错误'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='创建时间'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='更新时间'
+    )
+
+    def __str__(self):
+        return f"{self.action} {self.article_id}"
+
+    class Meta:
+        verbose_name = '向量索引待办'
+        verbose_name_plural = '向量索引待办'
+        ordering = ['id']
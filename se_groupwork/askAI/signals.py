@@ -1,11 +1,30 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.conf import settings
 from webspider.models import Article
-from se_groupwork.global_tools import global_sqlvec_tool_load
+from askAI.models import SqlvecOutbox
+from askAI.sqlvec import outbox
+from se_groupwork.global_tools import is_test_mode
+
+# 文章保存/删除只写入向量索引待办，由 sqlvec_drain_outbox 批量处理；测试模式下立即处理
+def _drain_if_sync():
+    if is_test_mode() or not settings.SQLVEC_OUTBOX_ASYNC:
+        outbox.drain()
+
+INDEXED_FIELDS = {'title', 'content', 'article_url', 'publish_time', 'public_account', 'public_account_id'}
+
 
 @receiver(post_save, sender=Article)
 def update_sqlvec_index(sender, instance, created, **kwargs):
-    if created:
-        article_id = instance.id
-        sqlvecTool = global_sqlvec_tool_load()
-        sqlvecTool.update_article(article_id)
\ No newline at end of file
+    # 新文章入库；已有文章标题/正文/链接变化后重新索引，并使引用它的缓存回答失效
+    # 公众号/发布时间变化时只刷新向量的过滤元数据（内容指纹不变，不重新向量化）
+    update_fields = kwargs.get('update_fields')
+    if created or update_fields is None or INDEXED_FIELDS & set(update_fields):
+        outbox.enqueue([instance.id], SqlvecOutbox.ACTION_UPDATE)
+        _drain_if_sync()
+
+
+@receiver(post_delete, sender=Article)
+def delete_sqlvec_index(sender, instance, **kwargs):
+    outbox.enqueue([instance.id], SqlvecOutbox.ACTION_DELETE)
+    _drain_if_sync()
@@ -0,0 +1,177 @@
+from django.conf import settings
+from typing import List
+import json
+import time
+
+'''
+语义问答缓存：与文章向量存放在同一个 sqlite-vec 数据库，多个 worker 进程共享
+- answer_cache_embeddings：问题向量（余弦距离）与检索范围，rowid 与 answer_cache.id 一致
+  检索范围（用户可见的公众号、时间窗口）不同的回答互不命中
+- answer_cache：问题、回答、参考文章元数据与写入时间
+- answer_cache_articles：缓存回答引用的文章，用于按文章失效
+失效规则：
+- 超过 ANSWER_CACHE_TTL 的回答不再命中
+- 被引用的文章更新或删除时，删除引用它的回答
+- 有新文章入库时清空缓存（新文章可能是更好的参考）
+'''
+
+
+def create_tables(conn, embedding_dim):
+    # 旧表没有检索范围列：缓存可以丢弃，直接重建
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'answer_cache_embeddings'").fetchone()
+    if row is not None and 'scope' not in row[0]:
+        conn.execute("DROP TABLE answer_cache_embeddings")
+        conn.execute("DROP TABLE IF EXISTS answer_cache")
+        conn.execute("DROP TABLE IF EXISTS answer_cache_articles")
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS answer_cache_embeddings
+        USING vec0(embedding float[{embedding_dim}] distance_metric=cosine, scope text)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS answer_cache (
+            id INTEGER PRIMARY KEY,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            references_json TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS answer_cache_articles (
+            cache_id INTEGER NOT NULL,
+            article_id INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS answer_cache_articles_article ON answer_cache_articles(article_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS answer_cache_articles_cache ON answer_cache_articles(cache_id)")
+
+
+def _delete_entries(conn, cache_ids):
+    rows = [(cache_id,) for cache_id in cache_ids]
+    conn.executemany("DELETE FROM answer_cache_embeddings WHERE rowid = ?", rows)
+    conn.executemany("DELETE FROM answer_cache WHERE id = ?", rows)
+    conn.executemany("DELETE FROM answer_cache_articles WHERE cache_id = ?", rows)
+
+
+def invalidate_articles(conn, article_ids: List[int]):
+    """删除引用了这些文章的回答（不提交，由调用方所在事务提交）"""
+    if not article_ids:
+        return 0
+    placeholders = ','.join('?' * len(article_ids))
+    cache_ids = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT cache_id FROM answer_cache_articles WHERE article_id IN ({placeholders})", list(article_ids)
+    )]
+    _delete_entries(conn, cache_ids)
+    return len(cache_ids)
+
+
+def clear(conn):
+    """清空缓存（不提交，由调用方所在事务提交）"""
+    conn.execute("DELETE FROM answer_cache_embeddings")
+    conn.execute("DELETE FROM answer_cache")
+    conn.execute("DELETE FROM answer_cache_articles")
+
+
+class AnswerCache:
+    def __init__(self, sqlvec_tool):
+        self.sqlvec_tool = sqlvec_tool
+        self.enabled = settings.ANSWER_CACHE_ENABLED
+        self.ttl = settings.ANSWER_CACHE_TTL
+        self.similarity = settings.ANSWER_CACHE_SIMILARITY
+
+    def lookup(self, question, scope=""):
+        """
+        查找同一检索范围内语义相近且未过期的缓存回答
+        :param scope: 检索范围标识，见 ai_ask.scope_key
+        :return: {"question", "answer", "references", "similarity"}；未命中时返回None
+        """
+        if not self.enabled or not question.strip():
+            return None
+        try:
+            query_emb = self.sqlvec_tool.query_embedder.embed(question)
+            conn = self.sqlvec_tool._update_connection()
+            rows = conn.execute("""
+                SELECT ac.question, ac.answer, ac.references_json, ace.distance
+                FROM (
+                    SELECT rowid, distance
+                    FROM answer_cache_embeddings
+                    WHERE embedding MATCH ? AND k = ? AND scope = ?
+                    ORDER BY distance
+                ) AS ace
+                JOIN answer_cache AS ac ON ace.rowid = ac.id
+                WHERE ac.created_at >= ?
+                ORDER BY ace.distance
+                LIMIT 1
+            """, (query_emb.tobytes(), settings.ANSWER_CACHE_CANDIDATES, scope, time.time() - self.ttl)).fetchall()
+        except Exception as e:
+            print(f"[Error at answer_cache.py::lookup] {e}")
+            return None
+        if not rows:
+            return None
+        cached_question, answer, references_json, distance = rows[0]
+        similarity = 1 - distance
+        if similarity < self.similarity:
+            return None
+        return {
+            "question": cached_question,
+            "answer": answer,
+            "references": json.loads(references_json),
+            "similarity": similarity,
+        }
+
+    def store(self, question, answer, references, scope=""):
+        """
+        写入回答
+        :param references: 参考文章元数据列表 [{"id", "title", "article_url"}, ...]
+        :param scope: 检索范围标识
+        """
+        if not self.enabled or not question.strip() or not answer:
+            return None
+        conn = self.sqlvec_tool._update_connection()
+        try:
+            query_emb = self.sqlvec_tool.query_embedder.embed(question)
+            conn.execute("BEGIN IMMEDIATE")
+            # 顺便清理过期回答
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM answer_cache WHERE created_at < ?", [time.time() - self.ttl]
+            )]
+            _delete_entries(conn, expired)
+            cache_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM answer_cache").fetchone()[0]
+            conn.execute(
+                "INSERT INTO answer_cache(id, question, answer, references_json, created_at) VALUES (?, ?, ?, ?, ?)",
+                (cache_id, question, answer, json.dumps(list(references), ensure_ascii=False), time.time())
+            )
+            conn.execute(
+                "INSERT INTO answer_cache_embeddings(rowid, embedding, scope) VALUES (?, ?, ?)",
+                (cache_id, query_emb.tobytes(), scope)
+            )
+            conn.executemany(
+                "INSERT INTO answer_cache_articles(cache_id, article_id) VALUES (?, ?)",
+                [(cache_id, reference["id"]) for reference in references]
+            )
+            conn.commit()
+            return cache_id
+        except Exception as e:
+            conn.rollback()
+            print(f"[Error at answer_cache.py::store] {e}")
+            return None
+
+    def invalidate_articles(self, article_ids: List[int]):
+        conn = self.sqlvec_tool._update_connection()
+        try:
+            count = invalidate_articles(conn, article_ids)
+            conn.commit()
+            return count
+        except Exception as e:
+            conn.rollback()
+            print(f"[Error at answer_cache.py::invalidate_articles] {e}")
+            return 0
+
+    def clear(self):
+        conn = self.sqlvec_tool._update_connection()
+        try:
+            clear(conn)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[Error at answer_cache.py::clear] {e}")
@@ -0,0 +1,81 @@
+from askAI.models import SqlvecOutbox
+from se_groupwork.global_tools import global_sqlvec_tool_load
+from django.conf import settings
+from django.utils import timezone
+from django.db.models import F
+from typing import List
+import time
+
+'''
+向量索引待办队列（outbox）
+- 文章保存/删除的信号只调用 enqueue 写入一行，不加载模型、不做向量化
+- drain 由 sqlvec_drain_outbox 命令（定时任务或常驻进程）调用：按批取出待办，
+  多篇文章的chunk凑批向量化后写入，成功后才删除待办；失败的待办记录错误次数，下次重试
+- 取出待办后又被重新加入（文章再次保存）的行不会被删除，下次重新处理
+'''
+
+
+def enqueue(article_ids: List[int], action=SqlvecOutbox.ACTION_UPDATE):
+    """加入待办；同一文章已有待办时覆盖为最新操作并重置失败次数"""
+    for article_id in article_ids:
+        SqlvecOutbox.objects.update_or_create(
+            article_id=article_id,
+            defaults={"action": action, "attempts": 0, "last_error": ""}
+        )
+
+
+def pending_count():
+    return SqlvecOutbox.objects.filter(attempts__lt=settings.SQLVEC_OUTBOX_MAX_ATTEMPTS).count()
+
+
+def _fail(rows, error):
+    SqlvecOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+        attempts=F('attempts') + 1, last_error=str(error)[:1000]
+    )
+
+
+def _process_batch(sqlvecTool, rows, read_at):
+    """处理一批待办，返回成功处理的行数"""
+    done, failed = [], []
+    for row in rows:
+        if row.action == SqlvecOutbox.ACTION_DELETE:
+            (done if sqlvecTool.delete_article(row.article_id) else failed).append(row)
+    updates = [row for row in rows if row.action == SqlvecOutbox.ACTION_UPDATE]
+    if updates:
+        article_ids = [row.article_id for row in updates]
+        # 标题/链接变化不改变向量，但引用它的缓存回答需要失效
+        sqlvecTool.answer_cache.invalidate_articles(article_ids)
+        if sqlvecTool.update_articles(article_ids) is None:
+            failed += updates
+        else:
+            done += updates
+    if failed:
+        _fail(failed, "索引失败")
+    # 只删除取出后没有再次入队的行
+    SqlvecOutbox.objects.filter(id__in=[row.id for row in done], updated_at__lte=read_at).delete()
+    return len(done)
+
+
+def drain(batch_size=None, max_batches=None):
+    """
+    处理待办直到队列为空（或达到 max_batches 批）
+    :return: 成功处理的待办数
+    """
+    batch_size = batch_size or settings.SQLVEC_OUTBOX_BATCH_SIZE
+    queryset = SqlvecOutbox.objects.filter(attempts__lt=settings.SQLVEC_OUTBOX_MAX_ATTEMPTS).order_by('id')
+    if not queryset.exists():
+        return 0
+    sqlvecTool = global_sqlvec_tool_load()
+    processed, batches, last_id = 0, 0, 0
+    start = time.time()
+    while max_batches is None or batches < max_batches:
+        read_at = timezone.now()
+        # 按id向后推进，本轮失败的行不在同一次 drain 中反复重试
+        rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1].id
+        processed += _process_batch(sqlvecTool, rows, read_at)
+        batches += 1
+    print(f"[Info at outbox.py::drain] 处理待办{processed}条（{batches}批），用时{time.time() - start:.2f}s")
+    return processed
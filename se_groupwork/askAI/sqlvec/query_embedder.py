@@ -0,0 +1,137 @@
+from django.conf import settings
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import unicodedata
+import threading
+import queue
+import time
+
+'''
+问题向量化：
+- LRU缓存：按规范化后的问题文本缓存向量，热门问题不再重复前向计算
+- 微批调度：未命中的问题进入队列，后台线程等待几毫秒凑批后一次性向量化
+'''
+
+
+def normalize_question(text):
+    """全角转半角、去除首尾及重复空白、英文小写"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return ' '.join(text.split()).lower()
+
+
+class QueryEmbedder:
+    def __init__(self, embed_texts, cache_size=None, batch_wait_ms=None, max_batch_size=None):
+        """
+        :param embed_texts: 批量向量化函数 List[str] -> np.ndarray
+        """
+        self.embed_texts = embed_texts
+        self.cache_size = cache_size if cache_size is not None else settings.QUERY_EMBEDDING_CACHE_SIZE
+        self.batch_wait = (batch_wait_ms if batch_wait_ms is not None else settings.QUERY_EMBEDDING_BATCH_WAIT_MS) / 1000
+        self.max_batch_size = max_batch_size if max_batch_size is not None else settings.QUERY_EMBEDDING_MAX_BATCH
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batch_sizes = {}  # 批大小 -> 次数
+        self.batch_seconds = 0.0
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key, vector):
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch):
+        # 同一批内相同的问题只计算一次
+        futures = {}
+        for key, future in batch:
+            futures.setdefault(key, []).append(future)
+        keys = list(futures.keys())
+        start = time.time()
+        try:
+            vectors = self.embed_texts(keys)
+        except Exception as e:
+            for future_list in futures.values():
+                for future in future_list:
+                    future.set_exception(e)
+            return
+        with self._stats_lock:
+            self.batch_sizes[len(keys)] = self.batch_sizes.get(len(keys), 0) + 1
+            self.batch_seconds += time.time() - start
+        for key, vector in zip(keys, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            self._cache_put(key, vector)
+            for future in futures[key]:
+                future.set_result(vector)
+
+    def embed(self, text, timeout=30):
+        """
+        获取问题向量：先查缓存，未命中时交给微批调度线程
+        """
+        key = normalize_question(text)
+        vector = self._cache_get(key)
+        with self._stats_lock:
+            if vector is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            total = self.hits + self.misses
+        if total % 100 == 0:
+            print("[Info at query_embedder.py::embed] 问题向量统计", self.get_stats())
+        if vector is not None:
+            return vector
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((key, future))
+        return future.result(timeout=timeout)
+
+    def get_stats(self):
+        with self._stats_lock:
+            total = self.hits + self.misses
+            batches = sum(self.batch_sizes.values())
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "cache_size": len(self._cache),
+                "batches": batches,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "avg_batch_seconds": self.batch_seconds / batches if batches else 0.0,
+            }
+
+    def clear(self):
+        with self._cache_lock:
+            self._cache.clear()
@@ -1,16 +1,31 @@
 from webspider.models import Article
 from django.conf import settings
+from django.utils import timezone
 from se_groupwork.global_tools import global_embedding_load
+from askAI.sqlvec.query_embedder import QueryEmbedder
+from askAI.sqlvec import answer_cache
 import sqlite3
 import sqlite_vec
 import numpy as np
 import struct
 import os
-from typing import List
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import List, Iterable, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，只能依赖进程内锁
+    fcntl = None
 
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
+EMBED_BATCH_SIZE = 64  # 每次送入模型的chunk数（跨文章凑满一批）
+INDEX_VERSION = 2  # 索引结构版本，变化时所有文章在下次更新时重新规划（chunk向量按hash复用）
+MAX_KNN_K = 4096  # vec0 单次KNN返回数上限
+METADATA_BATCH_SIZE = 500  # 内容未变化的文章每批检查一次过滤元数据
 
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=CHUNK_SIZE, 
@@ -23,10 +38,28 @@ def serialize_f32(vector: List[float]) -> bytes:
     """将浮点向量序列化为bytes（sqlite-vec原生要求）"""
     return struct.pack("%sf" % len(vector), *vector)
 
+def _fingerprint(text: str) -> str:
+    """内容指纹（切分参数变化时所有指纹随之失效）"""
+    return hashlib.sha1(f"{CHUNK_SIZE}:{CHUNK_OVERLAP}:{text or ''}".encode('utf-8')).hexdigest()
+
+def publish_month(publish_time) -> int:
+    """发布时间 -> 年月整数（如202510），作为向量检索的时间过滤条件；未知时为0"""
+    if publish_time is None:
+        return 0
+    if timezone.is_aware(publish_time):
+        publish_time = timezone.localtime(publish_time)
+    return publish_time.year * 100 + publish_time.month
+
+def _article_fingerprint(content: str) -> str:
+    """文章指纹：在内容指纹基础上包含索引结构版本"""
+    return _fingerprint(f"v{INDEX_VERSION}:{content or ''}")
+
 class SqliteVectorTool:
     _instance = None
     initialized = False
-    _conn = None  # 进程内单例连接
+    # 每个线程各自的连接：ASGI/多线程 worker 中并发的请求不能共用一个连接上的事务
+    _local = threading.local()
+    _index_thread_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -40,10 +73,16 @@ class SqliteVectorTool:
         self.test_mode = test_mode
         self.embedding = global_embedding_load()
         self.embedding_dim = settings.EMBEDDING_DIM  # 比如768
+        # 问答检索的问题向量走 LRU 缓存 + 微批调度
+        self.query_embedder = QueryEmbedder(self._embed_texts)
+        self.answer_cache = answer_cache.AnswerCache(self)
         print("[Info at sqlvec_tool.py::__init__] SqliteVectorTool 初始化", "testmode" if self.test_mode else "")
         # 数据库路径设置
         self.db_path = settings.SQLITEVECTOR_DB_PATH if not self.test_mode else settings.TMP_SQLITEVECTOR_DB_PATH_FOR_TEST
-        self._init_db()
+        metadata_missing = self._init_db()
+        if metadata_missing:
+            # 旧库迁移后补齐向量的公众号与发布月份
+            self.sync_metadata()
         if self.test_mode:
             self.clear_index()
 
@@ -57,156 +96,516 @@ class SqliteVectorTool:
         except (sqlite3.ProgrammingError, sqlite3.OperationalError):
             return False
 
+    @property
+    def _conn(self):
+        """当前线程的连接"""
+        return getattr(self._local, "conn", None)
+
     def _update_connection(self):
         """原生sqlite3连接 + 手动加载扩展（适配示例代码）"""
-        # 复用健康连接
+        # 复用当前线程的健康连接
         if self._check_connection(self._conn):
             return self._conn
         
-        # 原生sqlite3连接（核心修改）
-        self._conn = sqlite3.connect(
+        # 原生sqlite3连接（核心修改），只在创建它的线程中使用
+        conn = sqlite3.connect(
             self.db_path,
-            check_same_thread=False,
             timeout=10 
         )
-        self._conn.enable_load_extension(True)
-        sqlite_vec.load(self._conn)
-        self._conn.enable_load_extension(False)
-        
-        return self._conn
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+        # WAL：写事务进行时其他线程/进程仍可读
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _index_lock(self):
+        """
+        索引写锁（进程内 + 跨进程）：outbox 消费、重建索引、管理命令可能同时写入同一篇文章，
+        规划（读取指纹与已有chunk）到写入必须在同一把锁内，否则两边会基于同一快照各自插入新chunk
+        """
+        with self._index_thread_lock, open(f"{self.db_path}.lock", 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
 
     def _init_db(self):
-        """初始化vec0虚拟表"""
+        """
+        初始化vec0虚拟表
+        :return: 是否从没有元数据列的旧库迁移（需要补齐元数据）
+        """
         conn = self._update_connection()
         try:
-            # 创建vec0虚拟表
+            # vec0 表不支持增加列：旧库先把向量暂存到临时表，建好带元数据列的新表后写回
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'chunk_embeddings'").fetchone()
+            migrate = row is not None and 'publish_month' not in row[0]
+            if migrate:
+                conn.execute("CREATE TEMP TABLE chunk_embeddings_backup AS SELECT rowid AS chunk_rowid, embedding FROM chunk_embeddings")
+                conn.execute("DROP TABLE chunk_embeddings")
+            # 创建vec0虚拟表，公众号与发布月份作为元数据列，在KNN查询内过滤
             conn.execute(f"""
                 CREATE VIRTUAL TABLE IF NOT EXISTS chunk_embeddings 
-                USING vec0(embedding float[{self.embedding_dim}])
+                USING vec0(embedding float[{self.embedding_dim}], public_account_id integer, publish_month integer)
             """)
+            if migrate:
+                conn.execute(
+                    "INSERT INTO chunk_embeddings(rowid, embedding, public_account_id, publish_month) "
+                    "SELECT chunk_rowid, embedding, 0, 0 FROM chunk_embeddings_backup"
+                )
+                conn.execute("DROP TABLE chunk_embeddings_backup")
+                print("[Info at sqlvec_tool.py::_init_db] 已迁移 chunk_embeddings，增加元数据列")
             # 创建普通表存储article_id映射
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS chunk_article_mapping (
                     chunk_rowid INTEGER PRIMARY KEY,
-                    article_id INTEGER NOT NULL
+                    article_id INTEGER NOT NULL,
+                    chunk_index INTEGER,
+                    chunk_hash TEXT,
+                    chunk_text TEXT,
+                    start_offset INTEGER,
+                    end_offset INTEGER
                 )
             """)
+            # 兼容旧库：补充 chunk_index / chunk_hash / chunk_text / 偏移列（旧chunk在下次更新时补齐）
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chunk_article_mapping)")}
+            for column, column_type in (
+                ("chunk_index", "INTEGER"), ("chunk_hash", "TEXT"),
+                ("chunk_text", "TEXT"), ("start_offset", "INTEGER"), ("end_offset", "INTEGER")
+            ):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE chunk_article_mapping ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunk_article_mapping_article ON chunk_article_mapping(article_id)")
+            # 文章内容指纹：内容未变化的文章跳过
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS article_fingerprint (
+                    article_id INTEGER PRIMARY KEY,
+                    fingerprint TEXT NOT NULL
+                )
+            """)
+            # 语义问答缓存
+            answer_cache.create_tables(conn, self.embedding_dim)
             conn.commit()
         finally:
             conn.close()
+        return migrate
 
     def _embed_texts(self, texts: List[str]) -> np.ndarray:
         """生成文本嵌入"""
         return np.array(self.embedding.embed_documents(texts), dtype=np.float32)
 
-    def _add_content_to_index(self, content: str, article_id: int):
-        """添加文章chunk到向量库（适配序列化）"""
+    def _split_content(self, content: str) -> List[str]:
+        """将文章正文切分为chunk"""
+        return [chunk for chunk, _, _ in self._split_content_with_offsets(content)]
+
+    def _split_content_with_offsets(self, content: str) -> List[Tuple[str, int, int]]:
+        """
+        切分chunk并定位其在正文中的位置
+        :return: [(chunk, start_offset, end_offset), ...]，相邻chunk有重叠
+        """
         if not content:
-            return
-        chunks = text_splitter.split_text(content)
-        chunks = [c.strip() for c in chunks if c.strip()]
-        if not chunks:
-            return
-        embeddings = self._embed_texts(chunks)
+            return []
+        result = []
+        search_from = 0
+        for chunk in text_splitter.split_text(content):
+            chunk = chunk.strip()
+            if not chunk:
+                continue
+            start = content.find(chunk, search_from)
+            if start < 0:
+                start = content.find(chunk)
+            if start < 0:
+                start = search_from
+            result.append((chunk, start, start + len(chunk)))
+            search_from = start + 1
+        return result
+
+    def _article_metadata(self, article_ids) -> dict:
+        """
+        向量检索的过滤元数据
+        :return: {article_id: (public_account_id, publish_month)}
+        """
+        if not article_ids:
+            return {}
+        return {
+            article_id: (account_id or 0, publish_month(publish_time))
+            for article_id, account_id, publish_time in Article.objects.filter(id__in=list(article_ids)).values_list(
+                'id', 'public_account_id', 'publish_time'
+            )
+        }
+
+    def _write_chunks(self, new_chunks: List[Tuple[int, int, str]], embeddings: np.ndarray, plans: List[dict], metadata: dict = None):
+        """
+        在一个事务内写入一批chunk，并完成已全部入队文章的收尾（删除旧chunk、更新序号与指纹）
+        显式指定rowid，vec0表与映射表各用一次executemany
+        :param new_chunks: [(article_id, chunk_index, chunk_hash, chunk_text, start_offset, end_offset), ...]，与 embeddings 一一对应
+        :param plans: [{"article_id", "fingerprint", "stale_rowids", "reindex", "is_new"}, ...]
+            reindex: 复用的旧chunk [(rowid, chunk_index, chunk_text, start_offset, end_offset), ...]
+        :param metadata: {article_id: (public_account_id, publish_month)}，缺失时记为0
+        """
+        metadata = metadata or {}
         conn = self._update_connection()
         try:
-            # 批量插入（先插vec0表，再插映射表）
-            for emb in embeddings:
-                emb_bytes = serialize_f32(emb.tolist())
-                cursor = conn.execute(
-                    "INSERT INTO chunk_embeddings(embedding) VALUES (?)",
-                    [emb_bytes]
+            conn.execute("BEGIN IMMEDIATE")
+            if new_chunks:
+                start_rowid = conn.execute(
+                    "SELECT COALESCE(MAX(chunk_rowid), 0) + 1 FROM chunk_article_mapping"
+                ).fetchone()[0]
+                rowids = range(start_rowid, start_rowid + len(new_chunks))
+                conn.executemany(
+                    "INSERT INTO chunk_embeddings(rowid, embedding, public_account_id, publish_month) VALUES (?, ?, ?, ?)",
+                    [(rowid, emb.tobytes(), *metadata.get(chunk[0], (0, 0)))
+                     for rowid, emb, chunk in zip(rowids, embeddings, new_chunks)]
                 )
-                chunk_rowid = cursor.lastrowid
-                conn.execute(
-                    "INSERT INTO chunk_article_mapping(chunk_rowid, article_id) VALUES (?, ?)",
-                    [chunk_rowid, article_id]
+                conn.executemany(
+                    "INSERT INTO chunk_article_mapping(chunk_rowid, article_id, chunk_index, chunk_hash, chunk_text, start_offset, end_offset) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(rowid, *chunk) for rowid, chunk in zip(rowids, new_chunks)]
                 )
+            stale_rowids = [(rowid,) for plan in plans for rowid in plan["stale_rowids"]]
+            conn.executemany("DELETE FROM chunk_embeddings WHERE rowid = ?", stale_rowids)
+            conn.executemany("DELETE FROM chunk_article_mapping WHERE chunk_rowid = ?", stale_rowids)
+            conn.executemany(
+                "UPDATE chunk_article_mapping SET chunk_index = ?, chunk_text = ?, start_offset = ?, end_offset = ? WHERE chunk_rowid = ?",
+                [(chunk_index, chunk_text, start, end, rowid) for plan in plans for rowid, chunk_index, chunk_text, start, end in plan["reindex"]]
+            )
+            conn.executemany(
+                "UPDATE chunk_embeddings SET public_account_id = ?, publish_month = ? WHERE rowid = ?",
+                [(*metadata.get(plan["article_id"], (0, 0)), rowid) for plan in plans for rowid, *_ in plan["reindex"]]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO article_fingerprint(article_id, fingerprint) VALUES (?, ?)",
+                [(plan["article_id"], plan["fingerprint"]) for plan in plans]
+            )
+            # 新文章入库时清空问答缓存，已有文章内容变化时删除引用它的回答
+            if any(plan["is_new"] for plan in plans):
+                answer_cache.clear(conn)
+            elif plans:
+                answer_cache.invalidate_articles(conn, [plan["article_id"] for plan in plans])
             conn.commit()
-            if not self.test_mode:
-                print(f"[Success] 文章{article_id}添加到向量库")
         except Exception as e:
             conn.rollback()
-            print(f"[Error in _add_content_to_index] {e}")
+            print(f"[Error in _write_chunks] {e}")
             raise e
-        finally:
-            pass
+
+    def _plan_article(self, article_id: int, content: str):
+        """
+        对比文章当前内容与索引中的chunk
+        :return: (plan, 需要向量化的[(chunk_index, chunk_hash, chunk, start_offset, end_offset)])；内容未变化时返回 (None, [])
+        """
+        fingerprint = _article_fingerprint(content)
+        conn = self._update_connection()
+        row = conn.execute("SELECT fingerprint FROM article_fingerprint WHERE article_id = ?", [article_id]).fetchone()
+        if row is not None and row[0] == fingerprint:
+            return None, []
+        # 已有chunk：hash -> [(rowid, (chunk_index, start_offset, end_offset, 是否已存正文)), ...]
+        existing = {}
+        for rowid, chunk_index, chunk_hash, start, end, has_text in conn.execute(
+            "SELECT chunk_rowid, chunk_index, chunk_hash, start_offset, end_offset, chunk_text IS NOT NULL "
+            "FROM chunk_article_mapping WHERE article_id = ? ORDER BY chunk_rowid",
+            [article_id]
+        ):
+            existing.setdefault(chunk_hash, []).append((rowid, (chunk_index, start, end, bool(has_text))))
+        plan = {"article_id": article_id, "fingerprint": fingerprint, "stale_rowids": [], "reindex": [], "is_new": row is None}
+        to_embed = []
+        for chunk_index, (chunk, start, end) in enumerate(self._split_content_with_offsets(content)):
+            chunk_hash = _fingerprint(chunk)
+            if existing.get(chunk_hash):
+                rowid, old_state = existing[chunk_hash].pop(0)
+                # 序号或偏移变化（或旧库缺少正文）时只更新映射，不重新向量化
+                if old_state != (chunk_index, start, end, True):
+                    plan["reindex"].append((rowid, chunk_index, chunk, start, end))
+            else:
+                to_embed.append((chunk_index, chunk_hash, chunk, start, end))
+        plan["stale_rowids"] = [rowid for rows in existing.values() for rowid, _ in rows]
+        return plan, to_embed
+
+    def _index_articles(self, articles: Iterable[Tuple[int, str]], batch_size: int = EMBED_BATCH_SIZE):
+        """
+        增量建立索引：
+        - 内容指纹未变化的文章不重新向量化，只在公众号/发布月份变化时刷新向量的过滤元数据
+        - 只向量化hash变化的chunk，多篇文章的chunk凑成固定大小的批次统一向量化，每批一个事务写入
+        - 不再存在的旧chunk在文章最后一批写入时删除
+        - 整个过程持有索引写锁
+        :param articles: [(article_id, content), ...]，可以是迭代器
+        :return: 写入的chunk数
+        """
+        with self._index_lock():
+            return self._index_articles_locked(articles, batch_size)
+
+    def _index_articles_locked(self, articles: Iterable[Tuple[int, str]], batch_size: int):
+        pending_chunks, pending_texts, pending_plans, unchanged_ids = [], [], [], []
+        total_chunks, total_articles, skipped_articles = 0, 0, 0
+        started = time.time()
+
+        def flush():
+            nonlocal total_chunks
+            embeddings = self._embed_texts(pending_texts) if pending_texts else np.zeros((0, self.embedding_dim), dtype=np.float32)
+            article_ids = {chunk[0] for chunk in pending_chunks} | {plan["article_id"] for plan in pending_plans}
+            self._write_chunks(pending_chunks, embeddings, pending_plans, self._article_metadata(article_ids))
+            total_chunks += len(pending_chunks)
+            pending_chunks.clear()
+            pending_texts.clear()
+            pending_plans.clear()
+
+        for article_id, content in articles:
+            total_articles += 1
+            plan, to_embed = self._plan_article(article_id, content)
+            if plan is None:
+                skipped_articles += 1
+                unchanged_ids.append(article_id)
+                if len(unchanged_ids) >= METADATA_BATCH_SIZE:
+                    self._refresh_metadata(unchanged_ids)
+                    unchanged_ids.clear()
+                continue
+            for chunk_index, chunk_hash, chunk, start, end in to_embed:
+                pending_chunks.append((article_id, chunk_index, chunk_hash, chunk, start, end))
+                pending_texts.append(chunk)
+                if len(pending_texts) >= batch_size:
+                    flush()
+            # 文章的全部新chunk入队后才提交收尾，保证旧chunk在新chunk写入后才删除
+            pending_plans.append(plan)
+        if pending_texts or pending_plans:
+            flush()
+        if unchanged_ids:
+            self._refresh_metadata(unchanged_ids)
+        elapsed = time.time() - started
+        speed = total_chunks / elapsed if elapsed > 0 else 0
+        print(f"[Info at sqlvec_tool.py::_index_articles] {total_articles}篇文章（跳过未变化{skipped_articles}篇），写入{total_chunks}个chunk，用时{elapsed:.2f}s（{speed:.1f} chunks/s）")
+        return total_chunks
+
+    def _refresh_metadata(self, article_ids: List[int]):
+        """
+        内容未变化的文章：公众号或发布时间被修改时，更新其全部chunk的过滤元数据（需持有索引写锁）
+        :return: 元数据有变化的文章数
+        """
+        metadata = self._article_metadata(article_ids)
+        conn = self._update_connection()
+        placeholders = ','.join('?' * len(article_ids))
+        rows = conn.execute(
+            f"SELECT chunk_rowid, article_id FROM chunk_article_mapping WHERE article_id IN ({placeholders}) ORDER BY chunk_rowid",
+            list(article_ids)
+        ).fetchall()
+        article_rowids = {}
+        for rowid, article_id in rows:
+            article_rowids.setdefault(article_id, []).append(rowid)
+        # 同一篇文章的chunk元数据一致，只比较第一个
+        changed = [
+            article_id for article_id, rowids in article_rowids.items()
+            if tuple(conn.execute(
+                "SELECT public_account_id, publish_month FROM chunk_embeddings WHERE rowid = ?", [rowids[0]]
+            ).fetchone() or ()) != metadata.get(article_id, (0, 0))
+        ]
+        if not changed:
+            return 0
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE chunk_embeddings SET public_account_id = ?, publish_month = ? WHERE rowid = ?",
+                [(*metadata.get(article_id, (0, 0)), rowid) for article_id in changed for rowid in article_rowids[article_id]]
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[Error in _refresh_metadata] {e}")
+            return 0
+        return len(changed)
+
+    def _add_content_to_index(self, content: str, article_id: int):
+        """添加单篇文章chunk到向量库"""
+        self._index_articles([(article_id, content)])
 
     def update_article(self, article_id: int):
         """更新单篇文章的向量"""
         try:
-            article = Article.objects.get(id=article_id)
+            article = Article.objects.only('id', 'content').get(id=article_id)
             self._add_content_to_index(article.content, article_id)
         except Article.DoesNotExist:
             print(f"[Error] 文章{article_id}不存在")
         except Exception as e:
             print(f"[Error in update_article] {e}")
 
-    def search(self, query, top_k: int = 8):
-        """相似搜索（完全适配示例代码的语法）"""
+    def _knn(self, query_emb: np.ndarray, k: int, account_ids=None, since_month=None):
+        """
+        KNN查询，公众号与发布月份在vec0内部过滤（先过滤再取最近的k个）
+        :return: [(article_id, chunk_index, distance), ...]，按距离升序
+        """
+        conditions, params = ["embedding MATCH ?", "k = ?"], [query_emb.tobytes(), min(k, MAX_KNN_K)]
+        if account_ids is not None:
+            conditions.append(f"public_account_id IN ({','.join('?' * len(account_ids))})")
+            params.extend(account_ids)
+        if since_month:
+            conditions.append("publish_month >= ?")
+            params.append(since_month)
+        conn = self._update_connection()
+        rows = conn.execute(f"""
+            SELECT cam.article_id, cam.chunk_index, cev.distance
+            FROM (
+                SELECT rowid, distance
+                FROM chunk_embeddings
+                WHERE {' AND '.join(conditions)}
+                ORDER BY distance
+            ) AS cev
+            JOIN chunk_article_mapping AS cam ON cev.rowid = cam.chunk_rowid
+            ORDER BY cev.distance
+        """, params).fetchall()
+        return [(row[0], row[1], row[2]) for row in rows]
+
+    def search(self, query, top_k: int = 8, account_ids=None, since_month=None):
+        """
+        文章级相似搜索
+        :param account_ids: 只检索这些公众号的文章，None 表示不限
+        :param since_month: 只检索该月份（如202501）及之后发布的文章
+        :return: [(article_id, 最近chunk的距离), ...]
+        """
         if not query.strip():
             print("[Error] 查询为空")
             return []
-        
+        if account_ids is not None and not account_ids:
+            return []
         try:
-            # 生成查询向量并序列化
-            query_emb = self._embed_texts([query])[0]
-            query_emb_bytes = serialize_f32(query_emb.tolist())
-            
-            conn = self._update_connection()
-            cursor = conn.cursor()
-
-            # 核心搜索SQL（适配示例的MATCH语法）
-            cursor.execute("""
-                SELECT 
-                    cam.article_id,
-                    cev.distance
-                FROM (
-                    SELECT 
-                        rowid,
-                        distance
-                    FROM chunk_embeddings
-                    WHERE embedding MATCH ?
-                    ORDER BY distance
-                    LIMIT ?
-                ) AS cev
-                LEFT JOIN chunk_article_mapping AS cam ON cev.rowid = cam.chunk_rowid
-                WHERE cam.article_id IS NOT NULL 
-                GROUP BY cam.article_id
-                ORDER BY MIN(cev.distance)
-                LIMIT ?
-            """, (query_emb_bytes, top_k * 2, top_k))
-            
-            results = cursor.fetchall()
-            return [(row[0], row[1]) for row in results]
+            query_emb = self.query_embedder.embed(query)
+            # 同一文章可能占多个chunk，不足 top_k 篇时扩大k重查
+            k = top_k * 2
+            while True:
+                hits = self._knn(query_emb, k, account_ids, since_month)
+                best = {}
+                for article_id, _, distance in hits:
+                    best.setdefault(article_id, distance)
+                if len(best) >= top_k or len(hits) < k or k >= MAX_KNN_K:
+                    return list(best.items())[:top_k]
+                k *= 4
         except Exception as e:
             print(f"[Error in search] {e}")
             return []
 
+    def search_chunks(self, query, top_k: int = 20, account_ids=None, since_month=None):
+        """
+        chunk级相似搜索，过滤条件同 search
+        :return: [(article_id, chunk_index, distance), ...]，按距离升序
+        """
+        if not query.strip():
+            print("[Error] 查询为空")
+            return []
+        if account_ids is not None and not account_ids:
+            return []
+        try:
+            return self._knn(self.query_embedder.embed(query), top_k, account_ids, since_month)
+        except Exception as e:
+            print(f"[Error in search_chunks] {e}")
+            return []
+
+    def get_chunks(self, article_ids: List[int]):
+        """
+        读取文章的chunk正文与偏移
+        :return: {article_id: {chunk_index: (chunk_text, start_offset, end_offset)}}
+        """
+        if not article_ids:
+            return {}
+        conn = self._update_connection()
+        placeholders = ','.join('?' * len(article_ids))
+        result = {}
+        for article_id, chunk_index, chunk_text, start, end in conn.execute(
+            f"SELECT article_id, chunk_index, chunk_text, start_offset, end_offset FROM chunk_article_mapping "
+            f"WHERE article_id IN ({placeholders}) AND chunk_text IS NOT NULL",
+            list(article_ids)
+        ):
+            result.setdefault(article_id, {})[chunk_index] = (chunk_text, start, end)
+        return result
+
     def update_articles(self, article_ids: List[int]):
+        """
+        批量更新文章的向量
+        :return: 写入的chunk数；出错时返回None
+        """
         try:
-            queryset = Article.objects.filter(id__in=article_ids)
-            for article in queryset:
-                self._add_content_to_index(article.content, article.id)
+            queryset = Article.objects.filter(id__in=article_ids).order_by('id').values_list('id', 'content')
+            return self._index_articles(queryset.iterator(chunk_size=100))
         except Exception as e:
             print(f"[Error in update_articles] {e}")
+            return None
 
     def update_all_articles(self, batch_size: int = 100):
         try:
-            total = Article.objects.count()
-            for offset in range(0, total, batch_size):
-                queryset = Article.objects.all()[offset:offset+batch_size]
-                for article in queryset:
-                    self._add_content_to_index(article.content, article.id)
+            queryset = Article.objects.order_by('id').values_list('id', 'content')
+            self._index_articles(queryset.iterator(chunk_size=batch_size))
         except Exception as e:
             print(f"[Error in update_all_articles] {e}")
 
+    def sync_metadata(self, batch_size: int = 1000):
+        """
+        按文章表刷新全部向量的公众号与发布月份（旧库迁移后、或文章所属公众号/发布时间被修改后使用）
+        :return: 更新的chunk数
+        """
+        with self._index_lock():
+            return self._sync_metadata_locked(batch_size)
+
+    def _sync_metadata_locked(self, batch_size: int):
+        conn = self._update_connection()
+        article_ids = self.get_all_articles_ids()
+        updated = 0
+        try:
+            for i in range(0, len(article_ids), batch_size):
+                batch_ids = article_ids[i:i + batch_size]
+                metadata = self._article_metadata(batch_ids)
+                placeholders = ','.join('?' * len(batch_ids))
+                rows = conn.execute(
+                    f"SELECT chunk_rowid, article_id FROM chunk_article_mapping WHERE article_id IN ({placeholders})",
+                    batch_ids
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE chunk_embeddings SET public_account_id = ?, publish_month = ? WHERE rowid = ?",
+                    [(*metadata.get(article_id, (0, 0)), rowid) for rowid, article_id in rows]
+                )
+                updated += len(rows)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[Error in sync_metadata] {e}")
+            return 0
+        print(f"[Info at sqlvec_tool.py::sync_metadata] 已刷新{updated}个chunk的元数据")
+        return updated
+
+    def delete_article(self, article_id: int):
+        """
+        删除文章的全部向量
+        :return: 是否成功
+        """
+        with self._index_lock():
+            return self._delete_article_locked(article_id)
+
+    def _delete_article_locked(self, article_id: int):
+        conn = self._update_connection()
+        try:
+            rowids = [row for row in conn.execute("SELECT chunk_rowid FROM chunk_article_mapping WHERE article_id = ?", [article_id])]
+            conn.executemany("DELETE FROM chunk_embeddings WHERE rowid = ?", rowids)
+            conn.execute("DELETE FROM chunk_article_mapping WHERE article_id = ?", [article_id])
+            conn.execute("DELETE FROM article_fingerprint WHERE article_id = ?", [article_id])
+            answer_cache.invalidate_articles(conn, [article_id])
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"[Error in delete_article] {e}")
+            return False
+
     def clear_index(self):
         """清空向量库"""
+        with self._index_lock():
+            self._clear_index_locked()
+
+    def _clear_index_locked(self):
         conn = self._update_connection()
         try:
             conn.execute("DELETE FROM chunk_embeddings")
             conn.execute("DELETE FROM chunk_article_mapping")
+            conn.execute("DELETE FROM article_fingerprint")
+            answer_cache.clear(conn)
             conn.commit()
         except Exception as e:
             conn.rollback()
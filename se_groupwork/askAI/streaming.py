@@ -0,0 +1,123 @@
+from rest_framework.renderers import BaseRenderer
+import threading
+import weakref
+import asyncio
+import json
+
+'''
+流式问答的输出格式
+- 纯文本（默认）：回答文本，末尾 "\n[[REFERENCES]] " + JSON
+- SSE（请求头 Accept: text/event-stream）：
+    data: 回答片段                 （默认 message 事件）
+    event: references / data: JSON  参考文章元数据
+    event: heartbeat / data: {}     长时间无输出时的心跳，防止代理断开空闲连接
+    event: done / data: [DONE]      结束
+'''
+
+SSE_CONTENT_TYPE = "text/event-stream; charset=utf-8"
+TEXT_CONTENT_TYPE = "text/plain; charset=utf-8"
+
+
+class EventStreamRenderer(BaseRenderer):
+    '''让 DRF 内容协商接受 Accept: text/event-stream；回答流本身由 StreamingHttpResponse 输出，这里只渲染错误信息'''
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False)
+
+
+class StreamSlot:
+    '''
+    流式回答占用的并发名额，只释放一次
+    生成器可能从未开始迭代（客户端在首个片段前断开、响应被中间层丢弃），其 finally 不会执行，
+    因此同时挂在响应的 close 与回收上：生成器结束、响应关闭、响应被回收，以先发生者为准
+    '''
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+        self.released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self.released:
+                return
+            self.released = True
+        self.semaphore.release()
+
+    def attach(self, response):
+        # 与 StreamingHttpResponse 关闭生成器的方式相同，response.close() 时调用
+        response._resource_closers.append(self.release)
+        # ASGI 下请求任务被取消时不会调用 close，响应被回收时释放
+        weakref.finalize(response, self.release)
+        return response
+
+
+def wants_sse(request):
+    return 'text/event-stream' in request.META.get('HTTP_ACCEPT', '')
+
+
+def sse_event(data, event=None):
+    lines = [f"event: {event}"] if event else []
+    # 多行数据拆成多个 data 行，客户端按换行重新拼接
+    lines += [f"data: {line}" for line in data.split('\n')]
+    return '\n'.join(lines) + '\n\n'
+
+
+class StreamFormatter:
+    def __init__(self, sse):
+        self.sse = sse
+        self.content_type = SSE_CONTENT_TYPE if sse else TEXT_CONTENT_TYPE
+
+    def chunk(self, text):
+        return sse_event(text) if self.sse else text
+
+    def references(self, references_data):
+        data = json.dumps(references_data, ensure_ascii=False)
+        return sse_event(data, 'references') if self.sse else "\n[[REFERENCES]] " + data
+
+    def heartbeat(self):
+        return sse_event('{}', 'heartbeat')
+
+    def done(self):
+        return sse_event('[DONE]', 'done') if self.sse else ''
+
+    def prepare(self, response):
+        if self.sse:
+            response["Cache-Control"] = "no-cache"
+            # 关闭 nginx 对该响应的缓冲
+            response["X-Accel-Buffering"] = "no"
+        return response
+
+
+async def with_heartbeat(agen, interval):
+    '''
+    包装异步生成器：超过 interval 秒没有新数据时产出 None（由调用方输出心跳）
+    被取消（客户端断开）时同时取消底层生成器
+    '''
+    if not interval:
+        async for item in agen:
+            yield item
+        return
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(agen.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield None
+                continue
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                return
+            pending = None
+            yield item
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.wait({pending})
+        await agen.aclose()
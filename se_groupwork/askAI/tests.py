@@ -1,8 +1,23 @@
 from django.test import TestCase
 from webspider.models import PublicAccount, Article
-from askAI.askAI.ai_ask import ask_ai, get_reference_articles
-from askAI.sqlvec.sqlvec_tool import SqliteVectorTool
+from askAI.askAI.ai_ask import ask_ai, get_reference_articles, get_reference_context, pack_context, scope_key
+from askAI.sqlvec.sqlvec_tool import SqliteVectorTool, publish_month
 from se_groupwork.global_tools import global_sqlvec_tool_load
+from askAI.sqlvec.query_embedder import QueryEmbedder
+from askAI.sqlvec import outbox
+from askAI.models import SqlvecOutbox
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from askAI.streaming import with_heartbeat, sse_event
+from askAI.askAI import hybrid_retriever
+from se_groupwork.embedding_service import create_server, RemoteEmbeddings
+from se_groupwork.onnx_embedding import mean_pooling
+import tempfile
+import os
+from django.test import override_settings
+from unittest import mock
+import asyncio
+import threading
 import json
 import time
 
@@ -80,4 +95,345 @@ class AskAITestCase(TestCase):
         sqlvec_tool = t01_sqlvec_init(self)
         t02_sqlvec_update(self, sqlvec_tool)
         t03_sqlvec_rebuild(self, sqlvec_tool)
-        t04_sqlvec_search(self, sqlvec_tool)
\ No newline at end of file
+        t04_sqlvec_search(self, sqlvec_tool)
+    def test_sqlvec_batch_index(self):
+        sqlvec_tool = global_sqlvec_tool_load()
+        sqlvec_tool.clear_index()
+        articles = list(Article.objects.order_by('id'))
+        # 批大小小于chunk总数，使批次跨越文章边界
+        written = sqlvec_tool._index_articles([(article.id, article.content * 3) for article in articles], batch_size=4)
+        expected = {article.id: len(sqlvec_tool._split_content(article.content * 3)) for article in articles}
+        self.assertEqual(written, sum(expected.values()))
+        conn = sqlvec_tool._update_connection()
+        counts = dict(conn.execute("SELECT article_id, COUNT(*) FROM chunk_article_mapping GROUP BY article_id").fetchall())
+        self.assertEqual(counts, {article_id: count for article_id, count in expected.items() if count > 0})
+        self.assertEqual(
+            conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0],
+            conn.execute("SELECT COUNT(*) FROM chunk_article_mapping").fetchone()[0]
+        )
+
+    def test_sqlvec_incremental_index(self):
+        sqlvec_tool = global_sqlvec_tool_load()
+        sqlvec_tool.clear_index()
+        conn = sqlvec_tool._update_connection()
+        def chunk_count():
+            return conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        article = Article.objects.order_by('id').first()
+        paragraphs = [f"第{i}段：" + article.content[:300] for i in range(4)]
+        article.content = "\n\n".join(paragraphs)
+        article.save()
+        sqlvec_tool.clear_index()
+        sqlvec_tool.update_article(article.id)
+        count = chunk_count()
+        self.assertGreater(count, 1)
+        # 重复更新不产生重复向量，也不重新向量化
+        self.assertEqual(sqlvec_tool._index_articles([(article.id, article.content)]), 0)
+        sqlvec_tool.update_all_articles()
+        rows = conn.execute("SELECT COUNT(*) FROM chunk_article_mapping WHERE article_id = ?", [article.id]).fetchone()[0]
+        self.assertEqual(rows, count)
+        # 只修改最后一段：只向量化变化的chunk，旧chunk被删除
+        article.content = "\n\n".join(paragraphs[:-1] + ["全新的最后一段内容"])
+        # update() 不触发信号，由测试直接调用增量索引
+        Article.objects.filter(id=article.id).update(content=article.content)
+        written = sqlvec_tool._index_articles([(article.id, article.content)])
+        self.assertEqual(written, 1)
+        expected = len(sqlvec_tool._split_content(article.content))
+        rows = conn.execute("SELECT chunk_index FROM chunk_article_mapping WHERE article_id = ? ORDER BY chunk_index", [article.id]).fetchall()
+        self.assertEqual([row[0] for row in rows], list(range(expected)))
+        # 两个索引任务同时处理同一篇文章：第二个在锁内看到新指纹后跳过，不产生重复向量
+        sqlvec_tool.delete_article(article.id)
+        embed_texts = sqlvec_tool._embed_texts
+        def slow_embed_texts(texts):
+            time.sleep(0.2)
+            return embed_texts(texts)
+        # 线程中不访问测试数据库（sqlite 内存库不支持跨线程写事务）
+        with mock.patch.object(sqlvec_tool, '_embed_texts', side_effect=slow_embed_texts), \
+                mock.patch.object(sqlvec_tool, '_article_metadata', return_value={}), \
+                ThreadPoolExecutor(max_workers=2) as executor:
+            written = list(executor.map(lambda _: sqlvec_tool._index_articles([(article.id, article.content)]), range(2)))
+        self.assertEqual(sorted(written), [0, expected])
+        rows = conn.execute("SELECT COUNT(*) FROM chunk_article_mapping WHERE article_id = ?", [article.id]).fetchone()[0]
+        self.assertEqual(rows, expected)
+        # 删除文章同时删除向量
+        total = chunk_count()
+        article.delete()
+        self.assertEqual(chunk_count(), total - expected)
+        self.assertNotIn(article.id, sqlvec_tool.get_all_articles_ids())
+
+    def test_query_embedder(self):
+        calls = []
+        def embed_texts(texts):
+            calls.append(list(texts))
+            time.sleep(0.01)
+            return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+        embedder = QueryEmbedder(embed_texts, cache_size=2, batch_wait_ms=20, max_batch_size=8)
+        # 规范化后相同的问题命中缓存
+        vector = embedder.embed("食堂  有什么新菜？")
+        self.assertEqual(embedder.embed("食堂 有什么新菜? ").tolist(), vector.tolist())
+        self.assertEqual(embedder.get_stats()["hits"], 1)
+        self.assertEqual(len(calls), 1)
+        # 并发未命中的问题合并为少数几批，批内重复的问题只计算一次
+        questions = [f"问题{i % 4}" for i in range(16)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            vectors = list(executor.map(embedder.embed, questions))
+        self.assertEqual([v[0] for v in vectors], [float(len(q)) for q in questions])
+        self.assertLess(len(calls), 1 + 16)
+        self.assertLessEqual(sum(len(batch) for batch in calls[1:]), 16)
+        stats = embedder.get_stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 18)
+        self.assertLessEqual(stats["cache_size"], 2)
+        # 搜索复用问题向量缓存
+        sqlvec_tool = global_sqlvec_tool_load()
+        sqlvec_tool.update_all_articles()
+        sqlvec_tool.query_embedder.clear()
+        before = sqlvec_tool.query_embedder.get_stats()["hits"]
+        first = sqlvec_tool.search("最近食堂有什么上新的好吃的吗？", top_k=3)
+        second = sqlvec_tool.search("最近食堂有什么上新的好吃的吗？", top_k=3)
+        self.assertEqual(first, second)
+        self.assertEqual(sqlvec_tool.query_embedder.get_stats()["hits"], before + 1)
+
+    def test_answer_cache(self):
+        sqlvec_tool = global_sqlvec_tool_load()
+        sqlvec_tool.update_all_articles()
+        cache = sqlvec_tool.answer_cache
+        articles = list(Article.objects.order_by('id'))
+        references = [{"id": article.id, "title": article.title, "article_url": article.article_url} for article in articles[:2]]
+        question = "最近食堂有什么上新的好吃的吗？"
+        self.assertIsNone(cache.lookup(question))
+        self.assertIsNotNone(cache.store(question, "三食堂上新了手抓羊肉饭", references))
+        # 规范化后相同的问题命中
+        cached = cache.lookup("最近食堂有什么上新的好吃的吗? ")
+        self.assertEqual(cached["answer"], "三食堂上新了手抓羊肉饭")
+        self.assertEqual(cached["references"], references)
+        self.assertIsNone(cache.lookup("期末考试什么时候开始"))
+        # 过期不命中
+        ttl = cache.ttl
+        cache.ttl = -1
+        self.assertIsNone(cache.lookup(question))
+        cache.ttl = ttl
+        # 未被引用的文章更新不影响缓存，被引用的文章更新后失效
+        articles[-1].title = "新标题"
+        articles[-1].save()
+        self.assertIsNotNone(cache.lookup(question))
+        articles[0].title = "新标题"
+        articles[0].save()
+        self.assertIsNone(cache.lookup(question))
+        # 新文章入库后清空缓存
+        cache.store(question, "三食堂上新了手抓羊肉饭", references[1:])
+        self.assertIsNotNone(cache.lookup(question))
+        Article.objects.create(
+            public_account=articles[0].public_account,
+            title="一食堂新开麻辣烫窗口",
+            content="一食堂一楼新开麻辣烫窗口，欢迎同学们品尝。",
+            article_url="https://mp.weixin.qq.com/example_new",
+            publish_time=articles[0].publish_time
+        )
+        self.assertIsNone(cache.lookup(question))
+        # 多个请求线程同时写入：各线程使用自己的连接，事务互不干扰
+        questions = [f"第{i}个问题：图书馆几点开门？" for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            cache_ids = list(executor.map(lambda q: cache.store(q, "八点", references[1:]), questions))
+        self.assertNotIn(None, cache_ids)
+        self.assertEqual(len(set(cache_ids)), len(questions))
+
+    def test_stream_heartbeat(self):
+        self.assertEqual(sse_event("第一行\n第二行", "message"), "event: message\ndata: 第一行\ndata: 第二行\n\n")
+        closed = []
+
+        async def slow_chunks():
+            try:
+                yield "a"
+                await asyncio.sleep(0.05)
+                yield "b"
+                await asyncio.sleep(10)
+                yield "c"
+            finally:
+                closed.append(True)
+
+        async def consume():
+            items = []
+            async for item in with_heartbeat(slow_chunks(), 0.02):
+                items.append(item)
+                # 模拟客户端在收到 b 之后断开
+                if item == "b":
+                    break
+            return items
+
+        items = asyncio.run(consume())
+        self.assertEqual(items[0], "a")
+        self.assertIn(None, items)
+        self.assertEqual(items[-1], "b")
+        self.assertEqual(closed, [True])
+
+    def test_chunk_context(self):
+        sqlvec_tool = global_sqlvec_tool_load()
+        article = Article.objects.order_by('id').first()
+        article.content = "\n\n".join(f"第{i}段：" + "内容" * 150 for i in range(5))
+        article.save()
+        sqlvec_tool.clear_index()
+        sqlvec_tool.update_all_articles()
+        # 映射表保存chunk正文与偏移
+        chunks = sqlvec_tool.get_chunks([article.id])[article.id]
+        self.assertEqual(len(chunks), len(sqlvec_tool._split_content(article.content)))
+        for chunk_text, start, end in chunks.values():
+            self.assertEqual(article.content[start:end], chunk_text)
+        # 命中第2个chunk时带上相邻chunk，不相邻的片段用省略号隔开
+        packed = pack_context([(article.id, [2])], {article.id: chunks}, budget=10000, neighbours=1)
+        self.assertIn("第1段", packed[article.id])
+        self.assertIn("第3段", packed[article.id])
+        self.assertNotIn("第0段", packed[article.id])
+        packed = pack_context([(article.id, [0, 4])], {article.id: chunks}, budget=10000, neighbours=0)
+        self.assertIn("……", packed[article.id])
+        # 预算不足时只放入最相关的chunk
+        packed = pack_context([(article.id, [2])], {article.id: chunks}, budget=len(chunks[2][0]), neighbours=1)
+        self.assertEqual(packed[article.id], chunks[2][0])
+        # 文章批量加载，只查询一次数据库
+        with self.assertNumQueries(1):
+            context = get_reference_context("最近食堂有什么上新的好吃的吗？")
+        self.assertGreaterEqual(len(context), 1)
+        self.assertLessEqual(sum(len(text) for _, text in context), 4000 + sum(len(a.title) + 4 for a, _ in context))
+
+    def test_hybrid_retriever(self):
+        # 两个引擎都靠前的文章排名最高
+        self.assertEqual(hybrid_retriever.rrf_fuse([[1, 2, 3], [3, 1]], k=60), [1, 3, 2])
+        sqlvec_tool = global_sqlvec_tool_load()
+        sqlvec_tool.update_all_articles()
+        article = Article.objects.order_by('id').last()
+        vector_only = [article_id for article_id, _ in hybrid_retriever.retrieve("食堂新菜")]
+        self.assertGreaterEqual(len(vector_only), 1)
+        # 关键词命中的文章参与融合
+        with mock.patch.object(hybrid_retriever, '_keyword_search', return_value=[article.id]):
+            ranked = hybrid_retriever.retrieve("食堂新菜", max_articles=10)
+        self.assertIn(article.id, [article_id for article_id, _ in ranked])
+        # 关键词引擎超时：在截止时间返回向量检索结果
+        def slow_keyword_search(question, *args):
+            time.sleep(1)
+            return [article.id]
+        with override_settings(HYBRID_KEYWORD_TIMEOUT=0.1), \
+                mock.patch.object(hybrid_retriever, '_keyword_search', side_effect=slow_keyword_search):
+            start = time.time()
+            ranked = hybrid_retriever.retrieve("食堂新菜")
+            self.assertLess(time.time() - start, 0.8)
+        self.assertEqual([article_id for article_id, _ in ranked], vector_only)
+        # 向量引擎出错：只使用关键词结果
+        with mock.patch.object(hybrid_retriever, '_vector_search', side_effect=RuntimeError("boom")), \
+                mock.patch.object(hybrid_retriever, '_keyword_search', return_value=[article.id]):
+            self.assertEqual(hybrid_retriever.retrieve("食堂新菜"), [(article.id, [])])
+
+    def test_embedding_server(self):
+        class CountingEmbedding:
+            def __init__(self):
+                self.calls = 0
+
+            def embed_documents(self, texts):
+                self.calls += 1
+                time.sleep(0.02)
+                return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+        socket_path = os.path.join(tempfile.mkdtemp(), "embedding.sock")
+        for url in ("http://127.0.0.1:0", f"unix://{socket_path}"):
+            embedding = CountingEmbedding()
+            server = create_server(embedding, url, batch_wait_ms=20, max_batch_size=64)
+            client_url = url if url.startswith("unix") else f"http://127.0.0.1:{server.server_address[1]}"
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                client = RemoteEmbeddings(client_url, max_request_size=3)
+                vectors = client.embed_documents(["a", "bb", "ccc", "dddd"])
+                self.assertEqual([v[0] for v in vectors], [1.0, 2.0, 3.0, 4.0])
+                self.assertEqual(client.embed_query("ee"), [2.0, 1.0, 0.0])
+                # 多个客户端的并发请求合并成少数批次
+                calls = embedding.calls
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    results = list(executor.map(lambda text: client.embed_query(text), ["x" * i for i in range(1, 17)]))
+                self.assertEqual([r[0] for r in results], [float(i) for i in range(1, 17)])
+                self.assertLess(embedding.calls - calls, 16)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def test_onnx_mean_pooling(self):
+        hidden = np.array([
+            [[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]],
+            [[0.0, 2.0], [0.0, 2.0], [0.0, 2.0]],
+        ], dtype=np.float32)
+        mask = np.array([[1, 1, 0], [1, 1, 1]])
+        vectors = mean_pooling(hidden, mask)
+        # padding 位置不参与平均，结果归一化
+        self.assertTrue(np.allclose(vectors, [[1.0, 0.0], [0.0, 1.0]]))
+
+    def test_filtered_search(self):
+        sqlvec_tool = global_sqlvec_tool_load()
+        sqlvec_tool.update_all_articles()
+        article = Article.objects.order_by('id').first()
+        old_account_id = article.public_account_id
+        other_account = PublicAccount.objects.create(name='其他公众号', fakeid='other_fakeid', icon='icon.jpg')
+        Article.objects.filter(id=article.id).update(public_account=other_account)
+        self.assertGreater(sqlvec_tool.sync_metadata(), 0)
+        month = publish_month(article.publish_time)
+        question = "最近食堂有什么上新的好吃的吗？"
+        # 公众号过滤在KNN内部生效
+        hits = sqlvec_tool.search_chunks(question, top_k=50, account_ids=[other_account.id])
+        self.assertGreaterEqual(len(hits), 1)
+        self.assertEqual({article_id for article_id, _, _ in hits}, {article.id})
+        self.assertEqual([article_id for article_id, _ in sqlvec_tool.search(question, account_ids=[other_account.id])], [article.id])
+        self.assertNotIn(article.id, [article_id for article_id, _, _ in sqlvec_tool.search_chunks(
+            question, top_k=50, account_ids=[old_account_id]
+        )])
+        self.assertEqual(sqlvec_tool.search_chunks(question, account_ids=[]), [])
+        # 发布月份下限
+        self.assertEqual(sqlvec_tool.search_chunks(question, top_k=50, since_month=month + 10000), [])
+        hits = sqlvec_tool.search_chunks(question, top_k=50, since_month=month)
+        self.assertIn(article.id, {article_id for article_id, _, _ in hits})
+        # 检索范围内无结果时退回全库
+        with override_settings(HYBRID_RETRIEVAL_ENABLED=False):
+            context = get_reference_context(question, scope=([other_account.id], None))
+            self.assertEqual([ref.id for ref, _ in context], [article.id])
+            self.assertGreaterEqual(len(get_reference_context(question, scope=([], None))), 1)
+        # 不同检索范围的语义缓存互不命中
+        scope = ([other_account.id], month)
+        references = [{"id": article.id, "title": article.title, "article_url": article.article_url}]
+        sqlvec_tool.answer_cache.store(question, "回答", references, scope_key(scope))
+        self.assertIsNotNone(sqlvec_tool.answer_cache.lookup(question, scope_key(scope)))
+        self.assertIsNone(sqlvec_tool.answer_cache.lookup(question, scope_key(None)))
+        # 只修改公众号/发布时间的保存也会刷新过滤元数据（测试模式下待办同步处理）
+        article.refresh_from_db()
+        article.public_account_id = old_account_id
+        article.save(update_fields=['public_account'])
+        self.assertIn(article.id, {article_id for article_id, _, _ in sqlvec_tool.search_chunks(
+            question, top_k=50, account_ids=[old_account_id]
+        )})
+        self.assertNotIn(article.id, [article_id for article_id, _, _ in sqlvec_tool.search_chunks(
+            question, top_k=50, account_ids=[other_account.id]
+        )])
+        article.publish_time = article.publish_time.replace(year=article.publish_time.year + 2)
+        article.save(update_fields=['publish_time'])
+        hits = sqlvec_tool.search_chunks(question, top_k=50, since_month=month + 100)
+        self.assertEqual({article_id for article_id, _, _ in hits}, {article.id})
+
+    def test_sqlvec_outbox(self):
+        sqlvec_tool = global_sqlvec_tool_load()
+        sqlvec_tool.clear_index()
+        account = PublicAccount.objects.first()
+        with override_settings(SQLVEC_OUTBOX_ASYNC=True), mock.patch('askAI.signals.is_test_mode', return_value=False):
+            article = Article.objects.create(
+                public_account=account, title="食堂新菜", content="三食堂上新了手抓羊肉饭。",
+                article_url="https://example.com/outbox", publish_time="2025-10-7 12:00"
+            )
+            # 保存只入队，不向量化
+            self.assertTrue(SqlvecOutbox.objects.filter(article_id=article.id, action=SqlvecOutbox.ACTION_UPDATE).exists())
+            self.assertNotIn(article.id, sqlvec_tool.get_all_articles_ids())
+            # 索引失败时保留待办并记录失败次数
+            with mock.patch.object(sqlvec_tool, 'update_articles', return_value=None):
+                self.assertEqual(outbox.drain(), 0)
+            self.assertEqual(SqlvecOutbox.objects.get(article_id=article.id).attempts, 1)
+            self.assertEqual(outbox.drain(batch_size=2), 1)
+            self.assertEqual(SqlvecOutbox.objects.count(), 0)
+            self.assertIn(article.id, sqlvec_tool.get_all_articles_ids())
+            article_id = article.id
+            article.delete()
+            self.assertEqual(SqlvecOutbox.objects.get(article_id=article_id).action, SqlvecOutbox.ACTION_DELETE)
+            self.assertIn(article_id, sqlvec_tool.get_all_articles_ids())
+            outbox.drain()
+            self.assertNotIn(article_id, sqlvec_tool.get_all_articles_ids())
+            self.assertEqual(SqlvecOutbox.objects.count(), 0)
@@ -3,23 +3,29 @@ from django.shortcuts import render
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.settings import api_settings
 from django.http import StreamingHttpResponse
-import json
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from asgiref.sync import sync_to_async
 import threading
 
 from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse
 from askAI.serializers import ReferenceArticleSerializer
 
-from askAI.askAI.ai_ask import ask_ai, get_reference_articles
+from askAI.askAI.ai_ask import ask_ai, async_ask_ai, get_reference_context, get_cached_answer, cache_answer, get_search_scope
+from askAI.streaming import StreamFormatter, EventStreamRenderer, StreamSlot, wants_sse, with_heartbeat
 
 # 限制并发：最多同时处理3个AI问答请求（每个进程）
 ASK_CONCURRENCY_SEMAPHORE = threading.Semaphore(3)
+# ASGI 下流式问答的并发上限（每个进程）
+ASK_ASYNC_STREAM_SEMAPHORE = threading.Semaphore(settings.ASK_STREAM_ASYNC_CONCURRENCY)
 
 # Create your views here.
 @extend_schema(
     tags=['智能体'],
     summary='询问',
-    description='向AI智能体提问，基于推送知识库回答问题',
+    description='向AI智能体提问，基于推送知识库回答问题；相近问题命中语义缓存时直接返回（cached为true）',
     methods=['POST'],
     request={
         "application/json": {
@@ -43,7 +49,8 @@ ASK_CONCURRENCY_SEMAPHORE = threading.Semaphore(3)
                         "title": "今日天气预报",
                         "article_url": "https://example.com/article/1"
                     }
-                ]
+                ],
+                "cached": False
             }
         }),
         400: OpenApiResponse(description='参数错误'),
@@ -52,33 +59,46 @@ ASK_CONCURRENCY_SEMAPHORE = threading.Semaphore(3)
 )
 class AskView(APIView):
     def post(self, request):
+        question = request.data.get('question')
+        if not question:
+            return Response({'error': '请输入问题'}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = get_search_scope(request.user)
+        # 语义缓存命中时直接返回，不占用并发名额
+        cached = get_cached_answer(question, scope)
+        if cached is not None:
+            return Response({
+                "question": question,
+                "answer": cached["answer"],
+                "references-articles": cached["references"],
+                "cached": True
+            })
+
         # 并发保护：超过并发上限时直接拒绝
         acquired = ASK_CONCURRENCY_SEMAPHORE.acquire(blocking=False)
         if not acquired:
             return Response({'error': '接口繁忙，请稍后再试'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        question = request.data.get('question')
-        if not question:
-            ASK_CONCURRENCY_SEMAPHORE.release()
-            return Response({'error': '请输入问题'}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            reference_articles = get_reference_articles(question)
+            reference_context = get_reference_context(question, scope)
+            reference_articles = [article for article, _ in reference_context]
             if not reference_articles:
                 return Response({
                     "question": question,
                     "answer": "抱歉，没有找到与该问题相关的文章",
                     "references-articles": []
                 })
-            contents = [article.content for article in reference_articles]
+            contents = [context for _, context in reference_context]
             full_response = ''
             for chunk in ask_ai(question, contents):
                 full_response += chunk
             reference = ReferenceArticleSerializer(reference_articles, many=True).data
+            cache_answer(question, full_response, reference, scope)
             return Response({
                 "question": question,
                 "answer": full_response,
-                "references-articles": reference
+                "references-articles": reference,
+                "cached": False
             })
         finally:
             ASK_CONCURRENCY_SEMAPHORE.release()
@@ -87,7 +107,7 @@ class AskView(APIView):
 @extend_schema(
     tags=['智能体'],
     summary='询问（流式）',
-    description='流式返回回答内容，末尾附带参考文章元数据（[[REFERENCES]] JSON）',
+    description='流式返回回答内容，末尾附带参考文章元数据（[[REFERENCES]] JSON）；响应头 X-Answer-Cache 表示是否命中语义缓存。请求头 Accept: text/event-stream 时按 SSE 输出（message/references/heartbeat/done 事件）',
     methods=['POST'],
     request={
         "application/json": {
@@ -101,42 +121,93 @@ class AskView(APIView):
         }
     },
     responses={
-        200: OpenApiResponse(description='成功（流式文本）'),
+        200: OpenApiResponse(description='成功（流式文本或SSE）'),
         400: OpenApiResponse(description='参数错误'),
         503: OpenApiResponse(description='接口繁忙')
     }
 )
 class AskStreamView(APIView):
-    def post(self, request):
-        acquired = ASK_CONCURRENCY_SEMAPHORE.acquire(blocking=False)
-        if not acquired:
-            return Response({'error': '接口繁忙，请稍后再试'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [EventStreamRenderer]
 
+    def post(self, request):
         question = request.data.get('question')
         if not question:
-            ASK_CONCURRENCY_SEMAPHORE.release()
             return Response({'error': '请输入问题'}, status=status.HTTP_400_BAD_REQUEST)
+        formatter = StreamFormatter(wants_sse(request))
+
+        scope = get_search_scope(request.user)
+        # 语义缓存命中时一次性输出缓存回答，不占用并发名额
+        cached = get_cached_answer(question, scope)
+        if cached is not None:
+            def cached_stream():
+                yield formatter.chunk(cached["answer"])
+                if cached["references"]:
+                    yield formatter.references(cached["references"])
+                if formatter.sse:
+                    yield formatter.done()
+
+            response = StreamingHttpResponse(cached_stream(), content_type=formatter.content_type)
+            response["X-Answer-Cache"] = "HIT"
+            return formatter.prepare(response)
+
+        # ASGI 下回答流由事件循环驱动，不占用线程，并发上限可以放宽
+        is_async = isinstance(request._request, ASGIRequest)
+        semaphore = ASK_ASYNC_STREAM_SEMAPHORE if is_async else ASK_CONCURRENCY_SEMAPHORE
+        acquired = semaphore.acquire(blocking=False)
+        if not acquired:
+            return Response({'error': '接口繁忙，请稍后再试'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        slot = StreamSlot(semaphore)
 
         try:
-            reference_articles = get_reference_articles(question)
-            references_data = ReferenceArticleSerializer(reference_articles, many=True).data if reference_articles else []
+            reference_context = get_reference_context(question, scope)
+            references_data = ReferenceArticleSerializer([article for article, _ in reference_context], many=True).data
+            contents = [context for _, context in reference_context]
 
             def stream():
                 try:
-                    contents = [article.content for article in reference_articles] if reference_articles else []
                     if not contents:
-                        yield "抱歉，没有找到与该问题相关的文章\n"
+                        yield formatter.chunk("抱歉，没有找到与该问题相关的文章\n")
                     else:
+                        full_response = ''
                         for chunk in ask_ai(question, contents):
-                            yield chunk
+                            full_response += chunk
+                            yield formatter.chunk(chunk)
+                        # 完整输出后才写入缓存，客户端中途断开的回答不缓存
+                        cache_answer(question, full_response, references_data, scope)
                     # 附带参考文章元数据，前端可解析
                     if references_data:
-                        yield "\n[[REFERENCES]] " + json.dumps(references_data, ensure_ascii=False)
+                        yield formatter.references(references_data)
+                    if formatter.sse:
+                        yield formatter.done()
                 finally:
-                    ASK_CONCURRENCY_SEMAPHORE.release()
+                    slot.release()
 
-            return StreamingHttpResponse(stream(), content_type="text/plain; charset=utf-8")
+            async def async_stream():
+                try:
+                    if not contents:
+                        yield formatter.chunk("抱歉，没有找到与该问题相关的文章\n")
+                    else:
+                        full_response = ''
+                        heartbeat_interval = settings.ASK_STREAM_HEARTBEAT_INTERVAL if formatter.sse else None
+                        async for chunk in with_heartbeat(async_ask_ai(question, contents), heartbeat_interval):
+                            if chunk is None:
+                                yield formatter.heartbeat()
+                                continue
+                            full_response += chunk
+                            yield formatter.chunk(chunk)
+                        await sync_to_async(cache_answer)(question, full_response, references_data, scope)
+                    if references_data:
+                        yield formatter.references(references_data)
+                    if formatter.sse:
+                        yield formatter.done()
+                finally:
+                    # 客户端断开时 Django 取消该生成器，AI 请求随之关闭
+                    slot.release()
+
+            response = StreamingHttpResponse(async_stream() if is_async else stream(), content_type=formatter.content_type)
+            response["X-Answer-Cache"] = "MISS"
+            slot.attach(response)
+            return formatter.prepare(response)
         except Exception:
-            ASK_CONCURRENCY_SEMAPHORE.release()
+            slot.release()
             raise
-        
\ No newline at end of file
@@ -23,8 +23,21 @@ python manage.py collectstatic --noinput
 
 echo "Starting Gunicorn..."
 # Increase timeout to tolerate slower LLM responses; adjust via WEB_TIMEOUT if needed
+# WEB_SERVER=asgi (default) serves se_groupwork.asgi with uvicorn workers so that
+# /api/ask/stream/ can hold many concurrent LLM streams per process;
+# WEB_SERVER=wsgi falls back to sync workers
+if [ "${WEB_SERVER:-asgi}" = "asgi" ]; then
+  exec gunicorn se_groupwork.asgi:application \
+    --worker-class uvicorn_worker.UvicornWorker \
+    --bind 0.0.0.0:8000 \
+    --workers ${WEB_CONCURRENCY:-3} \
+    --timeout ${WEB_TIMEOUT:-60} \
+    --graceful-timeout ${WEB_GRACEFUL_TIMEOUT:-30}
+fi
+
 exec gunicorn se_groupwork.wsgi:application \
   --bind 0.0.0.0:8000 \
   --workers ${WEB_CONCURRENCY:-3} \
+  --threads ${WEB_THREADS:-1} \
   --timeout ${WEB_TIMEOUT:-60} \
   --graceful-timeout ${WEB_GRACEFUL_TIMEOUT:-30}
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from remoteAI.remoteAI.vectorize import KEYWORD_VECTOR_DIM, batch_keywords_vectorize, keyword_vector_cache
+from se_groupwork.global_tools import global_vecstore_tool_load
+from webspider.models import Article
+import json
+import ast
+import re
+
+
+def parse_key_info(key_info):
+    '''key_info 以列表的字符串形式存储（"['a', 'b']"），兼容JSON与分隔符文本'''
+    text = (key_info or "").strip()
+    if not text:
+        return []
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            value = loader(text)
+        except (ValueError, SyntaxError):
+            continue
+        if isinstance(value, (list, tuple)):
+            return [str(item) for item in value]
+    return [part for part in re.split(r"[,，、;；\n]", text) if part.strip()]
+
+
+class Command(BaseCommand):
+    help = '按 key_info 重新计算维度不正确的文章语义向量（旧版本存成了 1x768 的整段嵌入，关键词偏好不计分）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批处理的文章数')
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要回填的文章数')
+
+    def handle(self, *args, **options):
+        queryset = Article.objects.exclude(summary="").only('id', 'key_info', 'tags_vector', 'semantic_vector').order_by('id')
+        vecstore = global_vecstore_tool_load()
+        batch, updated = [], 0
+
+        def flush():
+            vectors = batch_keywords_vectorize([keywords for _, keywords in batch])
+            for (article, _), vector in zip(batch, vectors):
+                Article.objects.filter(id=article.id).update(semantic_vector=vector)
+            # update() 不触发 post_save，需手动同步共享向量矩阵
+            vecstore.upsert_vectors([(article.id, article.tags_vector, vector) for (article, _), vector in zip(batch, vectors)])
+            batch.clear()
+
+        for article in queryset.iterator(chunk_size=options['batch_size']):
+            if len(article.semantic_vector) == KEYWORD_VECTOR_DIM:
+                continue
+            keywords = parse_key_info(article.key_info)
+            if not keywords:
+                continue
+            updated += 1
+            if options['dry_run']:
+                continue
+            batch.append((article, keywords))
+            if len(batch) >= options['batch_size']:
+                flush()
+        if batch:
+            flush()
+        action = '需要回填' if options['dry_run'] else '已回填'
+        self.stdout.write(self.style.SUCCESS(f'{action}{updated}篇文章的语义向量'))
+        self.stdout.write(f"关键词向量统计：{keyword_vector_cache.get_stats()}")
@@ -21,8 +21,8 @@ class Command(BaseCommand):
         max_count = options['max_count']
 
         #TODO 分别处理各个公众号的未处理文章
-        manager = TaskManager(target_accounts_name=account_names, max_article_num=max_count, max_semaphore=10)
-        result = manager.startrun()
+        manager = TaskManager(max_workers=10)
+        result = manager.startrun(target_accounts_name=account_names, max_article_num=max_count)
         if result:
             self.stdout.write(self.style.SUCCESS('任务执行成功！'))
         else:
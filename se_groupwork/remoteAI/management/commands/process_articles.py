@@ -1,13 +1,18 @@
 from django.core.management.base import BaseCommand
 from remoteAI.remoteAI.task_manager import TaskManager
+from remoteAI.remoteAI.vectorize import keyword_vector_cache
+from se_groupwork.global_tools import global_llm_client_load, global_summary_scheduler_load
 
 class Command(BaseCommand):
     help = '处理未摘要的文章'
 
     def handle(self, *args, **options):
-        manager = TaskManager(max_workers=50)
+        manager = TaskManager()
         result = manager.startrun()
         if result:
             self.stdout.write(self.style.SUCCESS('任务执行成功！'))
+            self.stdout.write(f"大模型请求统计：{global_llm_client_load('remoteAI').get_stats()}")
+            self.stdout.write(f"调度统计：{global_summary_scheduler_load().get_stats()}")
+            self.stdout.write(f"关键词向量统计：{keyword_vector_cache.get_stats()}")
         else:
             self.stdout.write('没有需要处理的任务')
\ No newline at end of file
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('webspider', '0006_article_binary_vectors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleProcessingState',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='processing_state', serialize=False, to='webspider.article', verbose_name='文章')),
+                ('status', models.CharField(choices=[('pending', '待处理'), ('claimed', '处理中'), ('done', '已完成'), ('failed', '已失败')], default='pending', max_length=10, verbose_name='状态')),
+                ('attempts', models.IntegerField(default=0, verbose_name='尝试次数')),
+                ('claimed_by', models.CharField(blank=True, default='', max_length=100, verbose_name='领取的worker')),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True, verbose_name='租约到期时间')),
+                ('next_retry_at', models.DateTimeField(blank=True, null=True, verbose_name='下次重试时间')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='最近错误')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '文章摘要任务',
+                'verbose_name_plural': '文章摘要任务',
+                'indexes': [models.Index(fields=['status', 'next_retry_at'], name='remoteAI_ar_status_1293f2_idx'), models.Index(fields=['status', 'lease_expires_at'], name='remoteAI_ar_status_68a65b_idx')],
+            },
+        ),
+    ]
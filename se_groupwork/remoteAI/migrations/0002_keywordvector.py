@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+import webspider.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('remoteAI', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeywordVector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=255, unique=True, verbose_name='关键词')),
+                ('vector', webspider.fields.VectorField(default=list, verbose_name='向量')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '关键词向量',
+                'verbose_name_plural': '关键词向量',
+            },
+        ),
+    ]
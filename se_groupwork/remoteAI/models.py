@@ -1,4 +1,105 @@
 from django.db import models
 from webspider.models import Article
+from webspider.fields import VectorField
 
 # Create your models here.
+class ArticleProcessingState(models.Model):
+    """
+    文章摘要任务状态
+    - pending：等待处理（next_retry_at 之前不会被领取）
+    - claimed：已被某个 worker 领取，lease_expires_at 前由其处理；租约过期（worker 崩溃）后可被重新领取
+    - done：摘要已写回
+    - failed：失败次数达到上限，不再自动重试
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_CLAIMED = 'claimed'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '待处理'),
+        (STATUS_CLAIMED, '处理中'),
+        (STATUS_DONE, '已完成'),
+        (STATUS_FAILED, '已失败'),
+    ]
+
+    article = models.OneToOneField(
+        Article,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='processing_state',
+        verbose_name='文章'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='状态'
+    )
+    attempts = models.IntegerField(
+        default=0,
+        verbose_name='尝试次数'
+    )
+    claimed_by = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='领取的worker'
+    )
+    lease_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='租约到期时间'
+    )
+    next_retry_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='下次重试时间'
+    )
+    last_error = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='最近错误'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='更新时间'
+    )
+
+    def __str__(self):
+        return f"{self.article_id} {self.status}"
+
+    class Meta:
+        verbose_name = '文章摘要任务'
+        verbose_name_plural = '文章摘要任务'
+        indexes = [
+            models.Index(fields=['status', 'next_retry_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+
+
+class KeywordVector(models.Model):
+    """
+    关键词向量词典：摘要提取的关键词大量重复（如“奖学金”“讲座”），向量只计算一次
+    - 向量为嵌入的前 KEYWORD_VECTOR_DIM 维
+    - 更换向量化模型后需清空该表
+    """
+    keyword = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='关键词'
+    )
+    vector = VectorField(
+        default=list,
+        verbose_name='向量'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='创建时间'
+    )
+
+    def __str__(self):
+        return self.keyword
+
+    class Meta:
+        verbose_name = '关键词向量'
+        verbose_name_plural = '关键词向量'
@@ -1,6 +1,6 @@
 import re
 import json
-from remoteAI.remoteAI.ai_request import get_response
+from remoteAI.remoteAI.ai_request import get_response, LLMRequestError
 from remoteAI.remoteAI.vectorize import keywords_vectorize, tags_vectorize
 
 def extract_json(content):
@@ -71,23 +71,29 @@ def ai_summarize_article(content):
 		{"role": "user", "content": f"{content}"}
 	]
 	response = get_response(messages)
+	if not response:
+		# 限流/过载已由调度器退避重试，这里不再整体重试
+		raise LLMRequestError("大模型请求失败")
 	json_data = extract_json(response)
 	return json_data
 
 
-def entry(article_msg):
+def entry(article_msg, vectorize_keywords=True):
+	'''
+	:param vectorize_keywords: False 时不计算 semantic_vector，由调用方对一批文章统一计算（batch_keywords_vectorize）
+	'''
 	for retry in range(3):
 		ai_resp = ai_summarize_article(json.dumps(article_msg, ensure_ascii=False, indent=4))
-		success_flag = True
-		success_flag &= (ai_resp is not None)
-		success_flag &= ("summary" in ai_resp)
-		success_flag &= ("key_info" in ai_resp)
-		success_flag &= ("tags" in ai_resp)
+		success_flag = ai_resp is not None
+		success_flag = success_flag and ("summary" in ai_resp)
+		success_flag = success_flag and ("key_info" in ai_resp)
+		success_flag = success_flag and ("tags" in ai_resp)
 		if not success_flag:
 			continue
 		ai_resp["relevant_time"] = [] if "relevant_time" not in ai_resp else ai_resp["relevant_time"]
 		print(ai_resp)
-		ai_resp["semantic_vector"] = keywords_vectorize(ai_resp["key_info"])
+		if vectorize_keywords:
+			ai_resp["semantic_vector"] = keywords_vectorize(ai_resp["key_info"])
 		ai_resp["tags_vector"] = tags_vectorize(ai_resp["tags"])
 		return ai_resp
 	return None
\ No newline at end of file
@@ -0,0 +1,113 @@
+import os
+import socket
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from remoteAI.models import ArticleProcessingState
+from webspider.models import Article
+
+'''
+摘要任务队列：多个 process_articles 进程（或容器）通过 ArticleProcessingState 分摊待处理文章
+- enqueue_pending：为未摘要且没有任务状态的文章创建 pending 任务
+- claim：SELECT ... FOR UPDATE SKIP LOCKED 领取一批任务并写入租约，其他 worker 跳过被锁定的行
+- complete / fail：只更新本 worker 仍持有的任务；失败按指数退避重试，超过次数后标记 failed
+'''
+
+State = ArticleProcessingState
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_pending():
+    '''为未摘要、尚无任务状态的文章创建任务，返回新建数'''
+    article_ids = list(
+        Article.objects.filter(summary="", processing_state__isnull=True).values_list('id', flat=True)
+    )
+    State.objects.bulk_create([State(article_id=article_id) for article_id in article_ids], ignore_conflicts=True)
+    return len(article_ids)
+
+
+def claimable(now=None):
+    '''可领取的任务：到了重试时间的 pending，以及租约已过期的 claimed'''
+    now = now or timezone.now()
+    return State.objects.filter(
+        Q(status=State.STATUS_PENDING) & (Q(next_retry_at__isnull=True) | Q(next_retry_at__lte=now))
+        | Q(status=State.STATUS_CLAIMED, lease_expires_at__lt=now)
+    )
+
+
+def claim(worker_id, limit, target_accounts_name=None, lease_seconds=None):
+    '''
+    领取最多 limit 个任务（新文章优先）
+    :return: 领取到的文章id列表
+    '''
+    if limit <= 0:
+        return []
+    lease_seconds = lease_seconds or settings.SUMMARY_CLAIM_LEASE_SECONDS
+    with transaction.atomic():
+        now = timezone.now()
+        # 租约多次过期（worker 处理该文章时反复崩溃）的任务不再领取
+        State.objects.filter(
+            status=State.STATUS_CLAIMED, lease_expires_at__lt=now, attempts__gte=settings.SUMMARY_MAX_ATTEMPTS
+        ).update(status=State.STATUS_FAILED, lease_expires_at=None, last_error="租约多次过期")
+        queryset = claimable(now)
+        if target_accounts_name:
+            queryset = queryset.filter(
+                article_id__in=Article.objects.filter(public_account__name__in=target_accounts_name).values('id')
+            )
+        article_ids = list(
+            queryset.select_for_update(skip_locked=True).order_by('-article_id').values_list('article_id', flat=True)[:limit]
+        )
+        if article_ids:
+            State.objects.filter(article_id__in=article_ids).update(
+                status=State.STATUS_CLAIMED,
+                claimed_by=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=F('attempts') + 1
+            )
+    return article_ids
+
+
+def renew(worker_id, article_ids, lease_seconds=None):
+    '''延长本 worker 仍在处理的任务的租约'''
+    lease_seconds = lease_seconds or settings.SUMMARY_CLAIM_LEASE_SECONDS
+    return State.objects.filter(
+        article_id__in=article_ids, status=State.STATUS_CLAIMED, claimed_by=worker_id
+    ).update(lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds))
+
+
+def complete(worker_id, article_ids):
+    '''标记完成；租约已过期并被其他 worker 领取的任务不受影响'''
+    return State.objects.filter(
+        article_id__in=article_ids, status=State.STATUS_CLAIMED, claimed_by=worker_id
+    ).update(status=State.STATUS_DONE, lease_expires_at=None, last_error="")
+
+
+def retry_delay(attempts):
+    '''第 attempts 次失败后的等待时间：指数退避，有上限'''
+    return min(settings.SUMMARY_RETRY_BACKOFF * (2 ** max(0, attempts - 1)), settings.SUMMARY_RETRY_BACKOFF_MAX)
+
+
+def fail(worker_id, article_id, error=""):
+    '''记录失败：未达到次数上限时按退避时间重新排队，否则标记 failed'''
+    with transaction.atomic():
+        state = State.objects.select_for_update().filter(
+            article_id=article_id, status=State.STATUS_CLAIMED, claimed_by=worker_id
+        ).first()
+        if state is None:
+            return None
+        if state.attempts >= settings.SUMMARY_MAX_ATTEMPTS:
+            state.status = State.STATUS_FAILED
+            state.next_retry_at = None
+        else:
+            state.status = State.STATUS_PENDING
+            state.next_retry_at = timezone.now() + timedelta(seconds=retry_delay(state.attempts))
+        state.lease_expires_at = None
+        state.last_error = str(error)[:1000]
+        state.save(update_fields=['status', 'next_retry_at', 'lease_expires_at', 'last_error', 'updated_at'])
+        return state.status
@@ -0,0 +1,208 @@
+import time
+import random
+import threading
+from collections import deque
+import requests
+
+'''
+摘要任务的大模型请求调度
+- TokenBucket：令牌桶限速，分别限制每分钟请求数与每分钟token数（token数按字符数估算）
+- AIMDLimiter：自适应并发上限，收到 429/5xx/超时时乘性减小，延迟正常的请求完成后加性增大
+- LLMScheduler：每个请求先过限速再取得并发名额；被限流的请求按退避（优先使用 Retry-After）重试，
+  不再依赖 HTTP 层的盲目重试
+统计中的 throughput 为最近一分钟完成的请求数，backlog 积压时应稳定在服务商允许的最大速率附近
+'''
+
+THROTTLE_STATUS = {429, 500, 502, 503, 504}
+THROUGHPUT_WINDOW = 60  # 吞吐量统计窗口（秒）
+STATS_PRINT_EVERY = 20  # 每完成多少个请求打印一次统计
+
+
+def estimate_tokens(messages, max_output_tokens=1000):
+    '''估算一次请求的token数：中文约一个字一个token，加上预留的输出长度'''
+    return sum(len(message.get("content", "")) for message in messages) + max_output_tokens
+
+
+def is_throttle_error(error):
+    '''服务商过载或限流：429、5xx（HTTPError 带响应）、读超时'''
+    if isinstance(error, (requests.exceptions.RetryError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in THROTTLE_STATUS
+
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst_seconds=10):
+        '''
+        :param rate_per_minute: 每分钟补充的令牌数，0 表示不限速
+        :param burst_seconds: 桶容量对应的秒数，限制空闲后的突发量
+        '''
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        '''
+        阻塞直到取得令牌（超过桶容量的请求按桶容量计）
+        :return: 等待的秒数
+        '''
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def drain(self):
+        '''收到限流响应时清空令牌，后续请求按补充速率重新开始'''
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = 0.0
+
+
+class AIMDLimiter:
+    def __init__(self, initial, min_limit, max_limit, latency_target, decrease_factor=0.5, cooldown=5.0):
+        '''
+        :param latency_target: 延迟低于该值（秒）的成功请求才增大并发上限
+        :param cooldown: 两次减小之间的最短间隔，同一波限流响应只减一次
+        '''
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.inflight = 0
+        self._last_decrease = float('-inf')
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.inflight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, latency=None, throttled=False):
+        with self._cond:
+            self.inflight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif latency is not None and latency <= self.latency_target:
+                # 每个“窗口”（约 limit 个请求）加 1
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute, tokens_per_minute, initial_concurrency, min_concurrency, max_concurrency,
+                 latency_target, max_retries=4, backoff=2.0):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.limiter = AIMDLimiter(initial_concurrency, min_concurrency, max_concurrency, latency_target)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.throttled = 0
+        self.errors = 0
+        self.retries = 0
+        self.rate_wait = 0.0
+        self.latency_total = 0.0
+        self._finished_at = deque()
+        print(f"[Info at llm_scheduler.py::__init__] LLMScheduler 初始化 rpm={requests_per_minute} tpm={tokens_per_minute} "
+              f"concurrency={initial_concurrency}({min_concurrency}-{max_concurrency})")
+
+    def _wait_for_rate(self, tokens):
+        waited = self.request_bucket.acquire(1) + self.token_bucket.acquire(tokens)
+        with self._lock:
+            self.rate_wait += waited
+
+    def _record(self, latency=None, throttled=False, error=False):
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+                return
+            if error:
+                self.errors += 1
+                return
+            self.completed += 1
+            self.latency_total += latency
+            now = time.monotonic()
+            self._finished_at.append(now)
+            while self._finished_at and self._finished_at[0] < now - THROUGHPUT_WINDOW:
+                self._finished_at.popleft()
+            should_print = self.completed % STATS_PRINT_EVERY == 0
+        if should_print:
+            print(f"[Info at llm_scheduler.py::call] {self.get_stats()}")
+
+    def call(self, func, tokens=1):
+        '''
+        在限速与并发上限内执行一次请求，被限流时退避重试
+        :param func: 无参数的请求函数
+        :param tokens: 估算的token数
+        '''
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate(tokens)
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = func()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self.limiter.release(throttled=throttled)
+                self._record(throttled=throttled, error=not throttled)
+                if not throttled or attempt == self.max_retries:
+                    raise
+                self.request_bucket.drain()
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
+            latency = time.monotonic() - start
+            self.limiter.release(latency=latency)
+            self._record(latency=latency)
+            return result
+
+    def get_stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "completed": self.completed,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "retries": self.retries,
+                "throughput_per_minute": sum(1 for t in self._finished_at if t >= now - THROUGHPUT_WINDOW),
+                "avg_latency": self.latency_total / self.completed if self.completed else 0.0,
+                "rate_wait_seconds": self.rate_wait,
+                "concurrency_limit": round(self.limiter.limit, 2),
+                "inflight": self.limiter.inflight,
+            }
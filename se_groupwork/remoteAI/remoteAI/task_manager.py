@@ -1,9 +1,17 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from django.db import transaction
+from django.conf import settings
+import time
 
 from remoteAI.remoteAI.article_ai_serializer import entry
+from remoteAI.remoteAI import job_queue
+from remoteAI.remoteAI.vectorize import batch_keywords_vectorize
 from webspider.models import Article
-from se_groupwork.global_tools import global_meili_tool_load
+from se_groupwork.global_tools import global_meili_tool_load, global_vecstore_tool_load
+
+# 摘要任务需要的文章字段，公众号名称随文章一次查询取出
+ARTICLE_INFO_FIELDS = ('id', 'title', 'content', 'publish_time', 'public_account__name')
+
 
 class ArticleDAO:
     @staticmethod
@@ -14,28 +22,43 @@ class ArticleDAO:
             queryset = queryset.filter(public_account__name__in=target_accounts_name)
         if max_article_num:
             queryset = queryset[:max_article_num]
-        print(f"计划处理文章{len(queryset)}篇:")
-        for article in queryset:
-            print(f"  - {article.id} | {article.title}")
-        return list(queryset.values_list('id', flat=True))
+        article_ids = list(queryset.values_list('id', flat=True))
+        print(f"计划处理文章{len(article_ids)}篇")
+        return article_ids
+
+    @staticmethod
+    def _article_info(article):
+        return {
+            "id": article.id,
+            "title": article.title,
+            "content": article.content,
+            "account": article.public_account.name,
+            "publish_time": article.publish_time.strftime("%Y-%m-%d %H"),
+        }
+
+    @staticmethod
+    def _info_queryset():
+        return Article.objects.select_related('public_account').only(*ARTICLE_INFO_FIELDS)
 
     @staticmethod
     def get_article_info(article_id):
         '''获取文章信息'''
         try:
-            article = Article.objects.get(id=article_id)
-            return {
-                "id": article.id,
-                "title": article.title,
-                "content": article.content,
-                "account": article.public_account.name,
-                "publish_time": article.publish_time.strftime("%Y-%m-%d %H"),
-            }
+            return ArticleDAO._article_info(ArticleDAO._info_queryset().get(id=article_id))
         except Article.DoesNotExist:
             # TODO: 日志
             print(f"文章{article_id}不存在")
             return None
 
+    @staticmethod
+    def iter_articles_info(article_ids, chunk_size = 100):
+        '''
+        批量读取文章信息（生成器），每 chunk_size 篇一次查询；不存在的文章直接跳过
+        '''
+        queryset = ArticleDAO._info_queryset().filter(id__in=list(article_ids)).order_by('-id')
+        for article in queryset.iterator(chunk_size=chunk_size):
+            yield ArticleDAO._article_info(article)
+
     
     @staticmethod
     def batch_update_articles_info(articles_info, batch_size = 10):
@@ -57,36 +80,96 @@ class ArticleDAO:
             with transaction.atomic():
                 for article_id, update_case in update_cases.items():
                     Article.objects.filter(id=article_id).update(**update_case)
+            # update() 不触发 post_save，需手动同步共享向量矩阵
+            vecstore = global_vecstore_tool_load()
+            vecstore.upsert_vectors([
+                (article_id, update_case["tags_vector"], update_case["semantic_vector"])
+                for article_id, update_case in update_cases.items()
+            ])
+
+
+class ResultSink:
+    '''
+    处理结果的小批量写回：攒够 flush_size 篇或距上次写回超过 flush_interval 秒时，
+    写入数据库、共享向量矩阵与搜索索引；处理线程仍在运行时结果就陆续可见，进程中断最多丢失一个小批次
+    '''
+    def __init__(self, flush_size = None, flush_interval = None, on_flush = None):
+        '''
+        :param on_flush: 写回成功后以文章id列表调用（标记任务完成）
+        '''
+        self.on_flush = on_flush
+        self.flush_size = flush_size or settings.SUMMARY_SINK_FLUSH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else settings.SUMMARY_SINK_FLUSH_INTERVAL
+        self.buffer = []
+        self.flushed = 0
+        self.last_flush = time.monotonic()
+
+    def add(self, article_info):
+        self.buffer.append(article_info)
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def time_until_due(self):
+        '''距离下次定时写回的秒数；缓冲为空时返回None（无需定时）'''
+        if not self.buffer:
+            return None
+        return max(0, self.last_flush + self.flush_interval - time.monotonic())
+
+    def flush_if_due(self):
+        if self.buffer and self.time_until_due() == 0:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            try:
+                # 关键词向量在写回时按批计算，整批未命中的关键词只向量化一次
+                pending = [article_info for article_info in self.buffer if "semantic_vector" not in article_info]
+                if pending:
+                    vectors = batch_keywords_vectorize([article_info["key_info"] for article_info in pending])
+                    for article_info, vector in zip(pending, vectors):
+                        article_info["semantic_vector"] = vector
+                ArticleDAO.batch_update_articles_info(self.buffer)
+                article_ids = [article_info["id"] for article_info in self.buffer]
+                global_meili_tool_load().update_batch_articles(article_ids)
+                if self.on_flush:
+                    self.on_flush(article_ids)
+                self.flushed += len(self.buffer)
+                print(f"[Info at task_manager.py::flush] 写回{len(self.buffer)}篇，累计{self.flushed}篇")
+                self.buffer = []
+            except Exception as e:
+                # 写回失败时保留缓冲，下次写回重试
+                print("[Error at task_manager.py::flush] 写回失败", e)
+        self.last_flush = time.monotonic()
 
 
 class TaskManager:
-    def __init__(self, max_workers = 50):
-        self.max_workers = max_workers
+    def __init__(self, max_workers = None, worker_id = None):
+        # 线程数只是上限，实际同时进行的大模型请求数由摘要调度器的 AIMD 并发上限控制
+        self.max_workers = max_workers or settings.SUMMARY_CONCURRENCY_MAX
+        self.worker_id = worker_id or job_queue.default_worker_id()
         self.target_accounts_name = None
         self.max_article_num = None
-        self.task_pool = []
         self.result = []
 
-    def update_task_pool(self):
-        self.task_pool = ArticleDAO.get_pending_article_ids(
-            self.target_accounts_name, 
-            self.max_article_num
-        )
-        return len(self.task_pool) > 0
-
-    def _process_article(self, article_info):
-        '''线程函数，处理单任务'''
+    def _process_article(self, article_info, vectorize_keywords = True, raise_errors = False):
+        '''
+        线程函数，处理单任务
+        :param vectorize_keywords: False 时关键词向量留给 ResultSink 批量计算
+        :param raise_errors: True 时直接抛出异常，由调用方把失败原因写入任务队列
+        '''
         if not article_info:
             return None
         article_id = article_info["id"]
         print(f"线程开始：{article_info['title']}")
         try:
-            resp = entry(article_info)
+            resp = entry(article_info, vectorize_keywords)
             if resp is None:
                 return None
             else:
                 return resp | {"id": article_id}
         except Exception as e:
+            if raise_errors:
+                raise
             # TODO: 日志
             print(f"线程出错：{article_info['title']} | {e}")
             return None
@@ -95,48 +178,80 @@ class TaskManager:
         '''测试用方法，指定任务id，不操作数据库'''
         self.result = []
         with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="remoteAIWorker") as executor:
+            # task_pool 可以包含重复id（压测用），每篇文章只读取一次
+            articles_info = {article_info["id"]: article_info for article_info in ArticleDAO.iter_articles_info(set(task_pool))}
             future_to_article = {
-                executor.submit(self._process_article, ArticleDAO.get_article_info(article_id)): article_id
+                executor.submit(self._process_article, articles_info.get(article_id)): article_id
                 for article_id in task_pool
             }
             for future in as_completed(future_to_article):
-                article_info = future_to_article[future]
+                article_id = future_to_article[future]
                 try:
                     article_info = future.result()
                     article_info and self.result.append(article_info) # 等价与if article_info: .....
                 except Exception:
                     # TODO: 日志
-                    print(f"线程出错：{article_info['title']}")
+                    print(f"线程出错：{article_id}")
         return self.result
 
+    def _claim(self, limit):
+        '''从任务队列领取文章（受 max_article_num 限制）'''
+        if self.max_article_num:
+            limit = min(limit, self.max_article_num - self.claimed)
+        article_ids = job_queue.claim(self.worker_id, min(limit, settings.SUMMARY_CLAIM_BATCH), self.target_accounts_name)
+        self.claimed += len(article_ids)
+        return article_ids
+
     def startrun(self, target_accounts_name = None, max_article_num = None):
+        '''
+        从任务队列领取并处理文章，可以有多个进程同时运行
+        在途任务少于线程数时继续领取，直到队列中没有可领取的任务
+        '''
         self.target_accounts_name = target_accounts_name
         self.max_article_num = max_article_num
-        self.update_task_pool()
-        if len(self.task_pool) == 0:
-            return False
-        self.result = []
+        self.claimed = 0
+        job_queue.enqueue_pending()
+        sink = ResultSink(on_flush=lambda article_ids: job_queue.complete(self.worker_id, article_ids))
+        lease_renew_interval = settings.SUMMARY_CLAIM_LEASE_SECONDS / 3
+        next_renew = time.monotonic() + lease_renew_interval
+        exhausted = False
         with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="remoteAIWorker") as executor:
-            future_to_article = {
-                executor.submit(self._process_article, ArticleDAO.get_article_info(article_id)): article_id
-                for article_id in self.task_pool
-            }
-            for future in as_completed(future_to_article):
-                article_id = future_to_article[future]
-                try:
-                    article_info = future.result()
+            future_to_article = {}
+            while True:
+                if not exhausted and len(future_to_article) < self.max_workers:
+                    # 在途任务不超过线程数：领取一批、一次查询读出文章后立即提交，线程池没有积压
+                    article_ids = self._claim(self.max_workers - len(future_to_article))
+                    exhausted = not article_ids
+                    for article_info in ArticleDAO.iter_articles_info(article_ids):
+                        future_to_article[executor.submit(self._process_article, article_info, False, True)] = article_info["id"]
+                if not future_to_article:
+                    break
+                # 每完成一篇就交给 sink，缓冲中有结果时最多等到定时写回的时间点
+                timeout = max(0, next_renew - time.monotonic())
+                sink_due = sink.time_until_due()
+                if sink_due is not None:
+                    timeout = min(timeout, sink_due)
+                done, _ = wait(future_to_article, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    article_id = future_to_article.pop(future)
+                    article_info = None
+                    error = "摘要失败"
+                    try:
+                        article_info = future.result()
+                    except Exception as e:
+                        error = str(e)
+                        print(f"线程出错：{article_id} | {e}")
                     if article_info:
-                        self.result.append(article_info)
-                except Exception:
-                    # TODO: 日志
-                    print(f"线程出错：{article_id}")
-        if self.result:
-            ArticleDAO.batch_update_articles_info(self.result)
-        meilitools = global_meili_tool_load()
-        meilitools.update_batch_articles([article_info["id"] for article_info in self.result])
-        self.result.clear()
-        self.task_pool.clear()
-        return True
+                        sink.add(article_info)
+                    else:
+                        job_queue.fail(self.worker_id, article_id, error)
+                sink.flush_if_due()
+                if time.monotonic() >= next_renew:
+                    # 处理时间较长时续租，避免任务被其他 worker 重新领取
+                    job_queue.renew(self.worker_id, list(future_to_article.values()) + [info["id"] for info in sink.buffer])
+                    next_renew = time.monotonic() + lease_renew_interval
+        sink.flush()
+        return self.claimed > 0
         
 # if __name__ == "__main__":
 #     # 实例用法
@@ -1,30 +1,171 @@
 from se_groupwork.global_tools import global_embedding_load
+from django.conf import settings
+from collections import OrderedDict
+import threading
+import unicodedata
 import numpy as np
 import json
 
+from remoteAI.models import KeywordVector
 from remoteAI.remoteAI.tags import TAGS
 
+# 关键词语义向量只保留嵌入的前100维
+KEYWORD_VECTOR_DIM = 100
+KEYWORD_MAX_LENGTH = KeywordVector._meta.get_field('keyword').max_length
 
-def vectorize(text):
-    embedding = global_embedding_load()
-    vector = embedding.embed_documents([text])
-    cuted_vector = vector[0:100]
-    return cuted_vector
 
+class KeywordVectorCache:
+    '''
+    关键词向量词典：进程内 LRU -> KeywordVector 表 -> 向量化模型
+    同一批关键词中未命中的部分只调用一次 embed_documents，结果写回表与 LRU
+    '''
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.lru_hits = 0
+        self.db_hits = 0
+        self.embedded = 0
+        self.embed_calls = 0
 
-def keywords_vectorize(keywords):
-    keywords_vectors = [vectorize(keyword) for keyword in keywords]
+    def _lru_get(self, keywords):
+        found = {}
+        with self._lock:
+            for keyword in keywords:
+                vector = self._lru.get(keyword)
+                if vector is not None:
+                    self._lru.move_to_end(keyword)
+                    found[keyword] = vector
+            self.lru_hits += len(found)
+        return found
+
+    def _lru_put(self, vectors):
+        with self._lock:
+            for keyword, vector in vectors.items():
+                self._lru[keyword] = vector
+                self._lru.move_to_end(keyword)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def _embed(self, keywords):
+        embedding = global_embedding_load()
+        vectors = embedding.embed_documents(keywords)
+        with self._lock:
+            self.embed_calls += 1
+            self.embedded += len(keywords)
+        return {
+            keyword: np.asarray(vector[0:KEYWORD_VECTOR_DIM], dtype=np.float32)
+            for keyword, vector in zip(keywords, vectors)
+        }
+
+    def get_many(self, keywords):
+        '''
+        :param keywords: 归一化后的关键词列表（可重复）
+        :return: {关键词: 向量}
+        '''
+        keywords = list(dict.fromkeys(keywords))
+        if not keywords:
+            return {}
+        found = self._lru_get(keywords)
+        misses = [keyword for keyword in keywords if keyword not in found]
+        if not misses:
+            return found
+        stored = {}
+        persistable = [keyword for keyword in misses if len(keyword) <= KEYWORD_MAX_LENGTH]
+        try:
+            stored = {
+                row.keyword: row.vector
+                for row in KeywordVector.objects.filter(keyword__in=persistable)
+                if len(row.vector) == KEYWORD_VECTOR_DIM
+            }
+        except Exception as e:
+            print("[Error at vectorize.py::get_many] 读取关键词向量失败", e)
+        with self._lock:
+            self.db_hits += len(stored)
+        misses = [keyword for keyword in misses if keyword not in stored]
+        embedded = self._embed(misses) if misses else {}
+        if embedded:
+            try:
+                # 并发的 worker 可能同时写入同一关键词，以先写入的为准
+                KeywordVector.objects.bulk_create(
+                    [KeywordVector(keyword=keyword, vector=vector)
+                     for keyword, vector in embedded.items() if len(keyword) <= KEYWORD_MAX_LENGTH],
+                    ignore_conflicts=True
+                )
+            except Exception as e:
+                print("[Error at vectorize.py::get_many] 写入关键词向量失败", e)
+        self._lru_put(stored | embedded)
+        return found | stored | embedded
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "lru_size": len(self._lru),
+                "lru_hits": self.lru_hits,
+                "db_hits": self.db_hits,
+                "embedded": self.embedded,
+                "embed_calls": self.embed_calls,
+            }
+
+
+keyword_vector_cache = KeywordVectorCache(settings.KEYWORD_VECTOR_LRU_SIZE)
+
+
+def normalize_keyword(keyword):
+    '''
+    关键词归一化（NFKC 全角转半角 + casefold）后再查询与存储：
+    MySQL 默认排序规则比较时不区分大小写与全半角，不归一化时“Python”与“python”会命中同一行却对不上键
+    '''
+    return unicodedata.normalize('NFKC', str(keyword)).casefold().strip()
+
+
+def _normalize_keywords(keywords):
+    keywords = [normalize_keyword(keyword) for keyword in keywords]
+    return [keyword for keyword in keywords if keyword]
+
+
+def _mean_vector(keywords_vectors):
+    if not keywords_vectors:
+        return np.zeros(0, dtype=np.float32)
     article_vector = np.mean(keywords_vectors, axis=0)
     norm = np.linalg.norm(article_vector)
     if norm != 0:
         article_vector = article_vector / norm
-    return article_vector.tolist()
+    return article_vector.astype(np.float32, copy=False)
+
+
+def vectorize(text):
+    text = normalize_keyword(text)
+    if not text:
+        return np.zeros(KEYWORD_VECTOR_DIM, dtype=np.float32)
+    return keyword_vector_cache.get_many([text])[text]
+
+
+def keywords_vectorize(keywords):
+    keywords = _normalize_keywords(keywords)
+    vectors = keyword_vector_cache.get_many(keywords)
+    return _mean_vector([vectors[keyword] for keyword in keywords])
+
+
+def batch_keywords_vectorize(keywords_list):
+    '''
+    一批文章的关键词向量：所有文章未命中的关键词合并为一次向量化
+    :param keywords_list: 每篇文章的关键词列表
+    :return: 与输入顺序一致的文章向量列表
+    '''
+    keywords_list = [_normalize_keywords(keywords) for keywords in keywords_list]
+    vectors = keyword_vector_cache.get_many([keyword for keywords in keywords_list for keyword in keywords])
+    return [_mean_vector([vectors[keyword] for keyword in keywords]) for keywords in keywords_list]
 
 
 def tags_vectorize(tags):
-    tags_vector = np.zeros(len(TAGS))
+    tags_vector = np.zeros(len(TAGS), dtype=np.float32)
     for tag in tags:
         if tag in TAGS:
             rank = TAGS.index(tag)
             tags_vector[rank] = 1
-    return tags_vector.tolist()
\ No newline at end of file
+    return tags_vector
@@ -1,6 +1,28 @@
 from django.test import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from se_groupwork.llm_client import LLMClient
+from remoteAI.remoteAI.llm_scheduler import TokenBucket, AIMDLimiter, LLMScheduler, is_throttle_error, retry_after_seconds
+import requests
+import time
+import tempfile
+import threading
 import json
-from remoteAI.remoteAI.task_manager import TaskManager
+import os
+from remoteAI.remoteAI.task_manager import TaskManager, ResultSink, ArticleDAO
+from remoteAI.remoteAI.tags import TAGS
+from remoteAI.remoteAI import job_queue
+from remoteAI.models import ArticleProcessingState
+from django.test import override_settings
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from remoteAI.remoteAI.vectorize import KEYWORD_VECTOR_DIM, KeywordVectorCache
+from remoteAI.remoteAI import vectorize
+from remoteAI.models import KeywordVector
+from unittest import mock
+from django.core.management import call_command
+from io import StringIO
+import numpy as np
 from webspider.models import Article, PublicAccount
 
 # Create your tests here.
@@ -28,3 +50,266 @@ class RemoteAITestCase(TestCase):
         tm = TaskManager()
         result = tm.startrun()
         self.assertTrue(result)
+
+    def test_bulk_article_info(self):
+        article_ids = list(Article.objects.values_list('id', flat=True))
+        # 文章与公众号一次查询取出
+        with self.assertNumQueries(1):
+            infos = list(ArticleDAO.iter_articles_info(article_ids + [0]))
+        self.assertEqual(sorted(info["id"] for info in infos), sorted(article_ids))
+        self.assertEqual(infos[0], ArticleDAO.get_article_info(infos[0]["id"]))
+        self.assertIsNone(ArticleDAO.get_article_info(0))
+        self.assertEqual(len(ArticleDAO.get_pending_article_ids(max_article_num=2)), 2)
+
+    def test_result_sink(self):
+        def result(article):
+            return {
+                "id": article.id, "summary": f"{article.title}的摘要", "tags": ["活动"], "key_info": ["活动"],
+                "tags_vector": np.ones(len(TAGS), dtype=np.float32), "semantic_vector": np.ones(KEYWORD_VECTOR_DIM, dtype=np.float32),
+                "relevant_time": []
+            }
+        articles = list(Article.objects.order_by('id')[:3])
+        sink = ResultSink(flush_size=2, flush_interval=60)
+        sink.add(result(articles[0]))
+        self.assertIsNotNone(sink.time_until_due())
+        self.assertEqual(Article.objects.exclude(summary="").count(), 0)
+        # 攒够篇数立即写回，不等全部处理完
+        sink.add(result(articles[1]))
+        self.assertEqual(set(Article.objects.exclude(summary="").values_list('id', flat=True)), {articles[0].id, articles[1].id})
+        self.assertIsNone(sink.time_until_due())
+        # 超过间隔后写回剩余结果
+        sink.flush_interval = 0
+        sink.add(result(articles[2]))
+        sink.flush_if_due()
+        self.assertEqual(sink.flushed, 3)
+        self.assertEqual(Article.objects.get(id=articles[2].id).summary, f"{articles[2].title}的摘要")
+
+    def test_keyword_vector_cache(self):
+        class CountingEmbedding:
+            def __init__(self):
+                self.calls = []
+
+            def embed_documents(self, texts):
+                self.calls.append(list(texts))
+                return [[float(len(text))] * (KEYWORD_VECTOR_DIM + 10) for text in texts]
+
+        embedding = CountingEmbedding()
+        cache = KeywordVectorCache(max_size=2)
+        with mock.patch.object(vectorize, 'global_embedding_load', return_value=embedding), \
+                mock.patch.object(vectorize, 'keyword_vector_cache', cache):
+            # 一批文章中未命中的关键词合并为一次向量化，向量截断到 KEYWORD_VECTOR_DIM 维
+            vectors = vectorize.batch_keywords_vectorize([["讲座", "奖学金"], ["讲座", "招聘会 "], []])
+            self.assertEqual(embedding.calls, [["讲座", "奖学金", "招聘会"]])
+            self.assertEqual(vectors[0].shape, (KEYWORD_VECTOR_DIM,))
+            self.assertAlmostEqual(float(np.linalg.norm(vectors[1])), 1.0, places=5)
+            self.assertEqual(len(vectors[2]), 0)
+            self.assertEqual(KeywordVector.objects.count(), 3)
+            # LRU 或数据库命中时不再调用模型
+            vectorize.keywords_vectorize(["讲座", "奖学金", "招聘会"])
+            self.assertEqual(len(embedding.calls), 1)
+            self.assertEqual(cache.get_stats()["db_hits"], 1)
+            # 新进程（空 LRU）从数据库读取
+            cache.clear()
+            self.assertEqual(vectorize.vectorize("奖学金").shape, (KEYWORD_VECTOR_DIM,))
+            self.assertEqual(len(embedding.calls), 1)
+            vectorize.keywords_vectorize(["讲座", "宿舍"])
+            self.assertEqual(embedding.calls[-1], ["宿舍"])
+            # 只有大小写或全半角不同的关键词共用一条记录
+            vectorize.keywords_vectorize(["Python", "ＡＩ"])
+            cache.clear()
+            vectorize.keywords_vectorize(["python", "AI", "ai"])
+            self.assertEqual(embedding.calls[-1], ["python", "ai"])
+            self.assertEqual(set(KeywordVector.objects.filter(keyword__in=["python", "ai"]).values_list('keyword', flat=True)), {"python", "ai"})
+
+    def test_backfill_keyword_vectors(self):
+        class FakeEmbedding:
+            def embed_documents(self, texts):
+                return [[1.0] * 768 for _ in texts]
+
+        legacy, current = Article.objects.order_by('id')[:2]
+        Article.objects.filter(id=legacy.id).update(summary="摘要", key_info="['讲座', '奖学金']", semantic_vector=np.ones(768, dtype=np.float32))
+        Article.objects.filter(id=current.id).update(summary="摘要", key_info="['讲座']", semantic_vector=np.zeros(KEYWORD_VECTOR_DIM, dtype=np.float32))
+        with mock.patch.object(vectorize, 'global_embedding_load', return_value=FakeEmbedding()), \
+                mock.patch.object(vectorize, 'keyword_vector_cache', KeywordVectorCache(max_size=10)):
+            call_command('backfill_keyword_vectors', stdout=StringIO())
+        self.assertEqual(len(Article.objects.get(id=legacy.id).semantic_vector), KEYWORD_VECTOR_DIM)
+        self.assertAlmostEqual(float(np.linalg.norm(Article.objects.get(id=legacy.id).semantic_vector)), 1.0, places=5)
+        # 维度已正确的文章不重新计算
+        self.assertEqual(float(np.abs(Article.objects.get(id=current.id).semantic_vector).sum()), 0.0)
+
+    def test_job_queue(self):
+        self.assertEqual(job_queue.enqueue_pending(), Article.objects.count())
+        self.assertEqual(job_queue.enqueue_pending(), 0)
+        total = Article.objects.count()
+        # 两个 worker 领取的任务互不重叠
+        first = job_queue.claim("worker-a", 2)
+        second = job_queue.claim("worker-b", total)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(set(first) & set(second), set())
+        self.assertEqual(len(first) + len(second), total)
+        self.assertEqual(job_queue.claim("worker-c", total), [])
+        # 只有持有者能完成任务
+        self.assertEqual(job_queue.complete("worker-b", first), 0)
+        self.assertEqual(job_queue.complete("worker-a", first[:1]), 1)
+        # 失败后退避，退避期间不可领取
+        self.assertEqual(job_queue.fail("worker-a", first[1], "boom"), ArticleProcessingState.STATUS_PENDING)
+        state = ArticleProcessingState.objects.get(article_id=first[1])
+        self.assertGreater(state.next_retry_at, timezone.now())
+        self.assertEqual(job_queue.claim("worker-c", total), [])
+        # 租约过期的任务可以被其他 worker 领取，原持有者无法再完成
+        ArticleProcessingState.objects.filter(article_id=second[0]).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(job_queue.claim("worker-c", total), [second[0]])
+        self.assertEqual(job_queue.complete("worker-b", [second[0]]), 0)
+        # 达到次数上限后标记 failed
+        with override_settings(SUMMARY_MAX_ATTEMPTS=2):
+            ArticleProcessingState.objects.filter(article_id=first[1]).update(next_retry_at=timezone.now())
+            self.assertEqual(job_queue.claim("worker-c", total), [first[1]])
+            self.assertEqual(job_queue.fail("worker-c", first[1]), ArticleProcessingState.STATUS_FAILED)
+        self.assertEqual(job_queue.retry_delay(30), settings.SUMMARY_RETRY_BACKOFF_MAX)
+
+    def test_startrun_records_failure_reason(self):
+        with mock.patch('remoteAI.remoteAI.task_manager.entry', side_effect=RuntimeError("大模型返回格式错误")):
+            TaskManager(max_workers=2, worker_id="worker-a").startrun(max_article_num=1)
+        # 只领取了一篇，失败原因写入任务状态
+        state = ArticleProcessingState.objects.get(attempts=1)
+        self.assertEqual(state.status, ArticleProcessingState.STATUS_PENDING)
+        self.assertEqual(state.last_error, "大模型返回格式错误")
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 保持长连接
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if data["stream"]:
+            lines = [
+                "data: " + json.dumps({"choices": [{"delta": {"content": text}}]}, ensure_ascii=False)
+                for text in ("你好", "，同学")
+            ] + ["data: [DONE]"]
+            body = ("\n\n".join(lines) + "\n\n").encode('utf-8')
+        else:
+            body = json.dumps({"choices": [{"message": {"content": " 摘要 "}}]}, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LLMClientTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeLLMHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        config = tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False)
+        config.write(f"[deepseek]\nurl = http://127.0.0.1:{self.server.server_port}/v1/chat/completions\nkey = x\nmodel = m\nread_timeout = 5\n")
+        config.close()
+        self.config_path = config.name
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.config_path)
+
+    def test_connection_reuse_and_metrics(self):
+        client = LLMClient(self.config_path, pool_size=4)
+        self.assertEqual(client.read_timeout, 5)
+        messages = [{"role": "user", "content": "你好"}]
+        for _ in range(5):
+            self.assertEqual(client.chat(messages), "摘要")
+        self.assertEqual("".join(client.stream_chat(messages)), "你好，同学")
+        stats = client.get_stats()
+        self.assertEqual(stats["requests"], 6)
+        self.assertEqual(stats["errors"], 0)
+        # 顺序请求只建立一个连接
+        self.assertEqual(stats["connections"], 1)
+        self.assertGreater(stats["connection_reuse_rate"], 0.8)
+        self.assertGreater(stats["latency"]["p95"], 0)
+
+
+class ThrottlingLLMHandler(FakeLLMHandler):
+    '''按 server.statuses 依次返回限流/过载响应，之后正常返回摘要'''
+
+    def do_POST(self):
+        if not self.server.statuses:
+            return super().do_POST()
+        status, retry_after = self.server.statuses.pop(0)
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = b'{"error": "busy"}'
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LLMSchedulerTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingLLMHandler)
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        config = tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False)
+        config.write(f"[deepseek]\nurl = http://127.0.0.1:{self.server.server_port}/v1/chat/completions\nkey = x\nmodel = m\nread_timeout = 5\n")
+        config.close()
+        self.config_path = config.name
+        # 与 remoteAI 客户端一致：HTTP 层不重试，限流交给调度器
+        self.client = LLMClient(self.config_path, pool_size=4, retries=0)
+        self.messages = [{"role": "user", "content": "你好"}]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.config_path)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(600, burst_seconds=0.1)  # 每秒10个，容量1
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        self.assertGreater(time.monotonic() - start, 0.25)
+        # 不限速
+        self.assertEqual(TokenBucket(0).acquire(100), 0.0)
+
+    def test_aimd_limiter(self):
+        limiter = AIMDLimiter(initial=4, min_limit=1, max_limit=6, latency_target=1.0, cooldown=10)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+        self.assertEqual(limiter.limit, 6)
+        # 同一波限流只减一次
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 3)
+        # 延迟过高时不增加
+        limiter.acquire()
+        limiter.release(latency=5.0)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_throttle_error_carries_response(self):
+        self.server.statuses = [(429, 7)]
+        with self.assertRaises(requests.HTTPError) as context:
+            self.client.chat(self.messages)
+        self.assertTrue(is_throttle_error(context.exception))
+        self.assertEqual(retry_after_seconds(context.exception), 7)
+
+    def test_scheduler_retries_throttled_requests(self):
+        scheduler = LLMScheduler(0, 0, initial_concurrency=2, min_concurrency=1, max_concurrency=4,
+                                 latency_target=0, max_retries=2, backoff=0.01)
+        self.server.statuses = [(429, 0), (503, None)]
+        self.assertEqual(scheduler.call(lambda: self.client.chat(self.messages)), "摘要")
+        stats = scheduler.get_stats()
+        self.assertEqual((stats["completed"], stats["throttled"], stats["retries"]), (1, 2, 2))
+        self.assertEqual(stats["throughput_per_minute"], 1)
+        # 两次限流在冷却时间内只减半一次
+        self.assertEqual(stats["concurrency_limit"], 1)
+        # 非限流错误不重试
+        self.server.statuses = [(400, None), (400, None)]
+        with self.assertRaises(requests.HTTPError):
+            scheduler.call(lambda: self.client.chat(self.messages))
+        self.assertEqual(self.server.statuses, [(400, None)])
+        self.assertEqual(scheduler.get_stats()["errors"], 1)
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 """
-Simple scheduler that runs two management commands every day at 00:00 and 12:00
+Simple scheduler that runs management commands every day at 00:00 and 12:00
 in the specified timezone. It calls Django management commands in sequence:
   1) webspider's `update_public_accounts`
   2) remoteAI's `process_articles`
+  3) askAI's `sqlvec_drain_outbox` (batch-index the articles queued by the crawler right away;
+     edits from the web/admin are picked up by the `indexer` compose service in between)
 
 Configure timezone with environment variable `SCHEDULER_TZ` (default: Asia/Shanghai).
 """
@@ -31,6 +33,7 @@ except Exception:
 COMMANDS = [
     [sys.executable, 'manage.py', 'update_public_accounts'],
     [sys.executable, 'manage.py', 'process_articles'],
+    [sys.executable, 'manage.py', 'sqlvec_drain_outbox'],
 ]
 
 
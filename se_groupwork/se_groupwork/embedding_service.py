@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import queue
+import base64
+import socket
+import threading
+import http.client
+import socketserver
+from urllib.parse import urlparse
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+'''
+独立的本地向量化服务
+- 服务端：一个进程加载模型，通过 localhost HTTP 或 Unix socket 对外提供 /embed，
+  所有客户端的请求进入同一个队列，由一个后台线程凑批后统一向量化
+- 客户端：RemoteEmbeddings，与 HuggingFaceEmbeddings 相同的 embed_documents / embed_query 接口，
+  settings.EMBEDDING_BACKEND = 'remote' 时由 global_embedding_load 返回
+向量以 float32 二进制 + base64 传输：{"shape": [n, dim], "data": "..."}
+'''
+
+
+def encode_vectors(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return {"shape": list(vectors.shape), "data": base64.b64encode(vectors.tobytes()).decode('ascii')}
+
+
+def decode_vectors(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+
+
+class BatchingEmbedder:
+    '''把多个客户端的请求合并成批次交给模型'''
+
+    def __init__(self, embedding, batch_wait_ms, max_batch_size):
+        self.embedding = embedding
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.batch_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch):
+        texts = [text for item_texts, _ in batch for text in item_texts]
+        try:
+            vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.batches += 1
+            self.texts += len(texts)
+        start = 0
+        for item_texts, future in batch:
+            future.set_result(vectors[start:start + len(item_texts)])
+            start += len(item_texts)
+
+    def embed(self, texts, timeout=120):
+        with self._lock:
+            self.requests += 1
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future.result(timeout=timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts": self.texts,
+                "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            }
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 客户端保持长连接
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", **self.server.batcher.get_stats()})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/embed":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            texts = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))["texts"]
+            vectors = self.server.batcher.embed(texts)
+            self._send_json(200, encode_vectors(vectors))
+        except Exception as e:
+            print("[Error at embedding_service.py::do_POST] 向量化失败", e)
+            self._send_json(500, {"error": str(e)})
+
+    def address_string(self):
+        # Unix socket 的 client_address 为空字符串
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o660)
+
+
+def create_server(embedding, url, batch_wait_ms=5, max_batch_size=64):
+    '''
+    :param url: http://host:port 或 unix:///path/to.sock
+    '''
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        server = ThreadingUnixHTTPServer(parsed.path, EmbeddingRequestHandler)
+    else:
+        server = ThreadingHTTPServer((parsed.hostname or "127.0.0.1", parsed.port or 8100), EmbeddingRequestHandler)
+        server.daemon_threads = True
+    server.batcher = BatchingEmbedder(embedding, batch_wait_ms, max_batch_size)
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RemoteEmbeddings:
+    '''向量化服务客户端，接口与 HuggingFaceEmbeddings 一致；每个线程复用一个长连接'''
+
+    def __init__(self, url, timeout=120, max_request_size=256):
+        self.url = url
+        self.timeout = timeout
+        self.max_request_size = max_request_size
+        self._parsed = urlparse(url)
+        self._local = threading.local()
+        print("[Info at embedding_service.py::__init__] 使用向量化服务", url)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._parsed.scheme == "unix":
+                conn = UnixHTTPConnection(self._parsed.path, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self._parsed.hostname, self._parsed.port or 8100, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, texts):
+        body = json.dumps({"texts": texts}).encode('utf-8')
+        # 长连接可能已被服务端关闭，重试一次
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", "/embed", body=body, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                data = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt == 1:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"向量化服务错误: {data.get('error')}")
+        return decode_vectors(data)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        parts = [self._request(texts[i:i + self.max_request_size]) for i in range(0, len(texts), self.max_request_size)]
+        return np.concatenate(parts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
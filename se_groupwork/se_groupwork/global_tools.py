@@ -1,10 +1,17 @@
 import sys
+import threading
 from langchain_huggingface import HuggingFaceEmbeddings
 from django.conf import settings
 
 G_EMBEDDING = None
 G_SQLVECTOOL = None
 G_MEILITOOL = None
+G_FTSTOOL = None
+G_VECSTORETOOL = None
+G_PREFERENCEBUFFER = None
+G_LLMCLIENTS = {}
+G_LLMCLIENTS_LOCK = threading.Lock()
+G_SUMMARYSCHEDULER = None
 
 def is_test_mode():
     if "test" in sys.argv:
@@ -13,15 +20,38 @@ def is_test_mode():
         return True
     return False
 
-def global_embedding_load():
-    global G_EMBEDDING
-    if G_EMBEDDING is not None:
-        return G_EMBEDDING
-    G_EMBEDDING = HuggingFaceEmbeddings(
+def load_local_embedding(backend='huggingface'):
+    """
+    在当前进程加载向量化模型（向量化服务进程也使用这里）
+    :param backend: 'huggingface'（PyTorch）或 'onnx'（ONNX Runtime，默认 int8 量化模型）
+    """
+    if backend == 'onnx':
+        from se_groupwork.onnx_embedding import OnnxEmbeddings
+        return OnnxEmbeddings(
+            settings.EMBEDDING_ONNX_DIR,
+            quantized=settings.EMBEDDING_ONNX_QUANTIZED,
+            intra_op_threads=settings.EMBEDDING_ONNX_THREADS
+        )
+    return HuggingFaceEmbeddings(
         model_name=settings.EMBEDDING_MODEL_PATH,
         model_kwargs={"device": "cpu"},
         encode_kwargs={"normalize_embeddings": True}
     )
+
+
+def global_embedding_load():
+    """
+    向量化模型：settings.EMBEDDING_BACKEND 为 'remote' 时连接独立的向量化服务，不在本进程加载模型；
+    'onnx' 时使用 ONNX Runtime 推理
+    """
+    global G_EMBEDDING
+    if G_EMBEDDING is not None:
+        return G_EMBEDDING
+    if settings.EMBEDDING_BACKEND == 'remote':
+        from se_groupwork.embedding_service import RemoteEmbeddings
+        G_EMBEDDING = RemoteEmbeddings(settings.EMBEDDING_SERVER_URL)
+    else:
+        G_EMBEDDING = load_local_embedding(settings.EMBEDDING_BACKEND)
     return G_EMBEDDING
 
 
@@ -35,9 +65,87 @@ def global_sqlvec_tool_load():
 
 
 def global_meili_tool_load():
+    """
+    全文搜索工具：按 settings.SEARCH_BACKENDS 组合的搜索后端（默认 Meilisearch 优先，SQLite FTS5 兜底）
+    """
     from article_selector.meilisearch.meili_tools import MeilisearchTool
+    from article_selector.search_backend import SearchBackendChain
     global G_MEILITOOL
     if G_MEILITOOL is not None:
         return G_MEILITOOL
-    G_MEILITOOL = MeilisearchTool(test_mode=is_test_mode())
-    return G_MEILITOOL
\ No newline at end of file
+    backends = []
+    for name in getattr(settings, "SEARCH_BACKENDS", ["meilisearch"]):
+        if name == "meilisearch":
+            backends.append(MeilisearchTool(test_mode=is_test_mode()))
+        elif name == "sqlite_fts":
+            backends.append(global_fts_tool_load())
+    G_MEILITOOL = SearchBackendChain(backends, test_mode=is_test_mode())
+    return G_MEILITOOL
+
+
+def global_fts_tool_load():
+    from article_selector.fts.fts_tool import SqliteFtsTool
+    global G_FTSTOOL
+    if G_FTSTOOL is not None:
+        return G_FTSTOOL
+    G_FTSTOOL = SqliteFtsTool(test_mode=is_test_mode())
+    return G_FTSTOOL
+
+
+def global_vecstore_tool_load():
+    from article_selector.vecstore.vecstore_tool import ArticleVectorStore
+    global G_VECSTORETOOL
+    if G_VECSTORETOOL is not None:
+        return G_VECSTORETOOL
+    G_VECSTORETOOL = ArticleVectorStore(test_mode=is_test_mode())
+    return G_VECSTORETOOL
+
+
+def global_preference_buffer_load():
+    from article_selector.preference_buffer import PreferenceUpdateBuffer
+    global G_PREFERENCEBUFFER
+    if G_PREFERENCEBUFFER is not None:
+        return G_PREFERENCEBUFFER
+    G_PREFERENCEBUFFER = PreferenceUpdateBuffer()
+    return G_PREFERENCEBUFFER
+
+
+def global_llm_client_load(name):
+    """
+    大模型客户端：按 settings.LLM_CLIENTS 中的配置名（askAI / remoteAI）各创建一个
+    """
+    from se_groupwork.llm_client import LLMClient
+    client = G_LLMCLIENTS.get(name)
+    if client is not None:
+        return client
+    # remoteAI 的多个处理线程可能同时首次调用
+    with G_LLMCLIENTS_LOCK:
+        if name not in G_LLMCLIENTS:
+            config = settings.LLM_CLIENTS[name]
+            G_LLMCLIENTS[name] = LLMClient(
+                config["config_path"], provider=config["provider"], pool_size=config["pool_size"], retries=config.get("retries", 2)
+            )
+        return G_LLMCLIENTS[name]
+
+
+def global_summary_scheduler_load():
+    """
+    摘要任务的大模型请求调度器（令牌桶限速 + AIMD 自适应并发），进程内所有处理线程共用
+    """
+    from remoteAI.remoteAI.llm_scheduler import LLMScheduler
+    global G_SUMMARYSCHEDULER
+    if G_SUMMARYSCHEDULER is not None:
+        return G_SUMMARYSCHEDULER
+    with G_LLMCLIENTS_LOCK:
+        if G_SUMMARYSCHEDULER is None:
+            G_SUMMARYSCHEDULER = LLMScheduler(
+                requests_per_minute=settings.SUMMARY_RATE_LIMIT_RPM,
+                tokens_per_minute=settings.SUMMARY_RATE_LIMIT_TPM,
+                initial_concurrency=settings.SUMMARY_CONCURRENCY_INITIAL,
+                min_concurrency=settings.SUMMARY_CONCURRENCY_MIN,
+                max_concurrency=settings.SUMMARY_CONCURRENCY_MAX,
+                latency_target=settings.SUMMARY_LATENCY_TARGET,
+                max_retries=settings.SUMMARY_THROTTLE_RETRIES,
+                backoff=settings.SUMMARY_THROTTLE_BACKOFF
+            )
+        return G_SUMMARYSCHEDULER
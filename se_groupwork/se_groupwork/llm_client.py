@@ -0,0 +1,237 @@
+import json
+import time
+import asyncio
+import weakref
+import threading
+import configparser as confp
+from collections import deque
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+'''
+askAI 与 remoteAI 共用的大模型 HTTP 客户端
+- 每个配置（.ini + provider 段）一个进程内单例，配置只在创建时读取一次
+- requests.Session + 连接池长连接复用，连接池大小与并发线程数一致，避免每次请求重新握手
+- 可在 .ini 中按 provider 配置超时与重试：
+    connect_timeout / read_timeout / stream_read_timeout / retries / backoff_factor / pool_size / temperature
+- 统计连接复用率、首字延迟（TTFT）与总耗时
+'''
+
+RETRY_STATUS = [429, 500, 502, 503, 504]
+LATENCY_WINDOW = 500  # 延迟分位数统计的最近样本数
+
+
+class LLMMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.sync_requests = 0
+        self.errors = 0
+        self.ttft = deque(maxlen=LATENCY_WINDOW)
+        self.latency = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, ttft, latency, error=False, sync=True):
+        with self._lock:
+            self.requests += 1
+            self.sync_requests += int(sync)
+            if error:
+                self.errors += 1
+                return
+            if ttft is not None:
+                self.ttft.append(ttft)
+            self.latency.append(latency)
+
+    @staticmethod
+    def _percentiles(samples):
+        if not samples:
+            return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg": sum(ordered) / len(ordered),
+            "p50": ordered[len(ordered) // 2],
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "sync_requests": self.sync_requests,
+                "errors": self.errors,
+                "ttft": self._percentiles(self.ttft),
+                "latency": self._percentiles(self.latency),
+            }
+
+
+class LLMClient:
+    def __init__(self, config_path, provider="deepseek", pool_size=10, retries=2):
+        cfg = confp.ConfigParser()
+        cfg.read(config_path)
+        self.provider = provider
+        self.url = cfg.get(provider, "url")
+        self.key = cfg.get(provider, "key")
+        self.model = cfg.get(provider, "model")
+        self.temperature = cfg.getfloat(provider, "temperature", fallback=0.7)
+        self.connect_timeout = cfg.getfloat(provider, "connect_timeout", fallback=10)
+        self.read_timeout = cfg.getfloat(provider, "read_timeout", fallback=100)
+        self.stream_read_timeout = cfg.getfloat(provider, "stream_read_timeout", fallback=300)
+        self.retries = cfg.getint(provider, "retries", fallback=retries)
+        self.backoff_factor = cfg.getfloat(provider, "backoff_factor", fallback=1)
+        self.pool_size = cfg.getint(provider, "pool_size", fallback=pool_size)
+        self.metrics = LLMMetrics()
+        self.session = self._create_session()
+        self._async_clients = weakref.WeakKeyDictionary()  # 事件循环 -> httpx.AsyncClient
+        print(f"[Info at llm_client.py::__init__] LLMClient 初始化 {config_path} [{provider}] pool_size={self.pool_size}")
+
+    def _create_session(self):
+        session = requests.Session()
+        retry_strategy = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=["POST"],
+            # 重试用尽（或不重试）时返回最后的响应，由 raise_for_status 抛出带响应的 HTTPError，
+            # 调用方才能读取状态码与 Retry-After
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry_strategy)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Content-Type": "application/json",
+            "authorization": f"Bearer {self.key}"
+        })
+        return session
+
+    def _payload(self, messages, stream):
+        return {"model": self.model, "temperature": self.temperature, "stream": stream, "messages": messages}
+
+    def _connection_counts(self):
+        '''连接池累计新建的连接数'''
+        adapter = self.session.get_adapter(self.url)
+        pools = adapter.poolmanager.pools
+        return sum(pools[pool_key].num_connections for pool_key in pools.keys())
+
+    @staticmethod
+    def parse_stream_line(line):
+        '''
+        解析一行SSE数据
+        :return: (是否结束, 内容)
+        '''
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if line.startswith('data: '):
+            line = line[6:]
+        if line == "[DONE]" or line == "":
+            return True, ""
+        try:
+            chunk = json.loads(line)
+            return False, chunk.get("choices", [{}])[0].get("delta", {}).get("content", "") or ""
+        except json.JSONDecodeError:
+            # 忽略解析失败的行（如心跳包/非标准格式）
+            return False, ""
+
+    def chat(self, messages):
+        '''
+        非流式请求，返回回答文本；出错时抛出异常
+        '''
+        start = time.time()
+        try:
+            response = self.session.post(
+                url=self.url,
+                json=self._payload(messages, False),
+                timeout=(self.connect_timeout, self.read_timeout)
+            )
+            response.raise_for_status()
+            result = response.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+        except Exception:
+            self.metrics.record(None, time.time() - start, error=True)
+            raise
+        latency = time.time() - start
+        self.metrics.record(latency, latency)
+        return result
+
+    def stream_chat(self, messages):
+        '''
+        流式请求（生成器），逐段返回回答内容；出错时抛出异常
+        '''
+        start = time.time()
+        ttft = None
+        try:
+            with self.session.post(
+                url=self.url,
+                json=self._payload(messages, True),
+                timeout=(self.connect_timeout, self.stream_read_timeout),
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(chunk_size=1024):
+                    if not line:
+                        continue
+                    done, content = self.parse_stream_line(line)
+                    if done:
+                        break
+                    if content:
+                        if ttft is None:
+                            ttft = time.time() - start
+                        yield content
+        except GeneratorExit:
+            # 调用方提前结束（客户端断开），不计入错误
+            self.metrics.record(ttft, time.time() - start)
+            raise
+        except Exception:
+            self.metrics.record(ttft, time.time() - start, error=True)
+            raise
+        self.metrics.record(ttft, time.time() - start)
+
+    def _get_async_client(self):
+        # httpx 异步客户端与事件循环绑定，每个事件循环复用一个连接池
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.stream_read_timeout, connect=self.connect_timeout),
+                transport=httpx.AsyncHTTPTransport(retries=self.retries),
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.pool_size),
+                headers=dict(self.session.headers)
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def astream_chat(self, messages):
+        '''
+        异步流式请求（异步生成器），供ASGI视图使用；被取消时连接随之关闭
+        '''
+        start = time.time()
+        ttft = None
+        try:
+            async with self._get_async_client().stream("POST", self.url, json=self._payload(messages, True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    done, content = self.parse_stream_line(line)
+                    if done:
+                        break
+                    if content:
+                        if ttft is None:
+                            ttft = time.time() - start
+                        yield content
+        except (asyncio.CancelledError, GeneratorExit):
+            self.metrics.record(ttft, time.time() - start, sync=False)
+            raise
+        except Exception:
+            self.metrics.record(ttft, time.time() - start, error=True, sync=False)
+            raise
+        self.metrics.record(ttft, time.time() - start, sync=False)
+
+    def get_stats(self):
+        stats = self.metrics.get_stats()
+        connections = self._connection_counts()
+        stats["connections"] = connections
+        # 同步请求中复用已有连接的比例（不含异步流）
+        stats["connection_reuse_rate"] = max(0.0, 1 - connections / stats["sync_requests"]) if stats["sync_requests"] else 0.0
+        return stats
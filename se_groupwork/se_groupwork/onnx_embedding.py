@@ -0,0 +1,123 @@
+import os
+import json
+import numpy as np
+
+'''
+text2vec 模型的 ONNX 推理后端
+- export_onnx：把本地 sentence-transformers 模型导出为 ONNX，并做动态 int8 量化（只量化权重，无需校准数据）
+- OnnxEmbeddings：onnxruntime 推理，接口与 HuggingFaceEmbeddings 一致（embed_documents / embed_query）
+  池化方式与原模型一致：按 attention_mask 求均值后 L2 归一化
+依赖 onnxruntime；导出还需要 torch、transformers、onnx，均在使用时才导入
+'''
+
+FP32_MODEL_NAME = "model.onnx"
+INT8_MODEL_NAME = "model.int8.onnx"
+DEFAULT_MAX_LENGTH = 128  # 与 shibing624/text2vec-base-chinese 的 max_seq_length 一致
+
+
+def read_max_length(model_path):
+    '''读取 sentence-transformers 配置中的最大序列长度'''
+    config_path = os.path.join(model_path, "sentence_bert_config.json")
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("max_seq_length", DEFAULT_MAX_LENGTH)
+    return DEFAULT_MAX_LENGTH
+
+
+def mean_pooling(last_hidden_state, attention_mask):
+    '''按 attention_mask 求平均并归一化'''
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (last_hidden_state * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    vectors = summed / counts
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def export_onnx(model_path, output_dir, quantize=True):
+    '''
+    导出 ONNX 模型（batch、序列长度为动态维度）
+    :return: 实际使用的模型文件路径（量化时为 int8 模型）
+    '''
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path)
+    model.eval()
+    inputs = tokenizer(["导出示例"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in inputs]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    fp32_path = os.path.join(output_dir, FP32_MODEL_NAME)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(inputs[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "sentence_bert_config.json"), 'w', encoding='utf-8') as f:
+        json.dump({"max_seq_length": read_max_length(model_path)}, f)
+    print(f"[Info at onnx_embedding.py::export_onnx] 已导出 {fp32_path}")
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    int8_path = os.path.join(output_dir, INT8_MODEL_NAME)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"[Info at onnx_embedding.py::export_onnx] 已量化 {int8_path}")
+    return int8_path
+
+
+class OnnxEmbeddings:
+    def __init__(self, model_dir, quantized=True, intra_op_threads=0, batch_size=32):
+        '''
+        :param intra_op_threads: 单次推理使用的线程数，0 表示由 onnxruntime 决定
+        '''
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, INT8_MODEL_NAME if quantized else FP32_MODEL_NAME)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} 不存在，请先运行 python manage.py embedding_export_onnx")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = read_max_length(model_dir)
+        self.batch_size = batch_size
+        print(f"[Info at onnx_embedding.py::__init__] OnnxEmbeddings 初始化 {model_path} threads={intra_op_threads}")
+
+    def _embed_batch(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        last_hidden_state = self.session.run(["last_hidden_state"], feeds)[0]
+        return mean_pooling(last_hidden_state, encoded["attention_mask"])
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        # 按长度排序后分批，减少padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            batch_vectors = self._embed_batch([texts[i] for i in batch_ids])
+            if vectors.shape[1] == 0:
+                vectors = np.zeros((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[batch_ids] = batch_vectors
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
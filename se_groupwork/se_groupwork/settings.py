@@ -388,7 +388,7 @@ LOGGING = {
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': 'redis://localhost:6379/1',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://localhost:6379/1'),
         'CONNECTION_POOL_KWARGS': {
             'max_connections': 100,  # 连接池大小
             'retry_on_timeout': True,
@@ -440,6 +440,11 @@ MEILISEARCH_API_KEY = None
 MEILISEARCH_INDEX_NAME = 'articles'
 TMP_MEILISEARCH_INDEX_NAME_FOR_TEST = 'test_articles'
 
+# 全文搜索后端（按顺序使用，前一个不可用或无结果时使用下一个）
+SEARCH_BACKENDS = ['meilisearch', 'sqlite_fts']
+SQLITEFTS_DB_PATH = 'article_selector/fts/data/articles_fts.db'
+TMP_SQLITEFTS_DB_PATH_FOR_TEST = 'article_selector/fts/tmp_data/articles_fts.db'
+
 # Faiss 配置
 FAISS_INDEX_PATH = "askAI/faiss/faiss_index.index"
 CHUNK_TO_ARTICLE_ID_JSON_PATH = "askAI/faiss/chunk_to_article_id.json"
@@ -450,7 +455,98 @@ TMP_CHUNK_TO_ARTICLE_ID_JSON_PATH_FOR_TEST = "askAI/faiss/chunk_to_article_id_tm
 SQLITEVECTOR_DB_PATH = 'askAI/sqlvec/sqlitevector.db'
 TMP_SQLITEVECTOR_DB_PATH_FOR_TEST = 'askAI/sqlvec/tmp_sqlitevector.db'
 
+# 问题向量缓存与微批配置
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # LRU 缓存的问题数
+QUERY_EMBEDDING_BATCH_WAIT_MS = 5  # 凑批等待时间（毫秒）
+QUERY_EMBEDDING_MAX_BATCH = 32  # 单批最大问题数
+
+# 语义问答缓存配置
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+ANSWER_CACHE_TTL = 6 * 60 * 60  # 秒
+ANSWER_CACHE_SIMILARITY = 0.95  # 问题向量余弦相似度阈值
+ANSWER_CACHE_CANDIDATES = 5  # 近邻候选数（跳过已过期的回答）
+
+# 流式问答配置（ASGI 部署时生效）
+ASK_STREAM_ASYNC_CONCURRENCY = int(os.getenv('ASK_STREAM_ASYNC_CONCURRENCY', '200'))  # 每个进程同时进行的回答流上限
+ASK_STREAM_HEARTBEAT_INTERVAL = 15  # SSE 心跳间隔（秒）
+
+# 问答上下文配置：只把命中的chunk及其相邻chunk放入提示词
+ASK_MAX_REFERENCE_ARTICLES = 5  # 参考文章数
+ASK_CHUNK_TOP_K = 20  # 检索的chunk数
+ASK_CONTEXT_BUDGET = 4000  # 片段总字数上限（中文约等于token数）
+ASK_CONTEXT_NEIGHBOURS = 1  # 命中chunk前后各带几个相邻chunk
+# 检索范围：只检索用户关注的公众号与校园公众号、最近若干个月的文章（范围内无结果时退回全库）
+ASK_SCOPE_TO_USER_ACCOUNTS = True
+ASK_RECENCY_MONTHS = 12  # None 表示不限发布时间
+
+# 混合检索配置：向量检索与关键词检索并行，倒数排名融合
+HYBRID_RETRIEVAL_ENABLED = True
+HYBRID_RETRIEVAL_WORKERS = 4  # 检索线程池大小
+HYBRID_VECTOR_TIMEOUT = 2.0  # 向量检索截止时间（秒）
+HYBRID_KEYWORD_TIMEOUT = 1.0  # 关键词检索截止时间（秒）
+HYBRID_KEYWORD_TOP_K = 20  # 关键词检索返回的文章数
+HYBRID_RRF_K = 60  # RRF 平滑常数
+
+# 大模型客户端配置：超时与重试可在各自 .ini 的 provider 段中覆盖
+# pool_size 与使用方的并发数一致（remoteAI 为 process_articles 的线程数）
+# remoteAI 的限流重试由摘要调度器负责，HTTP 层不再重试
+LLM_CLIENTS = {
+    'askAI': {'config_path': './askAI/askAI/askAI.ini', 'provider': 'deepseek', 'pool_size': 10},
+    'remoteAI': {'config_path': './remoteAI/remoteAI/remoteAI.ini', 'provider': 'deepseek', 'pool_size': 50, 'retries': 0},
+}
+
+# 摘要任务调度：令牌桶限速（0 表示不限）+ AIMD 自适应并发
+SUMMARY_RATE_LIMIT_RPM = int(os.getenv('SUMMARY_RATE_LIMIT_RPM', '300'))  # 每分钟请求数
+SUMMARY_RATE_LIMIT_TPM = int(os.getenv('SUMMARY_RATE_LIMIT_TPM', '0'))  # 每分钟token数（按字符数估算）
+SUMMARY_CONCURRENCY_INITIAL = 8
+SUMMARY_CONCURRENCY_MIN = 1
+SUMMARY_CONCURRENCY_MAX = 50  # 与 remoteAI 连接池大小一致
+SUMMARY_LATENCY_TARGET = 60  # 秒，延迟超过该值时不再增加并发
+SUMMARY_THROTTLE_RETRIES = 4  # 被限流（429/5xx/超时）后的重试次数
+SUMMARY_THROTTLE_BACKOFF = 2  # 秒，指数退避基数（响应带 Retry-After 时以其为准）
+# 摘要结果小批量写回：攒够篇数或超过间隔即写入数据库与搜索索引
+SUMMARY_SINK_FLUSH_SIZE = 20
+SUMMARY_SINK_FLUSH_INTERVAL = 5  # 秒
+# 摘要任务队列：多个 worker 通过领取+租约分摊待处理文章，失败按指数退避重试
+SUMMARY_CLAIM_BATCH = 50  # 每次领取的最大任务数
+SUMMARY_CLAIM_LEASE_SECONDS = 600  # 租约时长，处理中的 worker 每 1/3 租约续租一次
+SUMMARY_MAX_ATTEMPTS = 5  # 超过该次数标记为 failed
+SUMMARY_RETRY_BACKOFF = 300  # 秒，第一次失败后的等待时间，之后每次翻倍
+SUMMARY_RETRY_BACKOFF_MAX = 24 * 60 * 60  # 秒
+# 关键词向量词典：进程内 LRU 缓存的关键词数，未命中时查 KeywordVector 表，仍未命中的批量向量化后写入
+KEYWORD_VECTOR_LRU_SIZE = 20000
+
+# 文章向量内存映射矩阵配置
+VECSTORE_DIR = 'article_selector/vecstore/data'
+TMP_VECSTORE_DIR_FOR_TEST = 'article_selector/vecstore/tmp_data'
+
+# 用户偏好延迟合并写入配置（测试模式下始终同步更新）
+PREFERENCE_BUFFER_ENABLED = os.getenv('PREFERENCE_BUFFER_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+PREFERENCE_BUFFER_FLUSH_INTERVAL = 5  # 秒
+PREFERENCE_BUFFER_FLUSH_THRESHOLD = 100  # 缓冲事件数
+
 # Embedding model 配置
 EMBEDDING_MODEL = 'shibing624-text2vec-base-chinese'
 EMBEDDING_MODEL_PATH = './shibing624-text2vec-base-chinese'
-EMBEDDING_DIM = 768
\ No newline at end of file
+EMBEDDING_DIM = 768
+
+# 向量化后端：'huggingface' 在每个进程加载模型；'onnx' 使用导出的 ONNX 模型（manage.py embedding_export_onnx）；
+# 'remote' 使用独立的向量化服务（manage.py embedding_server）
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'huggingface')
+# 向量化服务进程自身使用的后端（'huggingface' 或 'onnx'）
+EMBEDDING_SERVER_BACKEND = os.getenv('EMBEDDING_SERVER_BACKEND', 'huggingface')
+# 向量化服务地址：http://host:port 或 unix:///path/to.sock
+EMBEDDING_SERVER_URL = os.getenv('EMBEDDING_SERVER_URL', 'http://127.0.0.1:8100')
+EMBEDDING_SERVER_BATCH_WAIT_MS = 5  # 服务端凑批等待时间（毫秒）
+EMBEDDING_SERVER_MAX_BATCH = 64  # 服务端单批最大文本数
+
+# ONNX 推理配置
+EMBEDDING_ONNX_DIR = './shibing624-text2vec-base-chinese/onnx'
+EMBEDDING_ONNX_QUANTIZED = os.getenv('EMBEDDING_ONNX_QUANTIZED', 'True').lower() in ('1', 'true', 'yes')  # 使用动态 int8 量化模型
+# 单次推理线程数：多个 worker 进程共享 CPU，默认每个进程 2 个线程，0 表示由 onnxruntime 决定
+EMBEDDING_ONNX_THREADS = int(os.getenv('EMBEDDING_ONNX_THREADS', '2'))
+
+# 向量索引待办队列：文章保存时只入队，由 indexer 服务（sqlvec_drain_outbox --loop）几秒内批量向量化（测试模式下同步处理）
+SQLVEC_OUTBOX_ASYNC = os.getenv('SQLVEC_OUTBOX_ASYNC', 'true').lower() == 'true'
+SQLVEC_OUTBOX_BATCH_SIZE = 200  # 每批取出的待办数
+SQLVEC_OUTBOX_MAX_ATTEMPTS = 5  # 失败超过该次数的待办不再自动重试
@@ -71,6 +71,44 @@ class ArticleSelectorTests(TestCase):
         self.assertEqual(len(response.data['articles']), 4)
         self.assertEqual(response.data['reach_end'], True)
     
+    def test_cursor_pagination(self):
+        '''测试游标分页'''
+        account_c1 = PublicAccount.objects.get(fakeid='C1')
+        account_c2 = PublicAccount.objects.get(fakeid='C2')
+        Subscription.objects.create_subscription(self.user, account_c1)
+        Subscription.objects.create_subscription(self.user, account_c2)
+        # 游标分页与偏移分页结果一致
+        offset_ids = []
+        for start_rank in (0, 20):
+            response = self.client.get(reverse('articles-latest'), data={'start_rank': start_rank})
+            offset_ids += [article['id'] for article in response.data['articles']]
+        response = self.client.get(reverse('articles-latest'))
+        self.assertEqual(response.data['reach_end'], False)
+        cursor_ids = [article['id'] for article in response.data['articles']]
+        response = self.client.get(reverse('articles-latest'), data={'cursor': response.data['next_cursor']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['articles']), 4)
+        self.assertEqual(response.data['reach_end'], True)
+        self.assertIsNone(response.data['next_cursor'])
+        cursor_ids += [article['id'] for article in response.data['articles']]
+        self.assertEqual(cursor_ids, offset_ids)
+        # 发布时间相同的文章不会被跳过或重复
+        Article.objects.filter(id__in=offset_ids).update(publish_time=timezone.now())
+        cursor_ids = []
+        cursor = None
+        while True:
+            response = self.client.post(reverse('articles-filter'), data={'limit': 5, 'cursor': cursor or ''}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            cursor_ids += [article['id'] for article in response.data['articles']]
+            cursor = response.data['next_cursor']
+            if response.data['reach_end']:
+                break
+        self.assertEqual(sorted(cursor_ids, reverse=True), sorted(offset_ids, reverse=True))
+        self.assertEqual(len(set(cursor_ids)), len(cursor_ids))
+        # 无效游标
+        response = self.client.get(reverse('articles-latest'), data={'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_recommend_api(self):
         '''测试recommend API'''
         # 准备数据
@@ -5,9 +5,12 @@ from rest_framework import status
 from user.models import User
 from webspider.models import Article, PublicAccount
 from se_groupwork.global_tools import global_sqlvec_tool_load
+from askAI.askAI.ai_ask import get_search_scope, scope_key
 
+from askAI.views import ASK_CONCURRENCY_SEMAPHORE
 import json
 import time
+import gc
 
 class AskAITests(TestCase):
     def setUp(self):
@@ -93,4 +96,63 @@ class AskAITests(TestCase):
 
         # 执行两个子测试
         test_ask_normal()
-        test_ask_stream()
\ No newline at end of file
+        test_ask_stream()
+
+    def test_ask_answer_cache(self):
+        """测试语义缓存命中时两个接口直接返回缓存回答"""
+        sqlvec_tool = global_sqlvec_tool_load()
+        article = Article.objects.order_by('id').first()
+        references = [{"id": article.id, "title": article.title, "article_url": article.article_url}]
+        sqlvec_tool.answer_cache.store(self.test_question1, "缓存的回答", references, scope_key(get_search_scope(self.user)))
+
+        response = self.client.post(self.ask_url, {"question": self.test_question1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['cached'])
+        self.assertEqual(response.data['answer'], "缓存的回答")
+        self.assertEqual(response.data['references-articles'], references)
+
+        response = self.client.post(self.ask_stream_url, {"question": self.test_question1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Answer-Cache'], 'HIT')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        answer, references_part = content.split('[[REFERENCES]]')
+        self.assertEqual(answer.strip(), "缓存的回答")
+        self.assertEqual(json.loads(references_part), references)
+
+    def test_ask_stream_sse(self):
+        """测试 Accept: text/event-stream 时按 SSE 输出"""
+        response = self.client.post(self.ask_stream_url, {"question": self.test_question2}, format='json', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        events = [event for event in content.split('\n\n') if event]
+        self.assertTrue(all(line.startswith(('event: ', 'data: ')) for event in events for line in event.split('\n')))
+        self.assertIn('event: references', events[-2])
+        self.assertIsInstance(json.loads(events[-2].split('data: ', 1)[1]), list)
+        self.assertEqual(events[-1], 'event: done\ndata: [DONE]')
+
+    def test_ask_stream_releases_slot_without_iteration(self):
+        """回答流从未开始迭代时，响应关闭或被回收也会释放并发名额"""
+        available = ASK_CONCURRENCY_SEMAPHORE._value
+        response = self.client.post(self.ask_stream_url, {"question": self.test_question2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ASK_CONCURRENCY_SEMAPHORE._value, available - 1)
+        response.close()
+        self.assertEqual(ASK_CONCURRENCY_SEMAPHORE._value, available)
+        response = self.client.post(self.ask_stream_url, {"question": self.test_question2}, format='json')
+        self.assertEqual(ASK_CONCURRENCY_SEMAPHORE._value, available - 1)
+        del response
+        gc.collect()
+        self.assertEqual(ASK_CONCURRENCY_SEMAPHORE._value, available)
+
+    async def test_ask_stream_asgi(self):
+        """测试 ASGI 下的异步回答流"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(self.ask_stream_url, {"question": self.test_question2}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        content = ''
+        async for chunk in response.streaming_content:
+            content += chunk.decode('utf-8')
+        self.assertIn('[[REFERENCES]]', content)
+        self.assertIsInstance(json.loads(content.split('[[REFERENCES]]')[-1]), list)
@@ -0,0 +1,61 @@
+from django.test import TestCase
+from django.utils import timezone
+from webspider.models import Article, PublicAccount
+from article_selector.article_selector import paginate_articles, encode_cursor
+from datetime import timedelta
+import time
+import csv
+
+ARTICLE_COUNT = 100000
+PAGE_SIZE = 20
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        accounts = [
+            PublicAccount.objects.create(name=f"测试公众号{i}", fakeid=f"fakeid{i}", is_default=True)
+            for i in range(10)
+        ]
+        now = timezone.now()
+        batch = []
+        for i in range(ARTICLE_COUNT):
+            batch.append(Article(
+                public_account=accounts[i % len(accounts)],
+                title=f"测试文章{i}",
+                article_url=f"https://mp.weixin.qq.com/example/{i}",
+                # 每两篇文章发布时间相同，覆盖 id 作为次序键的情况
+                publish_time=now - timedelta(minutes=i // 2),
+                summary="摘要"
+            ))
+            if len(batch) == 5000:
+                Article.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Article.objects.bulk_create(batch)
+        self.accounts = accounts
+
+    def _queryset(self):
+        return Article.objects.only('id', 'title', 'publish_time').filter(public_account__in=self.accounts).exclude(summary='')
+
+    def test_page_latency(self):
+        csv_data = [
+            ["page", "offset_time", "cursor_time"]
+        ]
+        for page in (1, 10, 100, 1000, 4999):
+            start_rank = (page - 1) * PAGE_SIZE
+            # 游标取自上一页最后一篇文章（不计入耗时）
+            cursor = None
+            if start_rank > 0:
+                cursor = encode_cursor(self._queryset().order_by('-publish_time', '-id')[start_rank - 1])
+            start = time.time()
+            offset_items, _, _ = paginate_articles(self._queryset(), PAGE_SIZE, start_rank=start_rank)
+            offset_time = time.time() - start
+            start = time.time()
+            cursor_items, _, _ = paginate_articles(self._queryset(), PAGE_SIZE, cursor=cursor)
+            cursor_time = time.time() - start
+            self.assertEqual([a.id for a in offset_items], [a.id for a in cursor_items])
+            csv_data.append([page, offset_time, cursor_time])
+        for row in csv_data:
+            print(row)
+        with open('tests_pref/testresult_pagination.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerows(csv_data)
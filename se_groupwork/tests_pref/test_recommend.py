@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from webspider.models import Article, PublicAccount
+from user.models import User, History
+from article_selector.models import Preference
+from article_selector.article_selector import sort_articles_by_preference
+import json
+import time
+import csv
+
+class RecommendTests(TestCase):
+    def setUp(self):
+        with open('article_selector/testdata.json', 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.user = User.objects.create_user(**data['users'][0])
+        for account in data['accounts']:
+            PublicAccount.objects.create(**account, is_default=True)
+        # 将测试文章复制到200篇，与推荐接口的候选集上限一致
+        for i in range(200):
+            article = data['articles'][i % len(data['articles'])]
+            Article.objects.create(
+                public_account=PublicAccount.objects.get(fakeid=article['public_account']),
+                title=article['title'],
+                content=article['content'],
+                article_url=f"{article['article_url']}/{i}",
+                publish_time=article['publish_time'],
+                summary=article['summary'],
+                tags=article['tags'],
+                key_info=article['key_info'],
+                tags_vector=article['tags_vector'],
+                semantic_vector=article['semantic_vector']
+            )
+        for article in Article.objects.all()[:5]:
+            History.objects.create_history(self.user, article)
+
+    def _candidates(self):
+        # 与 ArticleViewSet._base_queryset 一致，向量字段为延迟加载
+        return list(
+            Article.objects.select_related('public_account')
+            .only('id', 'title', 'summary', 'tags', 'public_account__name', 'public_account_id')
+            .order_by('-publish_time')[:200]
+        )
+
+    def test_sort_articles_by_preference(self):
+        # 热身
+        sort_articles_by_preference(self.user, self._candidates())
+        csv_data = [
+            ["method", "candidates", "queries", "time"]
+        ]
+        # 逐篇计算（原实现）
+        articles = self._candidates()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.time()
+            scores = [Preference.objects.caculate_preference(self.user, article) for article in articles]
+            sorted(zip(scores, range(len(articles))), key=lambda x: x[0], reverse=True)
+            end = time.time()
+        csv_data.append(["per_article", len(articles), len(ctx.captured_queries), end - start])
+        # 批量计算
+        articles = self._candidates()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.time()
+            sort_articles_by_preference(self.user, articles)
+            end = time.time()
+        csv_data.append(["batch", len(articles), len(ctx.captured_queries), end - start])
+        batch_scores = Preference.objects.caculate_preferences(self.user, articles)
+        for row in csv_data:
+            print(row)
+        for score, batch_score in zip(scores, batch_scores):
+            self.assertAlmostEqual(score, batch_score)
+        self.assertLess(csv_data[2][2], csv_data[1][2])
+        with open('tests_pref/testresult_recommend.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerows(csv_data)
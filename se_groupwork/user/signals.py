@@ -23,8 +23,10 @@ def create_default_collection(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Subscription)
 def update_subscription_count_on_save(sender, instance, created, **kwargs):
     """
-    当订阅关系创建或更新时，更新用户和公众号的订阅计数
+    当订阅关系创建或更新时，更新用户和公众号的订阅计数，并使用户的订阅公众号缓存失效
     """
+    from article_selector.article_selector import invalidate_customized_accounts
+    invalidate_customized_accounts(instance.user_id)
     if created and instance.is_active:
         # 使用原子操作更新计数
         from user.models import User, PublicAccount
@@ -39,8 +41,10 @@ def update_subscription_count_on_save(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=Subscription)
 def update_subscription_count_on_delete(sender, instance, **kwargs):
     """
-    当订阅关系删除时，更新用户和公众号的订阅计数
+    当订阅关系删除时，更新用户和公众号的订阅计数，并使用户的订阅公众号缓存失效
     """
+    from article_selector.article_selector import invalidate_customized_accounts
+    invalidate_customized_accounts(instance.user_id)
     # 使用原子操作更新计数
     from user.models import User, PublicAccount
     
@@ -89,7 +89,7 @@ class ArticleAdmin(admin.ModelAdmin):
     list_display_links = ('title', 'public_account')
     list_filter = ('public_account', 'publish_time', 'public_account__is_default')
     search_fields = ('title', 'content', 'author', 'public_account__name')
-    readonly_fields = ('publish_time', 'get_cover_preview')
+    readonly_fields = ('publish_time', 'get_cover_preview', 'tags_vector', 'semantic_vector')
     raw_id_fields = ('public_account',)
     date_hierarchy = 'publish_time'
     list_per_page = 20
@@ -0,0 +1,87 @@
+"""
+fields.py:自定义模型字段
+"""
+
+import json
+import struct
+import numpy as np
+from django.db import models
+
+# 向量头部：魔数(2字节) + 数据类型(1字节) + 填充(1字节) + 维度(4字节)，共8字节，使数据区保持对齐
+VECTOR_HEADER = struct.Struct('<2sBxI')
+VECTOR_MAGIC = b'VF'
+VECTOR_DTYPES = {
+    0: np.dtype('<f4'),  # float32
+    1: np.dtype('<f2'),  # float16
+}
+VECTOR_DTYPE_CODES = {dtype: code for code, dtype in VECTOR_DTYPES.items()}
+
+
+def pack_vector(vector, dtype='float32'):
+    """
+    将向量打包为 头部 + 小端序浮点数据 的bytes
+    """
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if isinstance(vector, str):  # 兼容旧JSONField写入的JSON文本及空字符串
+        vector = json.loads(vector) if vector.strip() else []
+    array = np.asarray(vector if vector is not None else [], dtype=dtype).ravel()
+    return VECTOR_HEADER.pack(VECTOR_MAGIC, VECTOR_DTYPE_CODES[dtype], array.shape[0]) + array.tobytes()
+
+
+def unpack_vector(data):
+    """
+    将bytes解析为一维 np.ndarray
+    - 返回的数组直接引用原始bytes（只读视图），不复制数据
+    - 兼容迁移前以JSON文本存储的旧数据
+    """
+    if data is None:
+        return np.zeros(0, dtype=np.float32)
+    if len(data) >= VECTOR_HEADER.size and bytes(data[:2]) == VECTOR_MAGIC:
+        _, dtype_code, dim = VECTOR_HEADER.unpack_from(data)
+        return np.frombuffer(data, dtype=VECTOR_DTYPES[dtype_code], count=dim, offset=VECTOR_HEADER.size)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.asarray(json.loads(bytes(data).decode('utf-8')), dtype=np.float32).ravel()
+
+
+class VectorField(models.BinaryField):
+    """
+    以二进制形式存储的浮点向量（float32 或 float16）
+    - 写入时接受 list / np.ndarray / bytes
+    - 读出时直接得到 np.ndarray，跳过JSON解析和Python float对象的构造
+    """
+    description = "Packed float vector"
+
+    def __init__(self, *args, dtype='float32', **kwargs):
+        self.dtype = np.dtype(dtype).name
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dtype != 'float32':
+            kwargs['dtype'] = self.dtype
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return unpack_vector(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return unpack_vector(value)
+        if isinstance(value, str):
+            value = json.loads(value) if value.strip() else []
+        return np.asarray(value, dtype=self.dtype).ravel()
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        return pack_vector(value, self.dtype)
+
+    def value_to_string(self, obj):
+        """序列化（dumpdata）时输出为JSON列表，便于阅读和迁移"""
+        value = self.value_from_object(obj)
+        return json.dumps(np.asarray(value if value is not None else [], dtype=np.float64).tolist())
@@ -0,0 +1,74 @@
+# 将 Article.tags_vector / semantic_vector 由JSON列表改为二进制float32向量
+
+from django.db import migrations
+import webspider.fields
+
+
+BATCH_SIZE = 500
+
+
+def json_to_binary(apps, schema_editor):
+    Article = apps.get_model('webspider', 'Article')
+    batch = []
+    for article in Article.objects.only('id', 'tags_vector', 'semantic_vector').iterator(chunk_size=BATCH_SIZE):
+        article.tags_vector_bin = article.tags_vector or []
+        article.semantic_vector_bin = article.semantic_vector or []
+        batch.append(article)
+        if len(batch) >= BATCH_SIZE:
+            Article.objects.bulk_update(batch, ['tags_vector_bin', 'semantic_vector_bin'])
+            batch = []
+    if batch:
+        Article.objects.bulk_update(batch, ['tags_vector_bin', 'semantic_vector_bin'])
+
+
+def binary_to_json(apps, schema_editor):
+    Article = apps.get_model('webspider', 'Article')
+    batch = []
+    for article in Article.objects.only('id', 'tags_vector_bin', 'semantic_vector_bin').iterator(chunk_size=BATCH_SIZE):
+        article.tags_vector = [float(x) for x in article.tags_vector_bin]
+        article.semantic_vector = [float(x) for x in article.semantic_vector_bin]
+        batch.append(article)
+        if len(batch) >= BATCH_SIZE:
+            Article.objects.bulk_update(batch, ['tags_vector', 'semantic_vector'])
+            batch = []
+    if batch:
+        Article.objects.bulk_update(batch, ['tags_vector', 'semantic_vector'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webspider', '0005_alter_article_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='tags_vector_bin',
+            field=webspider.fields.VectorField(default=list, verbose_name='标签向量'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='semantic_vector_bin',
+            field=webspider.fields.VectorField(default=list, verbose_name='语义向量'),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='article',
+            name='tags_vector',
+        ),
+        migrations.RemoveField(
+            model_name='article',
+            name='semantic_vector',
+        ),
+        migrations.RenameField(
+            model_name='article',
+            old_name='tags_vector_bin',
+            new_name='tags_vector',
+        ),
+        migrations.RenameField(
+            model_name='article',
+            old_name='semantic_vector_bin',
+            new_name='semantic_vector',
+        ),
+    ]
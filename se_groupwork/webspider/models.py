@@ -3,6 +3,7 @@ models.py:用于规定爬虫数据库中数据表的格式
 """
 
 from django.db import models
+from webspider.fields import VectorField
 
 
 
@@ -107,11 +108,11 @@ class Article(models.Model):
         default=list,
         verbose_name='标签'
     )
-    tags_vector = models.JSONField(
+    tags_vector = VectorField(
         default=list,
         verbose_name="标签向量"
     )
-    semantic_vector = models.JSONField(
+    semantic_vector = VectorField(
         default=list,
         verbose_name="语义向量"
     )
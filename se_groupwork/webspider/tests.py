@@ -1,3 +1,34 @@
 from django.test import TestCase
+import numpy as np
+from webspider.models import PublicAccount, Article
+from webspider.fields import pack_vector, unpack_vector
 
-            
+# Create your tests here.
+class VectorFieldTestCase(TestCase):
+    def test_pack_and_unpack(self):
+        vector = unpack_vector(pack_vector([0.5, 0.25, 0.125]))
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertTrue(np.allclose(vector, [0.5, 0.25, 0.125]))
+        self.assertEqual(len(unpack_vector(pack_vector([]))), 0)
+        self.assertEqual(unpack_vector(pack_vector([1, 2], dtype='float16')).dtype, np.float16)
+        # 兼容迁移前的JSON文本
+        self.assertTrue(np.allclose(unpack_vector(b'[1.0, 2.0]'), [1.0, 2.0]))
+        self.assertTrue(np.allclose(unpack_vector(pack_vector('[1.0, 2.0]')), [1.0, 2.0]))
+        self.assertEqual(len(unpack_vector(pack_vector(''))), 0)
+
+    def test_article_vectors(self):
+        account = PublicAccount.objects.create(name="测试公众号", fakeid="fakeid1")
+        article = Article.objects.create(
+            public_account=account,
+            title="测试文章",
+            article_url="https://mp.weixin.qq.com/example1",
+            publish_time="2025-10-06 17:01:00+08:00",
+            tags_vector=[0.0, 1.0],
+            semantic_vector=np.ones(100, dtype=np.float32)
+        )
+        article = Article.objects.get(id=article.id)
+        self.assertIsInstance(article.tags_vector, np.ndarray)
+        self.assertTrue(np.allclose(article.tags_vector, [0.0, 1.0]))
+        self.assertEqual(article.semantic_vector.shape, (100,))
+        Article.objects.filter(id=article.id).update(tags_vector=[])
+        self.assertEqual(len(Article.objects.get(id=article.id).tags_vector), 0)